@@ -0,0 +1,123 @@
+# audio_ring_buffer.py
+
+import time
+from typing import Optional
+import numpy as np
+import sounddevice as sd
+
+# Config
+SAMPLE_RATE = 16000
+RING_SECONDS = 30
+# audio from before the recording call that is kept at the start of a recording
+PREROLL_S = 0.3
+MIC_DEVICE = 2     # input device index, the USB microphone the wake-word runner used to open
+BLOCK_SIZE = 800   # 50 ms callbacks
+
+
+class AudioRingBuffer:
+    """
+    Single-producer, multi-reader ring of mono float32 samples.
+
+    The writer copies a block into the ring and only then advances `written`, so readers never
+    take a lock: they copy a range and check afterwards, against the then current `written` plus one
+    unpublished block, that the writer has not lapped it.
+    Positions are absolute sample counts since capture start.
+    """
+
+    def __init__(self, seconds: float = RING_SECONDS, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.capacity = int(seconds * sample_rate)
+        self.data = np.zeros(self.capacity, dtype=np.float32)
+        self.written = 0
+
+    def write(self, samples: np.ndarray) -> None:
+        end = self.written + len(samples)
+        # only the newest `capacity` samples of an oversized block survive
+        samples = samples[-self.capacity:]
+        start = (end - len(samples)) % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.data[start:start + first] = samples[:first]
+        self.data[:len(samples) - first] = samples[first:]
+        self.written = end  # publish after the data is in place
+
+    def position(self) -> int:
+        return self.written
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """
+        Copy samples [start, end). Raises if that range was already overwritten.
+        """
+        if end > self.written:
+            raise ValueError("requested audio has not been captured yet")
+        start = max(start, 0)
+        idx = np.arange(start, end) % self.capacity
+        out = self.data[idx]
+        # a block the writer is copying in but has not published yet may already overwrite the oldest samples
+        if self.written - start > self.capacity - BLOCK_SIZE:
+            raise ValueError("requested audio was overwritten; reader fell behind")
+        return out
+
+    def wait_until(self, position: int, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.written < position:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+class MicrophoneCapture:
+    """
+    One always-open input stream feeding an AudioRingBuffer. Keyword spotting and recordings read from the ring
+    instead of opening the device themselves.
+    """
+
+    def __init__(self, device=MIC_DEVICE, sample_rate: int = SAMPLE_RATE, seconds: float = RING_SECONDS):
+        self.ring = AudioRingBuffer(seconds, sample_rate)
+        self.sample_rate = sample_rate
+        self.device = device
+        self.stream = sd.InputStream(
+            device=device,
+            samplerate=sample_rate,
+            channels=1,
+            dtype='float32',
+            blocksize=BLOCK_SIZE,
+            callback=self._callback
+        )
+
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            print(f"⚠️ Microphone: {status}")
+        self.ring.write(indata[:, 0])
+
+    def start(self) -> None:
+        self.stream.start()
+        print("🎙️ Shared microphone capture started.")
+
+    def stop(self) -> None:
+        self.stream.stop()
+        self.stream.close()
+
+    def record(self, duration: float, preroll: float = PREROLL_S) -> np.ndarray:
+        """
+        Return `duration` seconds of audio starting `preroll` seconds before the call, shaped like sd.rec output.
+        """
+        start = self.ring.position() - int(preroll * self.sample_rate)
+        end = start + int(duration * self.sample_rate)
+        self.ring.wait_until(end, timeout=duration + 2.0)
+        return self.ring.read(start, min(end, self.ring.position())).reshape(-1, 1)
+
+
+_capture = None
+
+def get_shared_capture(device=MIC_DEVICE) -> MicrophoneCapture:
+    """
+    Start (once) and return the process-wide microphone capture; device only applies to the first call.
+    """
+    global _capture
+    if _capture is None:
+        _capture = MicrophoneCapture(device=device)
+        _capture.start()
+    elif device != _capture.device:
+        print(f"⚠️ Microphone already open on device {_capture.device}, ignoring device {device}.")
+    return _capture
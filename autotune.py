@@ -0,0 +1,256 @@
+# autotune.py
+
+from pathlib import Path
+import tempfile
+import time
+from typing import Dict, List, Optional
+import numpy as np
+
+from hardware_profile import PROFILE_PATH, DEFAULT_SETTINGS, describe_device, load_profile, save_profile
+from model_residency import OLLAMA_KEEP_ALIVE
+
+# Config
+EMBED_BATCH_SIZES = (1, 4, 8, 16, 32)
+EMBED_SAMPLES = 64
+VLM_SIDES = (448, 672, 1024, None)  # None = original capture size
+# a photo should be captioned within this long in the background
+VLM_TARGET_S = 25.0
+LLM_MODEL = "llama3.2:3b"
+LLM_TOP_K_RANGE = (3, 8)
+# time from question to spoken LLM answer we aim for
+LLM_TARGET_S = 8.0
+WHISPER_MODELS = ("tiny.en", "base.en", "small.en")
+# transcription time / audio length; 0.5 means a 5 s question is transcribed in 2.5 s
+STT_MAX_RTF = 0.5
+CAPTURE_SIZES = ((2304, 1296), (1920, 1080), (1536, 864))
+# decode + downscale + encode of one capture before it goes to the VLM
+CAPTURE_ENCODE_TARGET_S = 1.0
+
+SAMPLE_RECORD = "2025-05-01 18:20 (user+model): User note: I put my keys in the blue bowl next to the door. " \
+                "| Photo description: A wooden shelf by the entrance with a blue ceramic bowl holding a set of keys."
+
+
+def calibrate_embedding() -> Dict:
+    """
+    Passage throughput per batch size and single-query latency; picks the smallest batch within 90% of the best throughput.
+    """
+    from vector_store import embed_passages, embed_query
+
+    passages = [f"passage: {SAMPLE_RECORD} #{i}" for i in range(EMBED_SAMPLES)]
+    embed_passages(passages[:2])  # warm-up (and model load)
+    docs_per_s = {}
+    for batch_size in EMBED_BATCH_SIZES:
+        start = time.time()
+        for i in range(0, len(passages), batch_size):
+            embed_passages(passages[i:i + batch_size])
+        docs_per_s[batch_size] = len(passages) / (time.time() - start)
+        print(f"  embed batch {batch_size:>3}: {docs_per_s[batch_size]:.1f} docs/s")
+
+    start = time.time()
+    for _ in range(5):
+        embed_query("where did I put my keys?")
+    query_latency = (time.time() - start) / 5
+
+    best = max(docs_per_s.values())
+    batch_size = min(b for b, rate in docs_per_s.items() if rate >= 0.9 * best)
+    return {
+        "measurements": {"embed_docs_per_s": docs_per_s, "embed_query_latency_s": query_latency},
+        "settings": {"embed_batch_size": batch_size},
+    }
+
+
+def sample_image(image_folder: Path = Path("memory_images")) -> Path:
+    images = sorted(image_folder.glob("*.jpg"))
+    if not images:
+        raise FileNotFoundError(f"❌ No .jpg in {image_folder} to calibrate the VLM with (use --image)")
+    return images[-1]
+
+
+def calibrate_vlm(image_path: Path, num_predict: int) -> Dict:
+    """
+    Caption time per longest image side; picks the largest side captioned within VLM_TARGET_S.
+    """
+    import ollama
+    from batch_captioning import load_and_encode_image
+    from image_processing import VLM_MODEL, VLM_OPTIONS, build_caption_prompt
+
+    options = {**VLM_OPTIONS, "num_predict": num_predict}
+    prompt = build_caption_prompt("2025-05-01 18:20")
+
+    def caption(side):
+        start = time.time()
+        response = ollama.generate(model=VLM_MODEL, prompt=prompt,
+                                   images=[load_and_encode_image(image_path, side)], options=options,
+                                   keep_alive=OLLAMA_KEEP_ALIVE)
+        return time.time() - start, response
+
+    try:
+        caption(VLM_SIDES[0])  # loads the model
+        seconds, tokens_per_s = {}, None
+        for side in VLM_SIDES:
+            seconds[str(side)], response = caption(side)
+            if response.get("eval_duration"):
+                tokens_per_s = response["eval_count"] / (response["eval_duration"] / 1e9)
+            print(f"  VLM side {side or 'original'}: {seconds[str(side)]:.1f} s")
+    finally:
+        # keep_alive=-1 kept it loaded between sizes; nothing manages it once autotune exits
+        ollama.generate(model=VLM_MODEL, keep_alive=0)
+
+    fitting = [side for side in VLM_SIDES if seconds[str(side)] <= VLM_TARGET_S]
+    settings = {"vlm_max_side": fitting[-1] if fitting else VLM_SIDES[0]}
+    if not fitting:
+        # even the smallest image is too slow: shorten the captions instead
+        settings["vlm_num_predict"] = max(60, int(num_predict * VLM_TARGET_S / seconds[str(VLM_SIDES[0])]))
+    return {
+        "measurements": {"vlm_seconds_by_side": seconds, "vlm_tokens_per_s": tokens_per_s},
+        "settings": settings,
+    }
+
+
+def calibrate_llm(model_name: str = LLM_MODEL, records: int = 8, answer_tokens: int = 80) -> Dict:
+    """
+    Prompt and generation tokens/s; picks the largest retrieval top_k whose answer fits LLM_TARGET_S.
+    """
+    import ollama
+
+    def generate(n):
+        context = "\n".join(f"[{i}] {SAMPLE_RECORD}" for i in range(1, n + 1))
+        return ollama.generate(model=model_name, prompt=f"Memory records:\n{context}\n\nWhere are my keys?",
+                               options={"num_predict": answer_tokens, "temperature": 0.2},
+                               keep_alive=OLLAMA_KEEP_ALIVE)
+
+    try:
+        generate(1)  # loads the model
+        small, large = generate(1), generate(records)
+    finally:
+        ollama.generate(model=model_name, keep_alive=0)
+    prompt_tokens_per_s = large["prompt_eval_count"] / (large["prompt_eval_duration"] / 1e9)
+    eval_tokens_per_s = large["eval_count"] / (large["eval_duration"] / 1e9)
+    tokens_per_record = max(1.0, (large["prompt_eval_count"] - small["prompt_eval_count"]) / (records - 1))
+    base_tokens = small["prompt_eval_count"] - tokens_per_record + 250  # instructions of the real prompt
+
+    def answer_seconds(top_k):
+        return (base_tokens + top_k * tokens_per_record) / prompt_tokens_per_s + answer_tokens / eval_tokens_per_s
+
+    low, high = LLM_TOP_K_RANGE
+    top_k = max([k for k in range(low, high + 1) if answer_seconds(k) <= LLM_TARGET_S], default=low)
+    print(f"  LLM: prompt {prompt_tokens_per_s:.0f} tok/s, generation {eval_tokens_per_s:.1f} tok/s, "
+          f"top_k {top_k} -> ~{answer_seconds(top_k):.1f} s")
+    return {
+        "measurements": {"llm_prompt_tokens_per_s": prompt_tokens_per_s, "llm_eval_tokens_per_s": eval_tokens_per_s,
+                         "llm_tokens_per_record": tokens_per_record},
+        "settings": {"retrieval_top_k": top_k,
+                     "llm_deadline_s": round(min(30.0, max(6.0, 1.5 * answer_seconds(top_k))), 1)},
+    }
+
+
+def calibrate_stt(record_seconds: float, speech_wav: Optional[Path] = None) -> Dict:
+    """
+    Whisper real-time factor per model size; picks the largest model with RTF <= STT_MAX_RTF.
+
+    Without a speech recording, low-level noise of record_seconds is used. Whisper pads every input to
+    30 s for the encoder, so this measures the fixed cost well but underestimates decoding of long answers.
+    """
+    import whisper
+
+    if speech_wav is not None:
+        audio = whisper.load_audio(str(speech_wav))
+    else:
+        audio = (np.random.default_rng(0).standard_normal(int(record_seconds * 16000)) * 0.01).astype(np.float32)
+    audio_seconds = len(audio) / 16000
+
+    rtf = {}
+    for name in WHISPER_MODELS:
+        model = whisper.load_model(name)
+        model.transcribe(audio[:16000], fp16=False)  # warm-up
+        start = time.time()
+        model.transcribe(audio, fp16=False)
+        rtf[name] = (time.time() - start) / audio_seconds
+        print(f"  Whisper {name}: RTF {rtf[name]:.2f}")
+        del model
+        if rtf[name] > STT_MAX_RTF:
+            break  # larger models are only slower
+
+    fitting = [name for name in WHISPER_MODELS if rtf.get(name, float("inf")) <= STT_MAX_RTF]
+    return {
+        "measurements": {"stt_real_time_factor": rtf},
+        "settings": {"whisper_model": fitting[-1] if fitting else WHISPER_MODELS[0]},
+    }
+
+
+def calibrate_capture(vlm_max_side: Optional[int]) -> Dict:
+    """
+    Time to prepare one capture for the VLM per camera resolution; picks the largest within CAPTURE_ENCODE_TARGET_S.
+    """
+    from PIL import Image
+    from batch_captioning import load_and_encode_image
+
+    seconds = {}
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in CAPTURE_SIZES:
+            path = Path(tmp) / f"{width}x{height}.jpg"
+            # noise compresses like a detailed photo
+            Image.fromarray(rng.integers(0, 255, (height, width, 3), dtype=np.uint8)).save(path, quality=90)
+            start = time.time()
+            # without a VLM side limit the full image is still decoded, by the VLM server instead
+            load_and_encode_image(path, vlm_max_side or max(width, height))
+            seconds[f"{width}x{height}"] = time.time() - start
+
+    width, height = next(((w, h) for w, h in CAPTURE_SIZES if seconds[f"{w}x{h}"] <= CAPTURE_ENCODE_TARGET_S),
+                         CAPTURE_SIZES[-1])
+    print(f"  Capture: {width}x{height}")
+    return {
+        "measurements": {"capture_encode_seconds": seconds},
+        "settings": {"capture_width": width, "capture_height": height},
+    }
+
+
+def autotune(output: Path = PROFILE_PATH, skip: List[str] = (), image_path: Optional[Path] = None,
+             speech_wav: Optional[Path] = None) -> Dict:
+    """
+    Run the calibration suite and write the profile. Settings of skipped or failed steps keep their current value.
+    """
+    profile = load_profile(output)
+    profile["device"] = describe_device()
+    settings = profile["settings"]
+    print(f"🔧 Calibrating {profile['device']['model']} ({profile['device']['cpus']} CPUs)")
+
+    steps = {
+        "embedding": lambda: calibrate_embedding(),
+        "vlm": lambda: calibrate_vlm(image_path or sample_image(), DEFAULT_SETTINGS["vlm_num_predict"]),
+        "llm": lambda: calibrate_llm(),
+        "stt": lambda: calibrate_stt(settings["record_seconds"], speech_wav),
+        "capture": lambda: calibrate_capture(settings["vlm_max_side"]),
+    }
+    for name, step in steps.items():
+        if name in skip:
+            continue
+        print(f"⏱️ {name}")
+        try:
+            result = step()
+        except Exception as e:
+            print(f"⚠️ {name} calibration failed, keeping current settings: {e}")
+            continue
+        profile["measurements"].update(result["measurements"])
+        settings.update(result["settings"])
+
+    profile["tuned_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    save_profile(profile, output)
+    print(f"✅ Wrote {output}:")
+    for key, value in settings.items():
+        print(f"  {key} = {value}")
+    return profile
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calibrate pipeline settings for this device and write a hardware profile.")
+    parser.add_argument("--output", type=Path, default=PROFILE_PATH)
+    parser.add_argument("--skip", nargs="*", default=[], choices=["embedding", "vlm", "llm", "stt", "capture"])
+    parser.add_argument("--image", type=Path, default=None, help="photo for VLM timing (default: newest in memory_images)")
+    parser.add_argument("--speech-wav", type=Path, default=None, help="16 kHz speech recording for Whisper timing")
+    args = parser.parse_args()
+
+    autotune(args.output, skip=args.skip, image_path=args.image, speech_wav=args.speech_wav)
@@ -0,0 +1,219 @@
+# batch_captioning.py
+
+from pathlib import Path
+import base64
+import io
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Optional
+import ollama
+from PIL import Image
+
+from image_processing import parse_image_timestamp, build_caption_prompt, VLM_MODEL, VLM_OPTIONS
+from image_dedup import shared_hash_index, HASH_INDEX_PATH
+from hardware_profile import setting
+from model_residency import use_ollama_model, OLLAMA_KEEP_ALIVE
+from memory_store import append_entries, load_entries, writer_lock
+
+# Config
+# Requests kept in flight at the VLM server. Ollama only runs them in parallel
+# when started with OLLAMA_NUM_PARALLEL >= this value; otherwise they queue
+# server-side, which still hides the decode/encode and HTTP time.
+VLM_CONCURRENCY = 2
+DECODE_WORKERS = 2
+# Longest image side sent to the VLM (None keeps the original capture size), see autotune.py.
+MAX_IMAGE_SIDE = setting("vlm_max_side")
+# next to output_json: one backlog pass at a time (the voice loop, the local API, another process)
+CAPTION_LOCK_NAME = ".caption_backlog.lock"
+
+
+def load_and_encode_image(img_path: Path, max_side: Optional[int] = None) -> str:
+    """
+    Read an image and return it base64-encoded, optionally downscaled so its longest side is max_side.
+    """
+    if max_side is None:
+        with open(img_path, "rb") as f:
+            return base64.b64encode(f.read()).decode("utf-8")
+
+    with Image.open(img_path) as image:
+        image = image.convert("RGB")
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def caption_image(client, img_path: Path, dt: str, encoded_image: str, keep_alive=None) -> Dict:
+    """
+    Caption one base64-encoded image and return it as a model memory entry.
+    """
+    response = client.generate(
+        model=VLM_MODEL,
+        prompt=build_caption_prompt(dt),
+        images=[encoded_image],
+        options=VLM_OPTIONS,
+        keep_alive=keep_alive
+    )
+    return {
+        "timestamp": dt,
+        "description": response["response"].strip(),
+        "image_path": str(img_path),
+        "source": "model"
+    }
+
+
+def _caption_one(client, img_path: Path, dt: str, encoded_future, keep_alive=None) -> Dict:
+    return caption_image(client, img_path, dt, encoded_future.result(), keep_alive)
+
+
+def caption_backlog(image_folder: Path, output_json: Path,
+                    concurrency: int = VLM_CONCURRENCY,
+                    decode_workers: int = DECODE_WORKERS,
+                    max_side: Optional[int] = MAX_IMAGE_SIDE,
+                    host: Optional[str] = None,
+                    dedup: bool = True,
+                    hash_index_path: Path = HASH_INDEX_PATH) -> Dict:
+    """
+    Caption every uncaptioned image in image_folder with a bounded number of concurrent VLM requests.
+
+    Images are decoded/encoded in a thread pool while earlier ones are being captioned, and each
+    caption is appended to output_json as soon as it arrives, so an interrupted run keeps its progress.
+
+    With dedup enabled, an image whose bytes or perceptual hash match an already indexed photo is not
+    sent to the VLM: it gets a copy of that photo's caption with "duplicate_of" pointing at it.
+
+    Passes over the same output_json run one at a time: a second call waits for the first and then
+    only captions what is still missing.
+
+    Returns:
+        Dict: processed / failed counts, elapsed seconds and images_per_minute.
+    """
+    output_json = Path(output_json)
+    with writer_lock(output_json.parent, CAPTION_LOCK_NAME):
+        return _caption_backlog(Path(image_folder), output_json, concurrency, decode_workers, max_side, host,
+                                dedup, hash_index_path)
+
+
+def _caption_backlog(image_folder: Path, output_json: Path, concurrency: int, decode_workers: int,
+                     max_side: Optional[int], host: Optional[str], dedup: bool, hash_index_path: Path) -> Dict:
+    client = ollama.Client(host=host) if host else ollama.Client()
+
+    captions_by_path = {entry["image_path"]: entry for entry in load_entries(output_json)}
+    hash_index = shared_hash_index(hash_index_path) if dedup else None
+
+    if hash_index is not None:
+        hash_index.update_folder(image_folder)
+
+    candidates = []
+    for img_path in sorted(image_folder.glob("*.jpg")):
+        if str(img_path) in captions_by_path:
+            continue
+        dt = parse_image_timestamp(img_path)
+        if dt is None:
+            print(f"⚠️ Unexpected filename format: {img_path.name}, skipping.")
+            continue
+        canonical = hash_index.canonical_of(str(img_path)) if hash_index is not None else str(img_path)
+        candidates.append((img_path, dt, canonical))
+
+    # an image is only reused if its original already has, or is about to get, a caption
+    originals = set(str(img_path) for img_path, _, canonical in candidates if canonical == str(img_path))
+    backlog, duplicates = [], []
+    for img_path, dt, canonical in candidates:
+        if canonical != str(img_path) and (canonical in captions_by_path or canonical in originals):
+            duplicates.append((img_path, dt, canonical))
+        else:
+            backlog.append((img_path, dt))
+
+    stats = {"processed": 0, "failed": 0, "reused": 0, "elapsed": 0.0, "images_per_minute": 0.0}
+    if not backlog and not duplicates:
+        print("⚡ No new images to caption.")
+        return stats
+
+    print(f"🚀 Captioning {len(backlog)} images ({len(duplicates)} duplicates reuse captions) with {concurrency} in-flight VLM requests...")
+    start = time.time()
+    # Keep one extra decoded image queued per slot so the VLM never waits on JPEG work,
+    # without holding the whole backlog in memory.
+    window = max(1, concurrency) * 2
+    todo = iter(backlog)
+    pending = {}
+    # a local VLM stays resident (and pinned against eviction) for the whole backlog;
+    # a remote server manages its own models
+    keep_alive = OLLAMA_KEEP_ALIVE if host is None else None
+    residency_pin = use_ollama_model(VLM_MODEL) if host is None and backlog else nullcontext()
+
+    with residency_pin, ThreadPoolExecutor(max_workers=decode_workers) as decoder, \
+            ThreadPoolExecutor(max_workers=max(1, concurrency)) as vlm:
+
+        def submit_next() -> bool:
+            item = next(todo, None)
+            if item is None:
+                return False
+            img_path, dt = item
+            encoded = decoder.submit(load_and_encode_image, img_path, max_side)
+            pending[vlm.submit(_caption_one, client, img_path, dt, encoded, keep_alive)] = img_path
+            return True
+
+        while len(pending) < window and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            fresh = []
+            for future in done:
+                img_path = pending.pop(future)
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"❌ Failed to process {img_path.name}: {e}")
+                    continue
+                fresh.append(entry)
+                captions_by_path[entry["image_path"]] = entry
+                stats["processed"] += 1
+                print(f"✅ [{stats['processed']}/{len(backlog)}] {img_path.name}: {entry['description']}")
+            if fresh:
+                # merged into the latest file: a bulk import may have committed captions meanwhile
+                append_entries(output_json, fresh, unique_key="image_path")
+            while len(pending) < window and submit_next():
+                pass
+
+    reused = []
+    for img_path, dt, canonical in duplicates:
+        original = captions_by_path.get(canonical)
+        if original is None:
+            # original not captioned (failed or skipped); retried on the next run
+            continue
+        reused.append({
+            "timestamp": dt,
+            "description": original["description"],
+            "image_path": str(img_path),
+            "source": "model",
+            "duplicate_of": canonical
+        })
+        stats["reused"] += 1
+    if reused:
+        append_entries(output_json, reused, unique_key="image_path")
+        print(f"🔁 Reused captions for {stats['reused']} duplicate images.")
+
+    stats["elapsed"] = time.time() - start
+    stats["images_per_minute"] = stats["processed"] / stats["elapsed"] * 60 if stats["elapsed"] > 0 else 0.0
+    print(f"\n🎯 Captioned {stats['processed']} images ({stats['failed']} failed) in "
+          f"{stats['elapsed']:.1f}s — {stats['images_per_minute']:.1f} images/min.")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Caption the memory_images backlog with the local VLM.")
+    parser.add_argument("--images", default="memory_images")
+    parser.add_argument("--output", default="memory_text_model.json")
+    parser.add_argument("--concurrency", type=int, default=VLM_CONCURRENCY)
+    parser.add_argument("--decode-workers", type=int, default=DECODE_WORKERS)
+    parser.add_argument("--max-side", type=int, default=MAX_IMAGE_SIDE)
+    parser.add_argument("--host", default=None)
+    args = parser.parse_args()
+
+    caption_backlog(Path(args.images), Path(args.output), concurrency=args.concurrency,
+                    decode_workers=args.decode_workers, max_side=args.max_side, host=args.host)
@@ -0,0 +1,338 @@
+# bulk_import.py
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager, suppress
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from typing import Dict, List, Optional
+import ollama
+from PIL import Image, ImageOps
+
+from image_processing import parse_image_timestamp, VLM_MODEL
+from image_dedup import file_sha256, shared_hash_index
+from batch_captioning import caption_image, load_and_encode_image, VLM_CONCURRENCY
+from memory_combiner import aggregate_memories, parse_timestamp
+from vector_store import initialize_vector_store
+from shard_store import ShardManifest, add_image_memories_sharded
+from memory_store import append_entries, load_entries, write_json_atomic, writer_lock, claim_index_owner, INDEX_LOCK_NAME
+from model_residency import residency, use_ollama_model, OLLAMA_KEEP_ALIVE
+
+# Config
+IMPORT_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+# same size libcamera-still captures at
+IMPORT_MAX_SIDE = 2304
+DECODE_PROCESSES = max(1, (os.cpu_count() or 2) - 1)
+# images per embed + checkpoint commit
+COMMIT_BATCH = 32
+STATE_PATH = Path("bulk_import_state.json")
+
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+
+
+def read_capture_time(src: Path, image: Image.Image) -> datetime:
+    """
+    Capture time from an img_YYYYMMDD_HHMMSS name, else EXIF DateTimeOriginal/DateTime, else the file mtime.
+    """
+    dt = parse_image_timestamp(src)
+    if dt and len(dt) >= 16:
+        return parse_timestamp(dt)
+    exif = image.getexif()
+    raw = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    if raw:
+        try:
+            return datetime.strptime(str(raw).strip("\x00 "), "%Y:%m:%d %H:%M:%S")
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(src.stat().st_mtime)
+
+
+def prepare_photo(src: str, dest_folder: str, max_side: int) -> Dict:
+    """
+    Worker-process stage: hash, read the capture time, rotate/resize and write a temporary JPEG into dest_folder.
+    """
+    src = Path(src)
+    data = src.read_bytes()
+    sha256 = hashlib.sha256(data).hexdigest()
+    # a name of its own per task: identical files can be prepared at the same time
+    fd, tmp_path = tempfile.mkstemp(prefix=".import-", suffix=".tmp", dir=dest_folder)
+    try:
+        with os.fdopen(fd, "wb") as out, Image.open(src) as image:
+            taken = read_capture_time(src, image)
+            image.draft("RGB", (max_side, max_side))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+            image.save(out, format="JPEG", quality=90)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return {"src": str(src), "sha256": sha256, "tmp_path": tmp_path, "taken": taken.strftime("%Y%m%d_%H%M%S"),
+            "prepared_sha256": file_sha256(Path(tmp_path))}
+
+
+def unique_image_path(dest_folder: Path, taken: str) -> Path:
+    path = dest_folder / f"img_{taken}.jpg"
+    n = 2
+    while path.exists():
+        # img_YYYYMMDD_HHMMSS_N.jpg still parses with image_processing.parse_image_timestamp
+        path = dest_folder / f"img_{taken}_{n}.jpg"
+        n += 1
+    return path
+
+
+def find_prepared(dest_folder: Path, taken: str, prepared_sha256: str) -> Optional[Path]:
+    """
+    The photo a previous run already moved into dest_folder but stopped before checkpointing, if any:
+    re-encoding is deterministic, so it has the same name prefix and the same bytes.
+    """
+    for path in sorted(dest_folder.glob(f"img_{taken}*.jpg")):
+        if file_sha256(path) == prepared_sha256:
+            return path
+    return None
+
+
+def source_key(src: Path) -> str:
+    stat = src.stat()
+    return f"{src}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+class ImportState:
+    """
+    Checkpoint of a bulk import: which source photos reached which stage (prepared -> captioned -> indexed).
+    """
+
+    def __init__(self, state_path: Path = STATE_PATH):
+        self.state_path = Path(state_path)
+        self.sources: Dict[str, Dict] = {}
+        if self.state_path.exists():
+            with open(self.state_path, "r") as f:
+                self.sources = json.load(f).get("sources", {})
+        self.shas = {s["sha256"]: key for key, s in self.sources.items()}
+
+    def save(self) -> None:
+        write_json_atomic(self.state_path, {"sources": self.sources})
+
+    def set(self, key: str, **fields) -> None:
+        self.sources.setdefault(key, {}).update(fields)
+        if "sha256" in fields:
+            self.shas[fields["sha256"]] = key
+
+
+@contextmanager
+def pinned_vlm(host: Optional[str], caption: bool):
+    """
+    Keep a local VLM resident for the whole import, and unload it (keep_alive=0) when the import ends:
+    nothing manages it once this process exits.
+    """
+    if host is not None or not caption:
+        yield
+        return
+    try:
+        with use_ollama_model(VLM_MODEL):
+            yield
+    finally:
+        residency.unload(VLM_MODEL)
+
+
+def find_photos(library: Path) -> List[Path]:
+    return sorted(p for p in Path(library).rglob("*") if p.suffix.lower() in IMPORT_EXTENSIONS and p.is_file())
+
+
+def bulk_import(library: Path, image_folder: Path = Path("memory_images"),
+                model_output_json: Path = Path("memory_text_model.json"),
+                chroma_persist_dir: str = "chroma_db", base_name: str = "memories_by_image",
+                caption: bool = True, concurrency: int = VLM_CONCURRENCY,
+                processes: int = DECODE_PROCESSES, max_side: int = IMPORT_MAX_SIDE,
+                state_path: Path = STATE_PATH, host: Optional[str] = None) -> Dict:
+    """
+    Import a photo library in three pipelined stages with checkpoints, resuming where a previous run stopped:
+
+    1. decode + resize in a process pool into memory_images/ (timestamps from EXIF when filenames do not match),
+    2. caption with a bounded number of in-flight VLM requests,
+    3. embed and commit to the sharded vector store every COMMIT_BATCH images.
+
+    While the assistant (or the local service) is running it owns the Chroma store: the captions are then
+    only committed to model_output_json, and the owner indexes each commit as it lands.
+    """
+    image_folder = Path(image_folder)
+    image_folder.mkdir(parents=True, exist_ok=True)
+    state = ImportState(state_path)
+    index_here = claim_index_owner(Path(chroma_persist_dir), blocking=False)
+    if index_here:
+        client = initialize_vector_store(persist_dir=chroma_persist_dir)
+        manifest = ShardManifest(Path(chroma_persist_dir) / "shards.json")
+    else:
+        print("🔗 The assistant owns the index: captions are committed to the memory files and indexed by it.")
+    vlm = ollama.Client(host=host) if host else ollama.Client()
+
+    captions_by_path = {entry["image_path"]: entry for entry in load_entries(model_output_json)}
+    # photos already in image_folder, so an imported copy or near-duplicate of one reuses its caption
+    hash_index = shared_hash_index()
+    if caption:
+        hash_index.update_folder(image_folder)
+
+    photos = find_photos(library)
+    to_prepare, to_caption = [], []
+    for src in photos:
+        key = source_key(src)
+        stage = state.sources.get(key, {}).get("stage")
+        if stage == "indexed":
+            continue
+        if stage in ("prepared", "captioned") and Path(state.sources[key]["image_path"]).exists():
+            to_caption.append(key)
+        else:
+            to_prepare.append(src)
+    already = len(photos) - len(to_prepare) - len(to_caption)
+    print(f"📚 {len(photos)} photos found: {already} already imported, {len(to_caption)} resumed, {len(to_prepare)} new.")
+
+    stats = {"indexed": already, "captioned": 0, "reused": 0, "duplicates": 0, "failed": 0, "total": len(photos)}
+    uncommitted: List[str] = []
+    start = time.time()
+
+    def commit() -> None:
+        if not uncommitted:
+            return
+        batch_entries = [captions_by_path[state.sources[k]["image_path"]] for k in uncommitted
+                         if state.sources[k]["image_path"] in captions_by_path]
+        if index_here:
+            with writer_lock(Path(chroma_persist_dir), INDEX_LOCK_NAME):
+                append_entries(model_output_json, batch_entries, unique_key="image_path")
+                if batch_entries:
+                    records = aggregate_memories([], batch_entries)
+                    add_image_memories_sharded(client, records, manifest, base_name=base_name,
+                                               sentence_vectors=True)
+        else:
+            # "indexed" from here on means handed to the index owner
+            append_entries(model_output_json, batch_entries, unique_key="image_path")
+        for k in uncommitted:
+            state.set(k, stage="indexed")
+        stats["indexed"] += len(uncommitted)
+        uncommitted.clear()
+        state.save()
+        hash_index.save()
+        elapsed = time.time() - start
+        done_now = stats["indexed"] - already
+        rate = done_now / elapsed * 60 if elapsed > 0 else 0.0
+        remaining = stats["total"] - stats["indexed"]
+        eta = remaining / rate if rate > 0 else float("inf")
+        print(f"📈 {stats['indexed']}/{stats['total']} imported — {rate:.1f} images/min, ETA {eta:.0f} min")
+
+    def caption_job(key: str) -> Optional[Dict]:
+        record = state.sources[key]
+        if not caption or record["image_path"] in captions_by_path:
+            return None
+        canonical = hash_index.add(Path(record["image_path"]), source_sha256=record["sha256"])["canonical"]
+        if canonical != record["image_path"] and canonical in captions_by_path:
+            return {
+                "timestamp": record["timestamp"],
+                "description": captions_by_path[canonical]["description"],
+                "image_path": record["image_path"],
+                "source": "model",
+                "duplicate_of": canonical
+            }
+        encoded = load_and_encode_image(Path(record["image_path"]))
+        return caption_image(vlm, Path(record["image_path"]), record["timestamp"], encoded, keep_alive)
+
+    prepare_window = processes * 2
+    caption_window = max(1, concurrency) * 2
+    prepare_iter = iter(to_prepare)
+    preparing, captioning = {}, {}
+    # as in caption_backlog: a local VLM stays resident and pinned for the whole import
+    keep_alive = OLLAMA_KEEP_ALIVE if host is None else None
+
+    with pinned_vlm(host, caption), ProcessPoolExecutor(max_workers=processes) as pool, \
+            ThreadPoolExecutor(max_workers=max(1, concurrency)) as captioners:
+
+        def refill() -> None:
+            while to_caption and len(captioning) < caption_window:
+                key = to_caption.pop(0)
+                captioning[captioners.submit(caption_job, key)] = key
+            while len(preparing) < prepare_window and len(to_caption) < caption_window:
+                src = next(prepare_iter, None)
+                if src is None:
+                    break
+                preparing[pool.submit(prepare_photo, str(src), str(image_folder), max_side)] = src
+
+        refill()
+        while preparing or captioning:
+            done, _ = wait(list(preparing) + list(captioning), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in preparing:
+                    src = preparing.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        stats["failed"] += 1
+                        print(f"❌ Failed to read {src}: {e}")
+                        continue
+                    key = source_key(src)
+                    if result["sha256"] in state.shas and state.shas[result["sha256"]] != key:
+                        with suppress(FileNotFoundError):
+                            os.remove(result["tmp_path"])
+                        state.set(key, sha256=result["sha256"], stage="indexed",
+                                  image_path=state.sources[state.shas[result["sha256"]]].get("image_path"))
+                        stats["duplicates"] += 1
+                        stats["indexed"] += 1
+                        continue
+                    # the state is only saved on commit(), so after a restart the photo may already be there
+                    dest = find_prepared(image_folder, result["taken"], result["prepared_sha256"])
+                    if dest is not None:
+                        os.remove(result["tmp_path"])
+                    else:
+                        dest = unique_image_path(image_folder, result["taken"])
+                        os.replace(result["tmp_path"], dest)
+                    state.set(key, sha256=result["sha256"], image_path=str(dest),
+                              timestamp=parse_image_timestamp(dest), stage="prepared")
+                    to_caption.append(key)
+                else:
+                    key = captioning.pop(future)
+                    try:
+                        entry = future.result()
+                    except Exception as e:
+                        # stays "prepared" and is retried on the next run
+                        stats["failed"] += 1
+                        print(f"❌ Failed to caption {state.sources[key]['image_path']}: {e}")
+                        continue
+                    if entry:
+                        captions_by_path[entry["image_path"]] = entry
+                        stats["reused" if "duplicate_of" in entry else "captioned"] += 1
+                    state.set(key, stage="captioned")
+                    uncommitted.append(key)
+                    if len(uncommitted) >= COMMIT_BATCH:
+                        commit()
+            refill()
+
+    commit()
+    state.save()
+    stats["elapsed"] = time.time() - start
+    print(f"\n🎯 Import finished: {stats['indexed']}/{stats['total']} photos, {stats['captioned']} captioned, "
+          f"{stats['reused']} reused captions, {stats['duplicates']} duplicates, {stats['failed']} failed "
+          f"in {stats['elapsed'] / 60:.1f} min.")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Resumable bulk import of an existing photo library.")
+    parser.add_argument("library", help="folder with photos (searched recursively)")
+    parser.add_argument("--images", default="memory_images")
+    parser.add_argument("--output", default="memory_text_model.json")
+    parser.add_argument("--chroma", default="chroma_db")
+    parser.add_argument("--no-caption", action="store_true", help="only copy photos (visual index still finds them)")
+    parser.add_argument("--concurrency", type=int, default=VLM_CONCURRENCY)
+    parser.add_argument("--processes", type=int, default=DECODE_PROCESSES)
+    parser.add_argument("--max-side", type=int, default=IMPORT_MAX_SIDE)
+    parser.add_argument("--state", default=str(STATE_PATH))
+    parser.add_argument("--host", default=None)
+    args = parser.parse_args()
+
+    bulk_import(Path(args.library), image_folder=Path(args.images), model_output_json=Path(args.output),
+                chroma_persist_dir=args.chroma, caption=not args.no_caption, concurrency=args.concurrency,
+                processes=args.processes, max_side=args.max_side, state_path=Path(args.state), host=args.host)
@@ -4,6 +4,8 @@ from datetime import datetime
 from pathlib import Path
 from pytz import timezone
 
+from hardware_profile import setting
+
 def capture_image(save_folder="memory_images"):
     """
     Capture an image using libcamera-still and save it to the specified folder.
@@ -24,8 +26,8 @@ def capture_image(save_folder="memory_images"):
         subprocess.run([
             "libcamera-still",
             "-o", str(filepath),
-            "--width", "2304",
-            "--height", "1296",
+            "--width", str(setting("capture_width")),
+            "--height", str(setting("capture_height")),
             "-t", "2000"  # make sure to clear
         ], check=True)
         print(f"✅ Captured and saved image: {filepath}")
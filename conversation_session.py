@@ -0,0 +1,143 @@
+# conversation_session.py
+
+import re
+import time
+import numpy as np
+from typing import Dict, List, Optional, Set
+
+from query_reasoning import MemoryReasoning, STRUCTURED_MODE, build_constrained_prompt, build_followup_prompt, \
+    chat_structured, generate_answer
+
+# Config
+# a question asked within this many seconds of the previous answer can continue the conversation
+SESSION_TTL_S = 120
+# candidates kept per session; older ones are already in the LLM context, this only bounds the prompt growth
+MAX_SESSION_MEMORIES = 20
+
+FOLLOW_UP_PATTERN = re.compile(
+    r"^(and|also|then|so|but)\b|^what about\b|^how about\b|^what else\b|\bbefore that\b|\bafter that\b"
+    r"|\b(it|that|there|them|those|this)\b\W*$"
+)
+STOPWORDS = {
+    "a", "about", "after", "again", "all", "also", "am", "an", "and", "any", "are", "at", "be", "before", "but",
+    "by", "can", "could", "did", "do", "does", "else", "for", "from", "had", "has", "have", "how", "i", "in", "is",
+    "it", "its", "me", "my", "of", "on", "or", "put", "saw", "see", "so", "that", "the", "them", "then", "there",
+    "this", "those", "to", "was", "were", "what", "when", "where", "which", "who", "why", "with", "you", "your",
+    "earlier", "later", "last", "left", "today", "yesterday", "morning", "afternoon", "evening", "night", "time",
+}
+
+
+def content_words(text: str) -> Set[str]:
+    return {w for w in re.findall(r"[a-z']+", text.lower()) if w not in STOPWORDS and len(w) > 2}
+
+
+class ConversationSession:
+    """
+    State of one spoken conversation: the retrieved candidates, the first question's embedding and the chat
+    messages already sent to the LLM.
+
+    Follow-ups reuse the candidates and only add records for entities not asked about before, retrieved with
+    the follow-up's embedding blended with the first question's. The chat history is resent unchanged as a
+    prefix, so Ollama can reuse the KV cache of the earlier turns instead of re-reading the whole prompt.
+    """
+
+    def __init__(self, ttl_s: float = SESSION_TTL_S):
+        self.ttl_s = ttl_s
+        self.memories: List[Dict] = []
+        self.sent_count = 0  # memories the LLM has already seen, in order
+        self.messages: List[Dict] = []
+        # the last LLM turn, added to messages by commit_answer() once the answer was actually used
+        self.pending: Optional[Dict] = None
+        # bumped per question and when its answer is committed; a completion for an older value is stale
+        self.turn_token = 0
+        self.query_embedding: Optional[List[float]] = None
+        self.questions: List[str] = []
+        self.seen_words: Set[str] = set()
+        self.last_used = time.time()
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) - self.last_used > self.ttl_s
+
+    def is_follow_up(self, question: str) -> bool:
+        if not self.questions or self.expired():
+            return False
+        return bool(FOLLOW_UP_PATTERN.search(question.lower().strip(" ?.!")))
+
+    def new_entities(self, question: str) -> Set[str]:
+        """
+        Content words of the question that earlier questions and candidates did not mention.
+        """
+        return content_words(question) - self.seen_words
+
+    def add_candidates(self, memories: List[Dict]) -> int:
+        """
+        Append memories not already in the session; returns how many were added.
+        """
+        known = {m["image_path"] for m in self.memories}
+        added = 0
+        for memory in memories:
+            if memory["image_path"] in known or len(self.memories) >= MAX_SESSION_MEMORIES:
+                continue
+            self.memories.append(memory)
+            known.add(memory["image_path"])
+            self.seen_words |= content_words(memory["description"])
+            added += 1
+        return added
+
+    def followup_embedding(self, query_embedding: List[float]) -> List[float]:
+        """
+        Normalized mean of the first question's embedding and a follow-up's, so an elliptical follow-up
+        ("what about the keys?") is still searched in the context of the conversation.
+        """
+        if self.query_embedding is None:
+            return query_embedding
+        blended = np.asarray(self.query_embedding) + np.asarray(query_embedding)
+        return (blended / np.linalg.norm(blended)).tolist()
+
+    def record_question(self, question: str, query_embedding: Optional[List[float]] = None) -> None:
+        if not self.questions:
+            self.query_embedding = query_embedding
+        self.questions.append(question)
+        self.seen_words |= content_words(question)
+        self.last_used = time.time()
+
+    def answer(self, query: str, memories: Optional[List[Dict]] = None,
+               model_name: str = "llama3.2:3b") -> MemoryReasoning:
+        """
+        Answer the next question of the conversation. `memories` is accepted for compatibility with
+        generate_answer and ignored: the session's candidates are used.
+        """
+        if STRUCTURED_MODE != "schema":
+            # only the schema path keeps chat state; the others answer statelessly over all candidates
+            return generate_answer(query=query, memories=self.memories)
+
+        self.turn_token += 1
+        token = self.turn_token
+        if not self.messages:
+            content = build_constrained_prompt(query, self.memories)
+        else:
+            content = build_followup_prompt(query, self.memories[self.sent_count:], start=self.sent_count + 1)
+        messages = self.messages + [{"role": "user", "content": content}]
+        answer, raw = chat_structured(messages, self.memories, model_name)
+
+        # an answer that misses the fast-path deadline is dropped, and must not become part of the chat,
+        # replace a newer question's pending turn or keep the session alive
+        if token != self.turn_token:
+            return answer
+        self.pending = {"answer": answer, "messages": messages + [{"role": "assistant", "content": raw}],
+                        "sent_count": len(self.memories)}
+        self.last_used = time.time()
+        return answer
+
+    def commit_answer(self, answer: MemoryReasoning) -> None:
+        """
+        Record the turn that produced `answer` in the chat history; any other answer (the fast template) is ignored.
+        """
+        # the question is settled either way; its LLM call may still finish later
+        self.turn_token += 1
+        if self.pending is None or self.pending["answer"] is not answer:
+            self.pending = None
+            return
+        self.messages = self.pending["messages"]
+        self.sent_count = self.pending["sent_count"]
+        self.pending = None
@@ -0,0 +1,86 @@
+# embedding_cascade.py
+
+from typing import Callable, Dict, List, Optional
+import chromadb
+import numpy as np
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+from vector_store import embed_passages, embed_query, select_memories, DEDUP_OVERFETCH
+from model_residency import residency
+from tracing import span
+
+# Config
+# every memory is indexed with the small model; only retrieved candidates ever get an e5-base vector
+SMALL_MODEL = "BAAI/bge-small-en-v1.5"
+# bge's instruction for short queries against passages (passages need none)
+SMALL_QUERY_INSTRUCTION = "Represent this sentence for searching relevant passages: "
+SMALL_COLLECTION = "memories_small"
+# e5-base vectors of reranked candidates, same ids as the small collection
+RERANK_CACHE_COLLECTION = "memories_e5_cache"
+# candidates pulled from the small index and rescored with e5-base
+CASCADE_CANDIDATES = 40
+
+residency.register("embedder_small", footprint_mb=150, reload_s=2, priority=1,
+                   load=lambda: HuggingFaceEmbedding(model_name=SMALL_MODEL))
+
+
+def embed_passages_small(texts: List[str]) -> List[List[float]]:
+    """
+    Small-model vectors for "passage: ..." documents (the e5 prefix is dropped, the stored text keeps it).
+    """
+    with residency.use("embedder_small") as model:
+        return model.get_text_embedding_batch([t.removeprefix("passage: ") for t in texts])
+
+
+def embed_query_small(query_text: str) -> List[float]:
+    with residency.use("embedder_small") as model, span("embed", model=SMALL_MODEL):
+        return model.get_text_embedding(SMALL_QUERY_INSTRUCTION + query_text)
+
+
+def rerank_vectors(client: chromadb.Client, ids: List[str], documents: List[str],
+                   cache_name: str = RERANK_CACHE_COLLECTION) -> np.ndarray:
+    """
+    e5-base vectors for the candidates: cached ones are read back, the rest are embedded now and cached.
+    """
+    cache = client.get_or_create_collection(name=cache_name)
+    cached = cache.get(ids=ids, include=["embeddings"])
+    vectors = dict(zip(cached["ids"], cached["embeddings"]))
+    missing = [(mem_id, doc) for mem_id, doc in zip(ids, documents) if mem_id not in vectors]
+    if missing:
+        with span("rerank_embed", docs=len(missing)):
+            embeddings = embed_passages([doc for _, doc in missing])
+        cache.add(ids=[mem_id for mem_id, _ in missing], embeddings=embeddings)
+        vectors.update(zip((mem_id for mem_id, _ in missing), embeddings))
+    return np.array([vectors[mem_id] for mem_id in ids], dtype=np.float32)
+
+
+def query_cascade(client: chromadb.Client, query_text: str, top_k: int = 5,
+                  candidates: int = CASCADE_CANDIDATES, collection_name: str = SMALL_COLLECTION,
+                  canonical_of: Optional[Callable[[str], str]] = None,
+                  query_embedding: Optional[List[float]] = None) -> List[Dict]:
+    """
+    Pull `candidates` memories from the small-model index, rescore them with e5-base and return the top_k.
+
+    Results have the same form and similarity scale as query_similar_memories. A precomputed e5
+    query_embedding (from embed_query) is used for the rescoring step.
+    """
+    collection = client.get_or_create_collection(name=collection_name)
+    with span("chroma_query", collection=collection_name, tier="small"):
+        results = collection.query(
+            query_embeddings=[embed_query_small(query_text)],
+            n_results=max(candidates, top_k * DEDUP_OVERFETCH),
+            include=["metadatas", "documents"]
+        )
+    ids = results["ids"][0]
+    if not ids:
+        return []
+
+    if query_embedding is None:
+        query_embedding = embed_query(query_text)
+    with span("rerank", candidates=len(ids)):
+        vectors = rerank_vectors(client, ids, results["documents"][0])
+        # squared L2, the distance Chroma reports for the single-model collection
+        distances = ((vectors - np.asarray(query_embedding, dtype=np.float32)) ** 2).sum(axis=1)
+        order = np.argsort(distances)
+    metadatas = results["metadatas"][0]
+    return select_memories([metadatas[i] for i in order], [float(distances[i]) for i in order], top_k, canonical_of)
@@ -0,0 +1,107 @@
+# fast_answer.py
+
+import re
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from datetime import datetime
+from typing import Callable, List, Dict, Optional, Tuple
+
+from memory_combiner import parse_timestamp
+from query_reasoning import MemoryReasoning, generate_answer
+from hardware_profile import setting
+
+# Config
+# "speak": say the template answer right away, then the LLM answer if it is ready in time
+# "fallback": stay silent and only use the template answer if the LLM misses the deadline
+FAST_ANSWER_MODE = "speak"
+LLM_DEADLINE_S = setting("llm_deadline_s")
+
+
+def describe_time(timestamp: str, now: Optional[datetime] = None) -> str:
+    now = now or datetime.now()
+    try:
+        dt = parse_timestamp(timestamp)
+    except ValueError:
+        return f"from {timestamp}"
+    clock = dt.strftime("%H:%M")
+    if dt.date() == now.date():
+        return f"at {clock} today"
+    if (now.date() - dt.date()).days == 1:
+        return f"at {clock} yesterday"
+    return f"from {dt.strftime('%B')} {dt.day} at {clock}"
+
+
+def _first_sentence(text: str) -> str:
+    return re.split(r"(?<=[.!?])\s+", text.strip(), maxsplit=1)[0]
+
+
+def build_fast_answer(memories: List[Dict]) -> Optional[MemoryReasoning]:
+    """
+    Template answer from the top retrieved memory, e.g. "Your note at 16:37 today says: I placed the phone next to the laptop."
+    """
+    if not memories:
+        return None
+    top = memories[0]
+    when = describe_time(top["timestamp"])
+    description = top["description"]
+
+    # merged per-image documents: "User note: ... | Photo description: ..."
+    parts = dict(p.split(": ", 1) for p in description.split(" | ") if ": " in p)
+    note = parts.get("User note") if "User note" in parts else (description if top["source"] == "user" else None)
+    caption = parts.get("Photo description") if "Photo description" in parts else \
+        (description if top["source"] == "model" else None)
+
+    if note:
+        summary = f"Your note {when} says: {note.strip()}"
+    elif caption:
+        summary = f"A photo {when} shows: {_first_sentence(caption)}"
+    else:
+        summary = f"The closest match is a photo {when}."
+    return MemoryReasoning(summary=summary, image_refs=[top["image_path"]])
+
+
+def _run_in_thread(fn: Callable, **kwargs) -> Future:
+    """
+    Run fn on a thread of its own: a call that misses its deadline keeps running without delaying the next one.
+    """
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(**kwargs))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def answer_with_fast_path(query: str, memories: List[Dict], speak: Callable[[str], None],
+                          mode: str = FAST_ANSWER_MODE, deadline_s: float = LLM_DEADLINE_S,
+                          llm_fn: Callable[..., MemoryReasoning] = generate_answer) -> Tuple[MemoryReasoning, bool]:
+    """
+    Run llm_fn (generate_answer by default) in the background and cover its latency with the template answer.
+
+    Returns:
+        Tuple[MemoryReasoning, bool]: the answer to use, and whether it has already been spoken.
+    """
+    start = time.time()
+    fast = build_fast_answer(memories)
+    llm_future = _run_in_thread(llm_fn, query=query, memories=memories)
+    if fast is None:
+        return llm_future.result(), False
+
+    spoken = False
+    if mode == "speak":
+        speak(fast.summary)  # the LLM keeps generating while this plays
+        spoken = True
+
+    try:
+        return llm_future.result(timeout=max(0.0, deadline_s - (time.time() - start))), False
+    except TimeoutError:
+        # the request cannot be cancelled; its answer is dropped when it arrives
+        print(f"⏱️ LLM missed the {deadline_s:g}s deadline, using the fast answer.")
+    except Exception as e:
+        print(f"[ERROR] LLM answer failed, using the fast answer: {e}")
+    return fast, spoken
@@ -0,0 +1,78 @@
+# hardware_profile.py
+
+from pathlib import Path
+import json
+import os
+import platform
+from typing import Any, Dict
+
+# Config
+# written by autotune.py on the target device; missing file or keys fall back to DEFAULT_SETTINGS
+PROFILE_PATH = Path(os.environ.get("MEMORY_PROFILE", "hardware_profile.json"))
+
+# the values the code used before profiles existed (tuned on a Raspberry Pi 5, 8 GB)
+DEFAULT_SETTINGS = {
+    "retrieval_top_k": 5,
+    "vlm_num_predict": 100,
+    "vlm_max_side": None,
+    "capture_width": 2304,
+    "capture_height": 1296,
+    "record_seconds": 5,
+    "whisper_model": "base.en",
+    "kws_threshold": 0.65,
+    "embed_batch_size": 8,
+    "llm_deadline_s": 12.0,
+    # None = a share of physical RAM, see model_residency.py
+    "model_budget_mb": None,
+}
+
+_profile = None
+
+
+def describe_device() -> Dict:
+    model = platform.machine()
+    try:
+        # e.g. "Raspberry Pi 5 Model B Rev 1.0"
+        model = Path("/proc/device-tree/model").read_text().strip("\x00\n ")
+    except OSError:
+        pass
+    try:
+        total_ram_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 / 1024
+    except (ValueError, OSError):
+        total_ram_mb = None
+    return {
+        "model": model,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "total_ram_mb": total_ram_mb,
+    }
+
+
+def load_profile(path: Path = PROFILE_PATH) -> Dict:
+    """
+    Return the profile at path ({"device", "measurements", "settings"}), with defaults for missing settings.
+    """
+    profile = {"device": {}, "measurements": {}, "settings": {}}
+    if path.exists():
+        with open(path, "r") as f:
+            profile.update(json.load(f))
+        print(f"⚙️ Loaded hardware profile for {profile['device'].get('model', 'unknown device')} from {path}")
+    profile["settings"] = {**DEFAULT_SETTINGS, **profile["settings"]}
+    return profile
+
+
+def save_profile(profile: Dict, path: Path = PROFILE_PATH) -> None:
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def setting(name: str) -> Any:
+    """
+    Value of one tuned setting; the profile is read once per process.
+    """
+    global _profile
+    if _profile is None:
+        _profile = load_profile()
+    return _profile["settings"][name]
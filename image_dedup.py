@@ -0,0 +1,236 @@
+# image_dedup.py
+
+from pathlib import Path
+import hashlib
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+from memory_store import write_json_atomic, writer_lock
+
+# Config
+HASH_INDEX_PATH = Path("image_hashes.json")
+# next to the hash index: held while a process merges its new records into the file
+HASH_LOCK_NAME = ".image_hashes.lock"
+# Max differing bits (out of 64) for two photos to count as near-duplicates.
+PHASH_MAX_DISTANCE = 6
+# The 64-bit hash is split into 8 one-byte bands: two hashes within 7 bits agree exactly on at least one
+# band, so only images sharing a band are compared (larger distances fall back to a full scan).
+PHASH_BANDS = 8
+
+
+def file_sha256(img_path: Path) -> str:
+    h = hashlib.sha256()
+    with open(img_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    m[0] *= 1 / np.sqrt(2)
+    return m * np.sqrt(2 / n)
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def compute_phash(img_path: Path) -> str:
+    """
+    64-bit perceptual hash: low-frequency 8x8 DCT block of a 32x32 grayscale thumbnail, thresholded at its median.
+    """
+    with Image.open(img_path) as image:
+        image.draft("L", (64, 64))  # let the JPEG decoder downscale, much cheaper than a full decode
+        pixels = np.asarray(image.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    dct = _DCT_32 @ pixels @ _DCT_32.T
+    block = dct[:8, :8].flatten()
+    bits = block > np.median(block[1:])
+    return "%016x" % int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+class ImageHashIndex:
+    """
+    Persistent sha256 + perceptual-hash index over memory_images/.
+
+    Every image maps to a canonical image: itself, or the earlier photo it duplicates
+    (same bytes under another name, or within PHASH_MAX_DISTANCE bits). Lookups go through a sha256
+    dict and a banded pHash index, so indexing N photos does not compare every pair.
+    """
+
+    def __init__(self, index_path: Path = HASH_INDEX_PATH, max_distance: int = PHASH_MAX_DISTANCE):
+        self.index_path = Path(index_path)
+        self.max_distance = max_distance
+        self.images: Dict[str, Dict] = self._load()
+        # records added or changed here since the last save; only these overwrite the file's copies
+        self.dirty = set()
+        self.by_sha: Dict[str, str] = {}
+        self.bands: List[Dict[str, List[str]]] = [{} for _ in range(PHASH_BANDS)]
+        self.order: Dict[str, int] = {}
+        # the captioner, the indexer and the local API share one instance per process
+        self.lock = threading.RLock()
+        for path, record in self.images.items():
+            self._index(path, record)
+
+    def _index(self, path: str, record: Dict) -> None:
+        self.by_sha.setdefault(record["sha256"], record["canonical"])
+        if record.get("source_sha256"):
+            self.by_sha.setdefault(record["source_sha256"], record["canonical"])
+        self.order[path] = len(self.order)
+        for band, value in enumerate(self._band_values(record["phash"])):
+            self.bands[band].setdefault(value, []).append(path)
+
+    @staticmethod
+    def _band_values(phash: str) -> List[str]:
+        return [phash[2 * i:2 * i + 2] for i in range(PHASH_BANDS)]
+
+    def _load(self) -> Dict[str, Dict]:
+        if not self.index_path.exists():
+            return {}
+        with open(self.index_path, "r") as f:
+            return json.load(f).get("images", {})
+
+    def _merge(self, images: Dict[str, Dict]) -> None:
+        """
+        Take records another process saved since this instance loaded the file.
+        """
+        for path, record in images.items():
+            if path not in self.images:
+                self.images[path] = record
+                self._index(path, record)
+
+    def refresh(self) -> None:
+        with self.lock:
+            self._merge(self._load())
+
+    def save(self) -> None:
+        """
+        Merge with the file under its lock and write it back, so records saved by other processes
+        (the captioner, bulk_import, the service) are kept.
+        """
+        with self.lock, writer_lock(self.index_path.parent, HASH_LOCK_NAME):
+            on_disk = self._load()
+            self._merge(on_disk)
+            for path in self.dirty:
+                on_disk[path] = self.images[path]
+            for path, record in self.images.items():
+                on_disk.setdefault(path, record)
+            write_json_atomic(self.index_path, {"images": on_disk})
+            self.dirty.clear()
+
+    def match(self, sha256: str, phash: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Return (canonical_path, "exact" | "near") for the closest indexed image, or (None, None).
+        """
+        if sha256 in self.by_sha:
+            return self.by_sha[sha256], "exact"
+        if self.max_distance < PHASH_BANDS:
+            candidates = set()
+            for band, value in enumerate(self._band_values(phash)):
+                candidates.update(self.bands[band].get(value, ()))
+        else:
+            candidates = self.images.keys()
+        best_path, best_distance = None, self.max_distance + 1
+        # in indexing order, so ties go to the earliest photo as with a full scan
+        for path in sorted(candidates, key=self.order.__getitem__):
+            record = self.images[path]
+            distance = hamming_distance(record["phash"], phash)
+            if distance < best_distance:
+                best_path, best_distance = record["canonical"], distance
+        if best_path is not None:
+            return best_path, "near"
+        return None, None
+
+    def add(self, img_path: Path, source_sha256: Optional[str] = None) -> Dict:
+        """
+        Hash img_path (if not indexed yet) and link it to its canonical image.
+
+        source_sha256 is the hash of the file img_path was re-encoded from (bulk_import), matched exactly as well.
+        """
+        key = str(img_path)
+        if key in self.images:
+            return self.images[key]
+        sha256 = file_sha256(img_path)
+        phash = compute_phash(img_path)
+        with self.lock:
+            if key in self.images:
+                return self.images[key]
+            if source_sha256 in self.by_sha:
+                canonical, kind = self.by_sha[source_sha256], "exact"
+            else:
+                canonical, kind = self.match(sha256, phash)
+            record = {
+                "sha256": sha256,
+                "phash": phash,
+                "canonical": canonical or key,
+                "match": kind,
+            }
+            if source_sha256:
+                record["source_sha256"] = source_sha256
+            self.images[key] = record
+            self.dirty.add(key)
+            self._index(key, record)
+        if canonical:
+            print(f"🔁 {Path(img_path).name} is a{'n exact' if kind == 'exact' else ' near'} duplicate of {Path(canonical).name}")
+        return record
+
+    def rehash(self, img_path: Path) -> None:
+        """
+        Update the sha256 of an image rewritten in place (e.g. archived by retention.py), keeping its canonical link.
+        """
+        key = str(img_path)
+        with self.lock:
+            record = self.images.get(key)
+            if record is None:
+                return
+            record = {**record, "sha256": file_sha256(img_path)}
+            self.images[key] = record
+            self.by_sha.setdefault(record["sha256"], record["canonical"])
+            self.dirty.add(key)
+
+    def update_folder(self, image_folder: Path) -> int:
+        """
+        Index every new *.jpg in image_folder. Returns the number of images added.
+        """
+        added = 0
+        with self.lock:
+            # photos another process hashed meanwhile are matched against, not hashed again
+            self.refresh()
+            for img_path in sorted(Path(image_folder).glob("*.jpg")):
+                if str(img_path) in self.images:
+                    continue
+                try:
+                    self.add(img_path)
+                    added += 1
+                except Exception as e:
+                    print(f"❌ Failed to hash {img_path.name}: {e}")
+            if added:
+                self.save()
+        return added
+
+    def canonical_of(self, image_path: str) -> str:
+        # lock-free: a single dict read, records are only ever added or replaced whole
+        record = self.images.get(image_path)
+        return record["canonical"] if record else image_path
+
+
+_shared_indexes: Dict[str, ImageHashIndex] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_hash_index(index_path: Path = HASH_INDEX_PATH) -> ImageHashIndex:
+    """
+    The process-wide ImageHashIndex for index_path, so every caller sees and saves the same records.
+    """
+    with _shared_lock:
+        key = str(Path(index_path).resolve())
+        if key not in _shared_indexes:
+            _shared_indexes[key] = ImageHashIndex(index_path)
+        return _shared_indexes[key]
@@ -0,0 +1,192 @@
+# image_embedding.py
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+import hashlib
+from typing import List, Dict, Optional
+import chromadb
+from PIL import Image
+
+from image_processing import parse_image_timestamp
+from model_residency import residency
+
+# Config
+IMAGE_ENCODER = "clip"
+# Local weights, e.g. `huggingface-cli download openai/clip-vit-base-patch32 --local-dir models/clip-vit-base-patch32`
+IMAGE_ENCODER_WEIGHTS = "models/clip-vit-base-patch32"
+VISUAL_COLLECTION = "memories_visual"
+IMAGE_BATCH_SIZE = 8
+# CLIP text-image cosine scores are low in absolute terms; below this a hit is noise
+MIN_VISUAL_SIMILARITY = 0.22
+
+
+class ImageTextEncoder(ABC):
+    """
+    Interface for encoders that embed images and text into one vector space.
+    """
+    name = "base"
+
+    @abstractmethod
+    def encode_images(self, images: List[Image.Image]) -> List[List[float]]:
+        ...
+
+    @abstractmethod
+    def encode_text(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+
+class ClipEncoder(ImageTextEncoder):
+    """
+    CLIP (transformers) on CPU, loaded from a local directory only.
+    """
+    name = "clip"
+
+    def __init__(self, weights: str = IMAGE_ENCODER_WEIGHTS):
+        import torch
+        from transformers import CLIPModel, CLIPProcessor
+
+        self.torch = torch
+        self.model = CLIPModel.from_pretrained(weights, local_files_only=True).eval()
+        self.processor = CLIPProcessor.from_pretrained(weights, local_files_only=True)
+
+    def _normalize(self, features) -> List[List[float]]:
+        features = features / features.norm(dim=-1, keepdim=True)
+        return features.cpu().tolist()
+
+    def encode_images(self, images: List[Image.Image]) -> List[List[float]]:
+        with self.torch.no_grad():
+            inputs = self.processor(images=images, return_tensors="pt")
+            return self._normalize(self.model.get_image_features(**inputs))
+
+    def encode_text(self, texts: List[str]) -> List[List[float]]:
+        with self.torch.no_grad():
+            inputs = self.processor(text=texts, return_tensors="pt", padding=True, truncation=True)
+            return self._normalize(self.model.get_text_features(**inputs))
+
+
+ENCODERS = {
+    ClipEncoder.name: ClipEncoder,
+}
+
+
+def load_image_encoder(name: str = IMAGE_ENCODER, weights: str = IMAGE_ENCODER_WEIGHTS) -> ImageTextEncoder:
+    """
+    Load the configured image-text encoder.
+    """
+    if name not in ENCODERS:
+        raise ValueError(f"❌ Unknown image encoder '{name}', expected one of {list(ENCODERS)}.")
+    encoder = ENCODERS[name](weights)
+    print(f"✅ Loaded image encoder '{name}' from {weights}")
+    return encoder
+
+# only used while syncing the visual index and for visual queries; evicted like the other models
+residency.register("image_encoder", footprint_mb=600, reload_s=5, priority=1, load=load_image_encoder)
+
+
+@contextmanager
+def use_image_encoder(encoder: Optional[ImageTextEncoder] = None):
+    """
+    `with use_image_encoder() as encoder: ...` pins the managed encoder for the block; a given encoder is used as is.
+    """
+    with (nullcontext(encoder) if encoder is not None else residency.use("image_encoder")) as model:
+        yield model
+
+
+def make_image_id(image_path: str) -> str:
+    return "image-" + hashlib.md5(str(image_path).encode()).hexdigest()
+
+
+def _load_image(img_path: Path) -> Image.Image:
+    with Image.open(img_path) as image:
+        image.draft("RGB", (448, 448))  # encoders work at 224px; skip decoding the full 2304x1296
+        return image.convert("RGB")
+
+
+def _add_image_batches(collection, new_paths: List[Path], encoder: ImageTextEncoder, batch_size: int) -> int:
+    added = 0
+    for i in range(0, len(new_paths), batch_size):
+        batch, metadatas = [], []
+        for img_path in new_paths[i:i + batch_size]:
+            try:
+                batch.append(_load_image(img_path))
+            except Exception as e:
+                print(f"❌ Failed to load {img_path.name}: {e}")
+                continue
+            dt = parse_image_timestamp(img_path) or ""
+            metadatas.append({
+                "timestamp": dt,
+                "description": "Photo matched by its visual content (no description available).",
+                "image_path": str(img_path),
+                "source": "image"
+            })
+        if not batch:
+            continue
+
+        collection.add(
+            embeddings=encoder.encode_images(batch),
+            metadatas=metadatas,
+            ids=[make_image_id(m["image_path"]) for m in metadatas]
+        )
+        added += len(batch)
+
+    return added
+
+
+def add_images_to_visual_index(client: chromadb.Client, image_folder: Path,
+                               encoder: Optional[ImageTextEncoder] = None,
+                               collection_name: str = VISUAL_COLLECTION,
+                               batch_size: int = IMAGE_BATCH_SIZE) -> int:
+    """
+    Embed every not-yet-indexed image in image_folder, batch_size images per encoder call.
+
+    Returns:
+        int: Number of images added.
+    """
+    collection = client.get_or_create_collection(name=collection_name, metadata={"hnsw:space": "cosine"})
+
+    image_paths = sorted(Path(image_folder).glob("*.jpg"))
+    if not image_paths:
+        return 0
+    existing_ids = set(collection.get(ids=[make_image_id(p) for p in image_paths])["ids"])
+    new_paths = [p for p in image_paths if make_image_id(p) not in existing_ids]
+
+    added = 0
+    if new_paths:
+        with use_image_encoder(encoder) as model:
+            added = _add_image_batches(collection, new_paths, model, batch_size)
+
+    if added:
+        print(f"✅ Added {added} images to visual collection '{collection_name}'.")
+    else:
+        print("⚡ No new images to embed. Visual index is already up to date.")
+    return added
+
+
+def query_visual_index(client: chromadb.Client, query_text: str, top_k: int = 3,
+                       encoder: Optional[ImageTextEncoder] = None,
+                       collection_name: str = VISUAL_COLLECTION,
+                       min_similarity: float = MIN_VISUAL_SIMILARITY) -> List[Dict]:
+    """
+    Find photos whose pixels match a text query, independent of any note or caption.
+    """
+    collection = client.get_or_create_collection(name=collection_name, metadata={"hnsw:space": "cosine"})
+    if collection.count() == 0:
+        return []
+
+    with use_image_encoder(encoder) as model:
+        query_embedding = model.encode_text([query_text])[0]
+    results = collection.query(
+        query_embeddings=[query_embedding],
+        n_results=min(top_k, collection.count()),
+        include=["metadatas", "distances"]
+    )
+
+    matched_images = []
+    for metadata, distance in zip(results["metadatas"][0], results["distances"][0]):
+        similarity = 1 - distance  # cosine space
+        if similarity < min_similarity:
+            continue
+        metadata["similarity"] = similarity
+        matched_images.append(metadata)
+    return matched_images
@@ -0,0 +1,96 @@
+# kws_decision.py
+
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+from hardware_profile import setting
+
+# Config
+DEFAULT_THRESHOLD = setting("kws_threshold")
+# per-label thresholds; labels not listed use DEFAULT_THRESHOLD
+LABEL_THRESHOLDS = {
+    "takephoto": DEFAULT_THRESHOLD,
+    "himan": DEFAULT_THRESHOLD,
+    "yes": 0.6,
+    "no": 0.6,
+}
+TARGET_LABELS = {
+    "menu": ("takephoto", "himan"),
+    "yesno": ("yes", "no"),
+}
+# frames averaged for the smoothed posterior
+SMOOTHING_WINDOW = 3
+# accept on a single frame when the score is this high and jumped by at least EARLY_RISE since the previous frame
+EARLY_ACCEPT = 0.9
+EARLY_RISE = 0.3
+# seconds after a detection during which nothing else is accepted
+REFRACTORY_S = 1.0
+
+
+class KeywordDecisionEngine:
+    """
+    Turns a stream of per-frame classifier scores into keyword detections.
+
+    A label is accepted when its posterior averaged over the last `window` frames reaches its
+    threshold, or immediately when a single frame is very confident and rising fast. After a
+    detection, further frames are ignored for `refractory_s` seconds.
+    """
+
+    def __init__(self, target_labels: Iterable[str], thresholds: Optional[Dict[str, float]] = None,
+                 window: int = SMOOTHING_WINDOW, early_accept: Optional[float] = EARLY_ACCEPT,
+                 early_rise: float = EARLY_RISE, refractory_s: float = REFRACTORY_S,
+                 default_threshold: float = DEFAULT_THRESHOLD):
+        self.target_labels = tuple(target_labels)
+        self.thresholds = {**LABEL_THRESHOLDS, **(thresholds or {})}
+        self.default_threshold = default_threshold
+        self.window = max(1, window)
+        self.early_accept = early_accept
+        self.early_rise = early_rise
+        self.refractory_s = refractory_s
+        self.frames = deque(maxlen=self.window)
+        self.refractory_until = float("-inf")
+
+    def threshold(self, label: str) -> float:
+        return self.thresholds.get(label, self.default_threshold)
+
+    def reset(self) -> None:
+        """
+        Forget buffered frames (e.g. when the microphone stream restarts); the refractory period is kept.
+        """
+        self.frames.clear()
+
+    def update(self, scores: Dict[str, float], t: float) -> Optional[str]:
+        """
+        Feed one frame of scores observed at time t (seconds); returns the detected label or None.
+        """
+        previous = self.frames[-1] if self.frames else None
+        self.frames.append(scores)
+        if t < self.refractory_until:
+            return None
+
+        best_label, best_score = None, 0.0
+        frame_winner = max(scores, key=scores.get)
+        for label in self.target_labels:
+            latest = scores.get(label, 0.0)
+            if self.early_accept is not None and previous is not None and latest >= self.early_accept \
+                    and latest - previous.get(label, 0.0) >= self.early_rise:
+                best_label, best_score = label, float("inf")
+                break
+            if len(self.frames) < self.window:
+                continue
+            smoothed = sum(f.get(label, 0.0) for f in self.frames) / len(self.frames)
+            if smoothed >= self.threshold(label) and label == frame_winner and smoothed > best_score:
+                best_label, best_score = label, smoothed
+
+        if best_label is not None:
+            self.refractory_until = t + self.refractory_s
+            self.frames.clear()
+        return best_label
+
+
+def single_frame_engine(target_labels: Iterable[str], threshold: float = DEFAULT_THRESHOLD) -> KeywordDecisionEngine:
+    """
+    The original rule (best label of one frame >= threshold), for comparisons.
+    """
+    return KeywordDecisionEngine(target_labels, thresholds={label: threshold for label in target_labels},
+                                 window=1, early_accept=None, refractory_s=0.0, default_threshold=threshold)
@@ -0,0 +1,138 @@
+# kws_eval.py
+
+from pathlib import Path
+import json
+import statistics
+from typing import List, Dict, Optional, Tuple
+
+from kws_decision import KeywordDecisionEngine, single_frame_engine, TARGET_LABELS
+
+# Config
+# a detection counts for a spoken keyword if it comes at most this long after the keyword starts
+MAX_LATENCY_S = 1.5
+WAV_STRIDE_S = 0.25
+
+
+def load_recorded_frames(jsonl_path: Path, model_select: Optional[str] = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Read a KWS_RECORD log: lines {"t", "model", "scores"} are frames, lines {"t", "event": label} mark when a keyword was spoken.
+    With model_select, only that model's frames and the events for its keywords are kept (a session logs both models).
+    """
+    labels = TARGET_LABELS[model_select] if model_select else None
+    frames, events = [], []
+    with open(jsonl_path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if "event" in item:
+                if labels is None or item["event"] in labels:
+                    events.append({"t": item["t"], "label": item["event"]})
+            elif model_select is None or item.get("model", model_select) == model_select:
+                frames.append({"t": item["t"], "scores": item["scores"]})
+    return frames, events
+
+
+def frames_from_wav(wav_path: Path, model_path: str, stride_s: float = WAV_STRIDE_S) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Replay a WAV fixture through an Edge Impulse .eim model. Ground truth comes from <wav>.json: {"events": [{"t", "label"}]}.
+    """
+    import numpy as np
+    from scipy.io.wavfile import read as read_wav
+    from edge_impulse_linux.audio import AudioImpulseRunner
+
+    sample_rate, audio = read_wav(wav_path)
+    if audio.ndim > 1:
+        audio = audio[:, 0]
+    if audio.dtype != np.int16:
+        audio = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+    frames = []
+    with AudioImpulseRunner(model_path) as runner:
+        model_info = runner.init()
+        window = model_info["model_parameters"]["input_features_count"]
+        if model_info["model_parameters"].get("frequency") not in (None, sample_rate):
+            raise ValueError(f"❌ {wav_path} is {sample_rate} Hz, model expects {model_info['model_parameters']['frequency']} Hz")
+        stride = int(stride_s * sample_rate)
+        for start in range(0, len(audio) - window + 1, stride):
+            res = runner.classify(audio[start:start + window].tolist())
+            # time at the end of the window, like the live microphone stream
+            frames.append({"t": (start + window) / sample_rate, "scores": res["result"]["classification"]})
+        runner.stop()
+
+    events = []
+    truth_path = Path(str(wav_path) + ".json")
+    if truth_path.exists():
+        with open(truth_path, "r") as f:
+            events = json.load(f)["events"]
+    return frames, events
+
+
+def evaluate(engine: KeywordDecisionEngine, frames: List[Dict], events: List[Dict],
+             max_latency_s: float = MAX_LATENCY_S) -> Dict:
+    """
+    Replay frames through engine and score its detections against the spoken-keyword events.
+    """
+    detections = []
+    for frame in frames:
+        label = engine.update(frame["scores"], frame["t"])
+        if label is not None:
+            detections.append({"t": frame["t"], "label": label})
+
+    unmatched = list(events)
+    latencies, false_accepts = [], 0
+    for det in detections:
+        match = next((e for e in unmatched if e["label"] == det["label"]
+                      and 0 <= det["t"] - e["t"] <= max_latency_s), None)
+        if match is None:
+            false_accepts += 1
+            continue
+        unmatched.remove(match)
+        latencies.append(det["t"] - match["t"])
+
+    duration_h = (frames[-1]["t"] - frames[0]["t"]) / 3600 if len(frames) > 1 else 0.0
+    return {
+        "detections": len(detections),
+        "events": len(events),
+        "detected": len(latencies),
+        "missed": len(unmatched),
+        "false_accepts": false_accepts,
+        "false_accepts_per_hour": false_accepts / duration_h if duration_h > 0 else 0.0,
+        "latency_mean": statistics.mean(latencies) if latencies else None,
+        "latency_p95": sorted(latencies)[int(0.95 * (len(latencies) - 1))] if latencies else None,
+    }
+
+
+def print_result(name: str, result: Dict) -> None:
+    latency = "n/a" if result["latency_mean"] is None else \
+        f"{result['latency_mean'] * 1000:.0f} ms mean / {result['latency_p95'] * 1000:.0f} ms p95"
+    print(f"{name:>14}: detected {result['detected']}/{result['events']}, missed {result['missed']}, "
+          f"false accepts {result['false_accepts']} ({result['false_accepts_per_hour']:.1f}/h), latency {latency}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline evaluation of keyword-spotting decision rules.")
+    parser.add_argument("fixture", help="KWS_RECORD .jsonl log or .wav file (with <wav>.json ground truth)")
+    parser.add_argument("--model-select", choices=list(TARGET_LABELS), default="menu")
+    parser.add_argument("--model", default=None, help=".eim model for WAV fixtures")
+    parser.add_argument("--window", type=int, default=None)
+    parser.add_argument("--early-accept", type=float, default=None)
+    parser.add_argument("--refractory", type=float, default=None)
+    args = parser.parse_args()
+
+    fixture = Path(args.fixture)
+    if fixture.suffix == ".wav":
+        if not args.model:
+            parser.error("--model is required for WAV fixtures")
+        frames, events = frames_from_wav(fixture, args.model)
+    else:
+        frames, events = load_recorded_frames(fixture, args.model_select)
+
+    labels = TARGET_LABELS[args.model_select]
+    overrides = {k: v for k, v in (("window", args.window), ("early_accept", args.early_accept),
+                                   ("refractory_s", args.refractory)) if v is not None}
+    print(f"🎧 {len(frames)} frames, {len(events)} spoken keywords")
+    print_result("single-frame", evaluate(single_frame_engine(labels), frames, events))
+    print_result("smoothed", evaluate(KeywordDecisionEngine(labels, **overrides), frames, events))
@@ -0,0 +1,387 @@
+# local_service.py
+# Local HTTP / WebSocket API over the memory store, so phones and a wall display share the warm models.
+#
+#   POST /query          {"question", "top_k"?, "answer"?}  -> {"memories", "answer"}
+#   POST /answer/stream  {"question", "top_k"?}             -> NDJSON lines: memories, tokens, final answer
+#   GET  /ws/answer      WebSocket, send {"question"} per message, receive the same messages as /answer/stream
+#   POST /ingest/note    {"image_path", "note"}             -> 202, indexed in the background
+#   POST /ingest/image   {"image": base64 JPEG, "note"?}    -> 202, captioned and indexed in the background
+#   GET  /health         counters, including embedding micro-batch sizes
+
+from pathlib import Path
+import base64
+import hashlib
+import json
+import queue
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from batch_captioning import caption_backlog
+from bulk_import import unique_image_path
+from hardware_profile import setting
+from image_dedup import ImageHashIndex, shared_hash_index
+from image_processing import parse_image_timestamp
+from memory_combiner import combine_memories, aggregate_memories
+from query_reasoning import generate_answer, stream_answer
+from shard_store import ShardManifest, add_image_memories_sharded, query_sharded
+from user_note_processing import validate_user_notes
+from memory_store import read_snapshot, read_version, append_entries, writer_lock, claim_index_owner, INDEX_LOCK_NAME
+from vector_store import initialize_vector_store, embed_passages
+
+# Config
+SERVICE_HOST = "127.0.0.1"  # use 0.0.0.0 to reach the service from phones on the LAN
+SERVICE_PORT = 8765
+# a query embedding waits at most this long for other queries to share its batch
+EMBED_BATCH_WINDOW_S = 0.01
+EMBED_MAX_BATCH = 32
+IMAGE_FOLDER = Path("memory_images")
+MODEL_OUTPUT_JSON = Path("memory_text_model.json")
+USER_JSON_PATH = Path("memory_text_user.json")
+COMBINED_OUTPUT_JSON = Path("memory_combined.json")
+CHROMA_PERSIST_DIR = "chroma_db"
+IMAGE_COLLECTION_NAME = "memories_by_image"
+SENTENCE_VECTORS = True
+CHROMA_MEMORY_LIMIT_BYTES = 512 * 1024 * 1024
+# standalone service: how often to check for commits from other processes to index
+INDEX_POLL_S = 5.0
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class EmbeddingMicroBatcher:
+    """
+    Collects query embeddings from concurrent requests and computes them in one embed_passages call.
+
+    The worker takes the first waiting query, gathers whatever else arrives within `window_s`, and
+    embeds the batch; queries that arrive while a batch is being embedded form the next one.
+    """
+
+    def __init__(self, embed_batch: Optional[Callable[[List[str]], List[List[float]]]] = None,
+                 window_s: float = EMBED_BATCH_WINDOW_S, max_batch: int = EMBED_MAX_BATCH):
+        self.embed_batch = embed_batch or embed_passages
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.stats = {"queries": 0, "batches": 0, "largest_batch": 0}
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def embed_query(self, text: str) -> List[float]:
+        future = Future()
+        self.queue.put(("query: " + text, future))
+        return future.result()
+
+    def _worker(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.window_s
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            try:
+                vectors = self.embed_batch([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+            self.stats["queries"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+
+
+class MemoryService:
+    """
+    The retrieval, answering and ingest operations behind the HTTP handler. Ingest work runs on one
+    background thread, under a lock shared with the other writers of the process.
+
+    Run inside the assistant (mainthread.py), it is given the assistant's Chroma client, shard manifest,
+    hash index and lock, and its retrieve / sync functions, so the API answers from the same index layout
+    as the voice loop and one process owns the index and the models. Run alone, it becomes the index
+    owner and uses the sharded per-image layout.
+    """
+
+    def __init__(self, persist_dir: str = CHROMA_PERSIST_DIR, client=None, manifest: Optional[ShardManifest] = None,
+                 hash_index: Optional[ImageHashIndex] = None, store_lock: Optional[threading.Lock] = None,
+                 retrieve_fn: Optional[Callable[..., List[Dict]]] = None,
+                 sync_fn: Optional[Callable[[], None]] = None):
+        self.persist_dir = persist_dir
+        if client is None:
+            claim_index_owner(Path(persist_dir))
+        self.client = client or initialize_vector_store(persist_dir=persist_dir,
+                                                        memory_limit_bytes=CHROMA_MEMORY_LIMIT_BYTES)
+        self.manifest = manifest or ShardManifest(Path(persist_dir) / "shards.json")
+        self.hash_index = hash_index or shared_hash_index()
+        self.batcher = EmbeddingMicroBatcher()
+        self.store_lock = store_lock or threading.Lock()
+        self.retrieve_fn = retrieve_fn or self._retrieve_sharded
+        self.sync_fn = sync_fn or self._sync_sharded
+        self.ingest_pool = ThreadPoolExecutor(max_workers=1)
+        self.stats = {"queries": 0, "answers": 0, "notes": 0, "images": 0, "syncs": 0}
+        self.indexed_version = -1
+
+    def retrieve(self, question: str, top_k: Optional[int] = None) -> List[Dict]:
+        query_embedding = self.batcher.embed_query(question)
+        # no lock: the shard manifest is swapped copy-on-write and hash lookups are single dict reads,
+        # so a query never waits for an index update
+        memories = self.retrieve_fn(question, top_k=top_k or setting("retrieval_top_k"),
+                                    query_embedding=query_embedding)
+        self.stats["queries"] += 1
+        return memories
+
+    def _retrieve_sharded(self, question: str, top_k: int, query_embedding: List[float]) -> List[Dict]:
+        return query_sharded(self.client, question, self.manifest, base_name=IMAGE_COLLECTION_NAME, top_k=top_k,
+                             canonical_of=self.hash_index.canonical_of, query_embedding=query_embedding)
+
+    def answer(self, question: str, memories: List[Dict]) -> Dict:
+        self.stats["answers"] += 1
+        return generate_answer(query=question, memories=memories).model_dump()
+
+    def save_note(self, image_path: str, note: str) -> Dict:
+        timestamp = parse_image_timestamp(Path(image_path)) or time.strftime("%Y-%m-%d %H:%M")
+        entry = {"timestamp": timestamp, "description": note, "image_path": image_path, "source": "user"}
+        append_entries(USER_JSON_PATH, [entry])
+        self.stats["notes"] += 1
+        return entry
+
+    def save_image(self, encoded_image: str) -> str:
+        data = base64.b64decode(encoded_image)
+        IMAGE_FOLDER.mkdir(parents=True, exist_ok=True)
+        while True:
+            path = unique_image_path(IMAGE_FOLDER, time.strftime("%Y%m%d_%H%M%S"))
+            # exclusive create: the camera, a bulk import or another request may take the same name in between
+            try:
+                with open(path, "xb") as f:
+                    f.write(data)
+                break
+            except FileExistsError:
+                continue
+        self.stats["images"] += 1
+        return str(path)
+
+    def sync(self, caption: bool = False) -> None:
+        """
+        Caption new photos (optional) and bring the index up to date with the JSON files.
+        """
+        try:
+            if caption:
+                caption_backlog(IMAGE_FOLDER, MODEL_OUTPUT_JSON)
+            self.sync_fn()
+            self.stats["syncs"] += 1
+        except Exception as e:
+            print(f"[ERROR] Service sync failed: {e}")
+
+    def _sync_sharded(self) -> None:
+        version, (user_data, model_data) = read_snapshot(USER_JSON_PATH, MODEL_OUTPUT_JSON)
+        validate_user_notes(user_data)
+        # a bulk import's indexing may run too; one index update at a time
+        with writer_lock(Path(self.persist_dir), INDEX_LOCK_NAME), self.store_lock:
+            self.hash_index.update_folder(IMAGE_FOLDER)
+            combine_memories(user_data, model_data, COMBINED_OUTPUT_JSON)
+            add_image_memories_sharded(self.client, aggregate_memories(user_data, model_data), self.manifest,
+                                       base_name=IMAGE_COLLECTION_NAME, sentence_vectors=SENTENCE_VECTORS,
+                                       prune=True)
+        self.indexed_version = max(self.indexed_version, version)
+
+    def schedule_sync(self, caption: bool = False) -> Future:
+        return self.ingest_pool.submit(self.sync, caption)
+
+    def follow_commits(self, interval_s: float = INDEX_POLL_S) -> None:
+        """
+        Standalone service: index commits from other processes (e.g. bulk_import) as they land.
+        """
+        def loop():
+            pending = None
+            while True:
+                time.sleep(interval_s)
+                if pending is not None and not pending.done():
+                    continue
+                if read_version(USER_JSON_PATH.parent)["version"] > self.indexed_version:
+                    pending = self.schedule_sync()
+        threading.Thread(target=loop, daemon=True).start()
+
+    def answer_messages(self, question: str, top_k: Optional[int] = None):
+        """
+        Messages of a streamed answer: the retrieved memories, then text tokens, then the final answer.
+        """
+        memories = self.retrieve(question, top_k)
+        yield {"memories": memories}
+        stream = stream_answer(question, memories)
+        while True:
+            try:
+                yield {"token": next(stream)}
+            except StopIteration as stop:
+                self.stats["answers"] += 1
+                yield {"done": True, "answer": stop.value.model_dump()}
+                return
+
+    def health(self) -> Dict:
+        return {**self.stats, "embedding": self.batcher.stats}
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # WebSocket clients require an HTTP/1.1 upgrade response
+    protocol_version = "HTTP/1.1"
+    # set by start_service()
+    service: MemoryService = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(self.service.health())
+        elif self.path == "/ws/answer" and self.headers.get("Upgrade", "").lower() == "websocket":
+            self._serve_websocket()
+        else:
+            self._send_json({"error": f"unsupported path {self.path}"}, status=404)
+
+    def do_POST(self):
+        try:
+            request = self._read_json()
+            if self.path == "/query":
+                memories = self.service.retrieve(request["question"], request.get("top_k"))
+                answer = self.service.answer(request["question"], memories) if request.get("answer", True) else None
+                self._send_json({"memories": memories, "answer": answer})
+            elif self.path == "/answer/stream":
+                self._stream_answer(request)
+            elif self.path == "/ingest/note":
+                entry = self.service.save_note(request["image_path"], request["note"])
+                self.service.schedule_sync()
+                self._send_json({"accepted": entry}, status=202)
+            elif self.path == "/ingest/image":
+                image_path = self.service.save_image(request["image"])
+                if request.get("note"):
+                    self.service.save_note(image_path, request["note"])
+                self.service.schedule_sync(caption=True)
+                self._send_json({"accepted": {"image_path": image_path}}, status=202)
+            else:
+                self._send_json({"error": f"unsupported path {self.path}"}, status=404)
+        except (KeyError, ValueError) as e:
+            self._send_json({"error": f"bad request: {e}"}, status=400)
+        except Exception as e:
+            print(f"[ERROR] {self.path} failed: {e}")
+            self._send_json({"error": f"internal error: {e}"}, status=500)
+
+    def _stream_answer(self, request: Dict) -> None:
+        question = request["question"]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        # no Content-Length: the stream ends when the connection closes
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for message in self.service.answer_messages(question, request.get("top_k")):
+                self.wfile.write((json.dumps(message) + "\n").encode())
+                self.wfile.flush()
+        except Exception as e:
+            # the 200 is already sent; the error becomes the last line of the stream
+            print(f"[ERROR] {self.path} failed: {e}")
+            self.wfile.write((json.dumps({"error": f"internal error: {e}"}) + "\n").encode())
+
+    # Minimal RFC 6455 server side: text frames, ping/pong and close, no extensions or fragmentation.
+    def _serve_websocket(self) -> None:
+        key = self.headers.get("Sec-WebSocket-Key")
+        if not key:
+            self._send_json({"error": "bad request: missing Sec-WebSocket-Key"}, status=400)
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.close_connection = True
+
+        while True:
+            opcode, payload = self._ws_read_frame()
+            if opcode == 0x8 or opcode is None:
+                self._ws_send_frame(0x8, b"")
+                return
+            if opcode == 0x9:
+                self._ws_send_frame(0xA, payload)
+                continue
+            if opcode != 0x1:
+                continue
+            try:
+                request = json.loads(payload)
+                for message in self.service.answer_messages(request["question"], request.get("top_k")):
+                    self._ws_send_frame(0x1, json.dumps(message).encode())
+            except (KeyError, ValueError) as e:
+                self._ws_send_frame(0x1, json.dumps({"error": f"bad request: {e}"}).encode())
+            except Exception as e:
+                print(f"[ERROR] {self.path} failed: {e}")
+                self._ws_send_frame(0x1, json.dumps({"error": f"internal error: {e}"}).encode())
+
+    def _ws_read_frame(self):
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None, b""
+        opcode, length = header[0] & 0x0F, header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if header[1] & 0x80 else b"\x00\x00\x00\x00"
+        payload = self.rfile.read(length)
+        return opcode, bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+    def _ws_send_frame(self, opcode: int, payload: bytes) -> None:
+        if len(payload) < 126:
+            header = struct.pack("!BB", 0x80 | opcode, len(payload))
+        elif len(payload) < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, len(payload))
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, len(payload))
+        self.wfile.write(header + payload)
+        self.wfile.flush()
+
+
+def start_service(service: MemoryService, host: str = SERVICE_HOST, port: int = SERVICE_PORT):
+    """
+    Serve in a background thread and return (server, base_url).
+    """
+    handler = type("Handler", (ServiceHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local memory service (query, ingest, streamed answers).")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+
+    service = MemoryService()
+    service.schedule_sync()
+    service.follow_commits()
+    server, url = start_service(service, args.host, args.port)
+    print(f"🌐 Memory service listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
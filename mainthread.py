@@ -1,27 +1,34 @@
 # mainthread.py
 
+import threading
 import time
 from pathlib import Path
-import json
 from datetime import datetime
-import requests
 
 
-from image_processing import generate_image_descriptions
-from user_note_processing import load_user_notes
-from memory_combiner import combine_memories
-from vector_store import initialize_vector_store, add_memories_to_vector_store, query_similar_memories
-from query_reasoning import generate_answer
-from popup_show_images import popup_images
-from voice_interface import listen_to_question_with_confirmation, speak_text, record_note_with_confirmation, wait_for_wake_word
+from batch_captioning import caption_backlog
+from image_dedup import shared_hash_index
+from image_embedding import add_images_to_visual_index, query_visual_index
+from user_note_processing import validate_user_notes
+from memory_store import read_snapshot, read_version, append_entries, writer_lock, claim_index_owner, INDEX_LOCK_NAME
+from memory_combiner import combine_memories, aggregate_memories
+from vector_store import initialize_vector_store, query_similar_memories, \
+    query_image_memories, embed_query
+from shard_store import ShardManifest, add_image_memories_sharded, query_sharded
+from streaming_indexer import stream_memories_to_vector_store, stream_image_memories_to_vector_store, iter_json_array
+from embedding_cascade import embed_passages_small, query_cascade, SMALL_COLLECTION
+from fast_answer import answer_with_fast_path
+from conversation_session import ConversationSession
+from local_service import MemoryService, start_service, SERVICE_HOST, SERVICE_PORT
+from hardware_profile import setting
+from model_residency import residency
+from tracing import span
 
-from camera_capture import capture_image
 from runner_controller import start_runner
 
 import os
 from multiprocessing import Process
 
-os.environ["DISPLAY"] = ":0"
 # Config
 image_folder = Path("memory_images")
 model_output_json = Path("memory_text_model.json")
@@ -29,43 +36,170 @@ user_json_path = Path("memory_text_user.json")
 combined_output_json = Path("memory_combined.json")
 chroma_persist_dir = "chroma_db"
 collection_name = "memories"
-
-# Vector DB
-client = initialize_vector_store(persist_dir=chroma_persist_dir)
-
+# merge user note + VLM caption of the same photo into one document
+one_doc_per_image = True
+image_collection_name = "memories_by_image"
+sentence_vectors = True
+# one collection per month, queried newest first (only applies with one_doc_per_image)
+shard_by_month = True
+# one_doc_per_image = False only: index with bge-small, rescore its candidates with e5-base
+embedding_cascade = False
+# RAM for loaded collection indexes; least recently queried shards are evicted beyond this
+chroma_memory_limit_bytes = 512 * 1024 * 1024
+# search photo pixels directly (needs local CLIP weights, see image_embedding.py)
+use_visual_index = True
+# follow-up questions within this many seconds reuse the previous retrieval and LLM context
+session_ttl_s = 120
+followup_top_k = 3
+# records sent to the LLM; autotune.py picks the largest that answers within its latency target
+retrieval_top_k = setting("retrieval_top_k")
+# serve the HTTP / WebSocket API (local_service.py) from this process, on the same index and models
+serve_local_api = True
+# a question's sync waits this long for a running index update (e.g. of a note just saved) before querying
+index_wait_s = 3.0
+# how often the background indexer checks for commits from other processes (bulk_import, captioning)
+index_poll_s = 5.0
+
+# Vector DB, opened by init_store()
+client = None
+shard_manifest = None
+# near-duplicate photos share a caption and collapse to one retrieval hit
+hash_index = None
+# shared with the local API's ingest thread: one index update at a time within this process
+# (queries take no lock, see ShardManifest)
+store_lock = threading.Lock()
+# memory version the index was last brought up to
+indexed_version = -1
+# current conversation, replaced when a question is not a follow-up or the previous one expired
+session = None
+
+
+def init_store():
+    """
+    Claim the index and open the Chroma store, shard manifest and hash index. Importing this module does
+    neither, so tools (e.g. misc/bench_pipeline.py) can reuse sync_memories / retrieve_memories on their own store.
+    """
+    global client, shard_manifest, hash_index
+    # this process is the only one that opens the Chroma store; other writers commit to the JSON files
+    claim_index_owner(Path(chroma_persist_dir))
+    client = initialize_vector_store(persist_dir=chroma_persist_dir, memory_limit_bytes=chroma_memory_limit_bytes)
+    shard_manifest = ShardManifest(Path(chroma_persist_dir) / "shards.json")
+    hash_index = shared_hash_index()
 
 def vlm_loop(interval: int = 5):
     while True:
         try:
             print("🌀 Background VLM started.")
-            generate_image_descriptions(image_folder, model_output_json)
+            caption_backlog(image_folder, model_output_json)
         except Exception as e:
             print(f"[sync_loop ERROR] {e}")
         time.sleep(interval)
 
 def sync_memories():
+    with span("sync"):
+        _sync_memories()
+
+def _sync_memories():
+    global indexed_version
     try:
         print("🔄 Syncing memories...")
 
-        user_data = load_user_notes(user_json_path)
-        with open(model_output_json, "r") as f:
-            model_data = json.load(f)
-
-        combine_memories(user_data, model_data, combined_output_json)
-        add_memories_to_vector_store(client, combined_output_json, collection_name=collection_name)
-
-        print("✅ Sync completed.")
+        # one consistent version of both files, even while a captioner or import is committing
+        version, (user_data, model_data) = read_snapshot(user_json_path, model_output_json)
+        validate_user_notes(user_data)
+        # the background indexer or the local API may be updating the index; a short update (a note just
+        # saved) is waited for, a long backfill is not, and index_loop picks up this version after it
+        with writer_lock(Path(chroma_persist_dir), INDEX_LOCK_NAME, timeout=index_wait_s) as indexing:
+            if not indexing:
+                print("⚡ The index is being updated, querying the current index.")
+                return
+            with store_lock:
+                _index_snapshot(user_data, model_data)
+            indexed_version = max(indexed_version, version)
+        print(f"✅ Sync completed (memory version {version}).")
     except Exception as e:
         print(f"[ERROR] Manual sync failed: {e}")
 
-def save_user_note(img_path: str, note: str):
-    user_json_path.parent.mkdir(parents=True, exist_ok=True)
-    if user_json_path.exists():
-        with open(user_json_path, "r") as f:
-            existing_notes = json.load(f)
+def index_loop():
+    """
+    Index commits made by other processes (bulk_import, background captioning) soon after they land,
+    so a question does not have to index them on its critical path.
+    """
+    while True:
+        time.sleep(index_poll_s)
+        try:
+            if read_version(user_json_path.parent)["version"] > indexed_version:
+                sync_memories()
+        except Exception as e:
+            print(f"[index_loop ERROR] {e}")
+
+def _index_snapshot(user_data: list, model_data: list):
+    hash_index.update_folder(image_folder)
+    combine_memories(user_data, model_data, combined_output_json)
+    if one_doc_per_image:
+        records = aggregate_memories(user_data, model_data)
+        if shard_by_month:
+            add_image_memories_sharded(client, records, shard_manifest, base_name=image_collection_name,
+                                       sentence_vectors=sentence_vectors, prune=True)
+        else:
+            stream_image_memories_to_vector_store(client, records, collection_name=image_collection_name,
+                                                  sentence_vectors=sentence_vectors)
+    elif embedding_cascade:
+        stream_memories_to_vector_store(client, iter_json_array(combined_output_json),
+                                        collection_name=SMALL_COLLECTION, embed_fn=embed_passages_small)
+    else:
+        stream_memories_to_vector_store(client, iter_json_array(combined_output_json),
+                                        collection_name=collection_name)
+    sync_visual_index()
+
+def sync_visual_index():
+    if not use_visual_index:
+        return
+    # a failure (e.g. CLIP weights not downloaded yet) only skips this sync; the next one retries
+    try:
+        add_images_to_visual_index(client, image_folder)
+    except Exception as e:
+        print(f"⚠️ Visual index not updated, retrying on the next sync: {e}")
+
+def add_visual_matches(query: str, memories: list, top_k: int = 3) -> list:
+    """
+    Append photos found by image embedding that none of the text memories already point to.
+    """
+    if not use_visual_index:
+        return memories
+    try:
+        visual_matches = query_visual_index(client, query, top_k=top_k)
+    except Exception as e:
+        print(f"⚠️ Visual query failed: {e}")
+        return memories
+    known = set(hash_index.canonical_of(m["image_path"]) for m in memories)
+    for match in visual_matches:
+        if hash_index.canonical_of(match["image_path"]) not in known:
+            memories.append(match)
+            known.add(hash_index.canonical_of(match["image_path"]))
+    return memories
+
+def retrieve_memories(question: str, top_k: int = retrieval_top_k, query_embedding=None) -> list:
+    if one_doc_per_image and shard_by_month:
+        matched_memories = query_sharded(client, question, shard_manifest,
+                                         base_name=image_collection_name, top_k=top_k,
+                                         canonical_of=hash_index.canonical_of, query_embedding=query_embedding)
+    elif one_doc_per_image:
+        matched_memories = query_image_memories(client, question, top_k=top_k,
+                                                collection_name=image_collection_name,
+                                                canonical_of=hash_index.canonical_of,
+                                                query_embedding=query_embedding)
+    elif embedding_cascade:
+        matched_memories = query_cascade(client, question, top_k=top_k, canonical_of=hash_index.canonical_of,
+                                         query_embedding=query_embedding)
     else:
-        existing_notes = []
+        matched_memories = query_similar_memories(client, question, top_k=top_k, collection_name=collection_name,
+                                                  canonical_of=hash_index.canonical_of,
+                                                  query_embedding=query_embedding)
+    return add_visual_matches(question, matched_memories)
+
 
+def save_user_note(img_path: str, note: str):
     img_filename = Path(img_path).stem
     parts = img_filename.split("_")
     if len(parts) >= 3:
@@ -96,23 +230,31 @@ def save_user_note(img_path: str, note: str):
         "image_path": img_path,
         "source": "user"
     }
-    existing_notes.append(new_entry)
-
-    with open(user_json_path, "w") as f:
-        json.dump(existing_notes, f, indent=2, ensure_ascii=False)
+    # appended to the latest file under the store's writer lock, so notes from the service are not lost
+    version = append_entries(user_json_path, [new_entry])
 
-    print(f"✅ User note saved for {img_path} at {dt}")
+    print(f"✅ User note saved for {img_path} at {dt} (memory version {version})")
 
 # vlm_process = Process(target=vlm_loop, args=(10,), daemon=True)
 def interactive_loop():
+    global session
+    # the voice, camera and display stack is only needed by the device loop
+    from popup_show_images import popup_images
+    from voice_interface import listen_to_question_with_confirmation, speak_text, record_note_with_confirmation, \
+        wait_for_wake_word
+    from camera_capture import capture_image
+
     speak_text("Memory Assistant is ready. Listening for your commands. Please say take photo or hi man.")
 
     while True:
         # keyword spotting
+        residency.prefetch_for("menu")
         label = wait_for_wake_word("menu")
         print(f"🎯 Detected label: {label}")
 
         if label == "takephoto":
+            # the VLM loads while the photo is taken and the note recorded
+            residency.prefetch_for("takephoto")
             speak_text("Ready to take a photo.")
             img_path = capture_image()
             user_note = record_note_with_confirmation()
@@ -127,9 +269,9 @@ def interactive_loop():
                 label_vlm = wait_for_wake_word("yesno")
                 if label_vlm == "yes":
                     start_query = time.time()
-                    generate_image_descriptions(image_folder, model_output_json)
+                    caption_backlog(image_folder, model_output_json)
                     end_query = time.time()
-                    print(f"🔍 generate_image_descriptions took {end_query - start_query:.3f} seconds.")
+                    print(f"🔍 caption_backlog took {end_query - start_query:.3f} seconds.")
                     speak_text("The photos have been processed.")
                     break
                 elif label_vlm == "no":
@@ -141,56 +283,80 @@ def interactive_loop():
             speak_text("Memory Assistant is ready. Listening for your commands.")
 
         elif label == "himan":
-            user_question = listen_to_question_with_confirmation()
-            if not user_question:
-                continue
-            sync_memories()
-
-            start_query = time.time()
-            # I think topk =3 or 8 , the speed is the same for LLM prompt
-            matched_memories = query_similar_memories(client, user_question, top_k=5, collection_name=collection_name)
-            end_query = time.time()
-            print(f"🔍 Query similar memories took {end_query - start_query:.3f} seconds.")
-
-            start_answer = time.time()
-            answer = generate_answer(query=user_question, memories=matched_memories)
-            end_answer = time.time()
-            print(f"🧠 Generate answer took {end_answer - start_answer:.3f} seconds.")
-
-            speak_text(answer.summary)
-
-            if answer.image_refs:
-                popup_images(answer.image_refs, delay=5)
-            else:
-                print("⚡ No reference images to display.")
+            # the embedder and LLM load while the question is asked and confirmed
+            residency.prefetch_for("himan")
+            if embedding_cascade and not one_doc_per_image:
+                residency.prefetch(["embedder_small"])
+            with span("turn", kind="himan"):
+                user_question = listen_to_question_with_confirmation()
+                if not user_question:
+                    continue
+                start_query = time.time()
+                if session is not None and session.is_follow_up(user_question):
+                    new_memories = []
+                    entities = session.new_entities(user_question)
+                    if entities:
+                        sync_memories()
+                        query_embedding = session.followup_embedding(embed_query(user_question))
+                        retrieved = retrieve_memories(user_question, top_k=followup_top_k,
+                                                      query_embedding=query_embedding)
+                        known = {m["image_path"] for m in session.memories}
+                        new_memories = [m for m in retrieved if m["image_path"] not in known]
+                        session.add_candidates(new_memories)
+                        print(f"🔁 Follow-up about {', '.join(sorted(entities))}: {len(new_memories)} new candidates.")
+                    else:
+                        print("🔁 Follow-up: reusing the previous candidates.")
+                    session.record_question(user_question)
+                    # the template answer only covers a late LLM; it may not fit a follow-up
+                    mode = "fallback"
+                    matched_memories = new_memories + [m for m in session.memories if m not in new_memories]
+                else:
+                    sync_memories()
+                    session = ConversationSession(ttl_s=session_ttl_s)
+                    query_embedding = embed_query(user_question)
+                    session.add_candidates(retrieve_memories(user_question, query_embedding=query_embedding))
+                    session.record_question(user_question, query_embedding)
+                    mode = "speak"
+                    matched_memories = session.memories
+                end_query = time.time()
+                print(f"🔍 Query similar memories took {end_query - start_query:.3f} seconds.")
+
+                start_answer = time.time()
+                answer, already_spoken = answer_with_fast_path(user_question, matched_memories, speak=speak_text,
+                                                               mode=mode, llm_fn=session.answer)
+                session.commit_answer(answer)
+                end_answer = time.time()
+                print(f"🧠 Generate answer took {end_answer - start_answer:.3f} seconds.")
+
+                if not already_spoken:
+                    speak_text(answer.summary)
+
+                if answer.image_refs:
+                    with span("popup", images=len(answer.image_refs)):
+                        popup_images(answer.image_refs, delay=5)
+                else:
+                    print("⚡ No reference images to display.")
 
-            speak_text("Memory Assistant is ready. Listening for your commands.")
+                speak_text("Memory Assistant is ready. Listening for your commands.")
 
         else:
             # print(f"⚡ Ignoring label: {label}")
             continue
 
 
-def preload_ollama_models():
-    models_to_preload = [
-        # {"model": "llava-phi3:3.8b", "prompt": "Describe this image.", "images": []},
-        {"model": "llama3.2:3b", "prompt": "Hello!", "images": []}
-    ]
-    for m in models_to_preload:
-        try:
-            res = requests.post("http://localhost:11434/api/generate", json={
-                "model": m["model"],
-                "prompt": m["prompt"],
-                "images": m["images"],
-                "stream": False,
-            })
-            print(f"✅ Preloaded model {m['model']}")
-        except Exception as e:
-            print(f"⚠️ Failed to preload {m['model']}: {e}")
-
 def main():
+    os.environ["DISPLAY"] = ":0"
+    init_store()
     # vlm_process.start()
-    preload_ollama_models()
+    # Whisper, TTS, the embedder and the LLM, within the model budget
+    residency.prefetch_for("himan")
+    if serve_local_api:
+        service = MemoryService(persist_dir=chroma_persist_dir, client=client, manifest=shard_manifest,
+                                hash_index=hash_index, store_lock=store_lock,
+                                retrieve_fn=retrieve_memories, sync_fn=sync_memories)
+        _, url = start_service(service, SERVICE_HOST, SERVICE_PORT)
+        print(f"🌐 Memory service listening on {url}")
+    threading.Thread(target=index_loop, daemon=True).start()
     interactive_loop() 
 
 if __name__ == "__main__":
@@ -1,29 +1,84 @@
 # memory_combiner.py
 
 from pathlib import Path
-import json
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Tuple
+from pydantic import BaseModel, Field
+
+from memory_store import write_json_atomic
+
+def parse_timestamp(ts: str) -> datetime:
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(ts, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unknown timestamp format: {ts}")
+
+class ImageMemory(BaseModel):
+    """
+    Everything known about one photo: the user's note(s) and the VLM caption(s) for the same image_path.
+    """
+    image_path: str
+    timestamp: str
+    user_notes: List[str] = Field(default_factory=list)
+    model_captions: List[str] = Field(default_factory=list)
+
+    def parts(self) -> List[Tuple[str, str]]:
+        """
+        (source, text) pairs, user notes first.
+        """
+        return [("user", n) for n in self.user_notes] + [("model", c) for c in self.model_captions]
+
+    def description(self) -> str:
+        pieces = []
+        if self.user_notes:
+            pieces.append("User note: " + " ".join(self.user_notes))
+        if self.model_captions:
+            pieces.append("Photo description: " + " ".join(self.model_captions))
+        return " | ".join(pieces)
+
+    def to_memory(self) -> Dict:
+        """
+        Flatten to the entry format used by query_reasoning.generate_answer.
+        """
+        sources = [s for s, present in (("user", self.user_notes), ("model", self.model_captions)) if present]
+        return {
+            "timestamp": self.timestamp,
+            "description": self.description(),
+            "image_path": self.image_path,
+            "source": "+".join(sources)
+        }
+
+def aggregate_memories(user_data: List[Dict], model_data: List[Dict]) -> List[ImageMemory]:
+    """
+    Merge user-written and model-generated entries into one ImageMemory per image_path, sorted by timestamp.
+    """
+    records: Dict[str, ImageMemory] = {}
+    for entry in user_data + model_data:
+        record = records.get(entry["image_path"])
+        if record is None:
+            record = records[entry["image_path"]] = ImageMemory(image_path=entry["image_path"], timestamp=entry["timestamp"])
+        elif parse_timestamp(entry["timestamp"]) < parse_timestamp(record.timestamp):
+            record.timestamp = entry["timestamp"]
+        if entry["source"] == "user":
+            record.user_notes.append(entry["description"])
+        else:
+            record.model_captions.append(entry["description"])
+
+    return sorted(records.values(), key=lambda r: parse_timestamp(r.timestamp))
 
 def combine_memories(user_data: List[Dict], model_data: List[Dict], output_path: Path) -> None:
     """
     Combine user-written and model-generated memory entries, sorted by timestamp, and save to JSON.
     """
 
-    def parse_timestamp(ts: str) -> datetime:
-        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
-            try:
-                return datetime.strptime(ts, fmt)
-            except ValueError:
-                continue
-        raise ValueError(f"Unknown timestamp format: {ts}")
-
     combined = user_data + model_data
 
     combined.sort(key=lambda x: parse_timestamp(x["timestamp"]))
 
-    with open(output_path, "w") as f:
-        json.dump(combined, f, indent=2, ensure_ascii=False)
+    # streaming_indexer may be reading the previous version in another process
+    write_json_atomic(output_path, combined)
 
     print(f"✅ Combined {len(user_data)} user notes + {len(model_data)} model descriptions.")
     print(f"✅ Saved combined memories to {output_path.name}.")
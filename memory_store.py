@@ -0,0 +1,191 @@
+# memory_store.py
+
+from pathlib import Path
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Config
+# next to the memory JSON files: the writer lock and the version of the last commit
+LOCK_NAME = ".memory_store.lock"
+VERSION_NAME = ".memory_store.version"
+# in the Chroma directory: held by whichever thread of the owner process is adding to the index
+INDEX_LOCK_NAME = ".index_writer.lock"
+# in the Chroma directory: held for its lifetime by the one process that opens the Chroma store
+OWNER_LOCK_NAME = ".chroma_owner.lock"
+# a snapshot read retries this often while a commit is in progress, then waits for the writer lock
+SNAPSHOT_RETRIES = 100
+SNAPSHOT_RETRY_S = 0.005
+
+
+def _flock(lock_file, blocking: bool, timeout: Optional[float]) -> bool:
+    if blocking and timeout is None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return True
+    deadline = time.monotonic() + (timeout or 0.0)
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            if not blocking or time.monotonic() >= deadline:
+                return False
+            time.sleep(SNAPSHOT_RETRY_S)
+
+
+@contextmanager
+def writer_lock(directory: Path, name: str = LOCK_NAME, blocking: bool = True,
+                timeout: Optional[float] = None) -> Iterator[bool]:
+    """
+    Exclusive flock on directory/name, across processes and threads (each call opens its own descriptor).
+    With blocking=False, or once `timeout` seconds have passed, it yields False when another writer holds the lock.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / name, "a") as lock_file:
+        if not _flock(lock_file, blocking, timeout):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_owner_files: Dict[str, object] = {}
+
+def claim_index_owner(directory: Path, blocking: bool = True) -> bool:
+    """
+    Make this process the only one that opens the Chroma store in directory, until it exits.
+
+    Chroma's persistent client keeps index state in memory, so two processes writing the same directory
+    overwrite each other's segments. The owner (the assistant, or the local service when run alone) indexes
+    everything; other writers only commit to the memory JSON files and the owner indexes those commits.
+    With blocking=False it returns False instead of waiting for the current owner to exit.
+    """
+    directory = Path(directory)
+    if str(directory) in _owner_files:
+        return True
+    directory.mkdir(parents=True, exist_ok=True)
+    lock_file = open(directory / OWNER_LOCK_NAME, "a+")
+    if not _flock(lock_file, blocking=False, timeout=None):
+        if not blocking:
+            lock_file.close()
+            return False
+        print(f"⏳ Another process owns the index in {directory}, waiting for it to finish...")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+    _owner_files[str(directory)] = lock_file
+    return True
+
+
+def write_json_atomic(path: Path, payload) -> None:
+    """
+    Write to a temporary file and rename it over path, so readers see the old or the new file, never half of one.
+    """
+    tmp_path = path.with_suffix(path.suffix + f".{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_version(directory: Path) -> Dict:
+    try:
+        with open(Path(directory) / VERSION_NAME, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"version": 0, "writing": False}
+
+
+def load_entries(path: Path) -> List[Dict]:
+    if not path.exists():
+        return []
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def commit(changes: Dict[Path, List[Dict]]) -> int:
+    """
+    Replace the given JSON files (all in one directory) as one commit and return its version.
+    The caller holds writer_lock() on that directory.
+    """
+    directory = next(iter(changes)).parent
+    version = read_version(directory)["version"]
+    # readers that see "writing" (or a changed version) after reading the files retry
+    write_json_atomic(directory / VERSION_NAME, {"version": version, "writing": True, "pid": os.getpid()})
+    for path, entries in changes.items():
+        write_json_atomic(path, entries)
+    write_json_atomic(directory / VERSION_NAME, {"version": version + 1, "writing": False,
+                                                 "committed_at": time.time()})
+    return version + 1
+
+
+def update_entries(path: Path, mutate: Callable[[List[Dict]], Optional[List[Dict]]]) -> int:
+    """
+    Read-modify-write one JSON list under the writer lock: mutate gets the latest entries and
+    changes them in place (or returns a new list). Returns the commit version.
+    """
+    path = Path(path)
+    with writer_lock(path.parent):
+        entries = load_entries(path)
+        result = mutate(entries)
+        return commit({path: entries if result is None else result})
+
+
+def append_entries(path: Path, new_entries: List[Dict], unique_key: Optional[str] = None) -> int:
+    """
+    Append entries to a JSON list as one commit; with unique_key, entries whose key is already present are skipped
+    (e.g. "image_path" for captions another process wrote first).
+    """
+    def append(entries: List[Dict]) -> None:
+        known = set(e.get(unique_key) for e in entries) if unique_key else set()
+        for entry in new_entries:
+            if unique_key and entry.get(unique_key) in known:
+                continue
+            entries.append(entry)
+            if unique_key:
+                known.add(entry.get(unique_key))
+    return update_entries(path, append)
+
+
+def read_snapshot(*paths: Path) -> Tuple[int, List[List[Dict]]]:
+    """
+    Contents of several JSON lists as of one commit, without taking the writer lock: the version is
+    read before and after the files, and the read is retried when a commit happened in between.
+
+    Returns:
+        Tuple[int, List[List[Dict]]]: the commit version and the entries of each path, in order.
+    """
+    paths = [Path(p) for p in paths]
+    directory = paths[0].parent
+    for _ in range(SNAPSHOT_RETRIES):
+        before = read_version(directory)
+        if before.get("writing"):
+            time.sleep(SNAPSHOT_RETRY_S)
+            continue
+        data = [load_entries(p) for p in paths]
+        if read_version(directory) == before:
+            return before["version"], data
+
+    # a commit is taking long, or its writer died mid-commit (the flock is released with the process)
+    with writer_lock(directory):
+        version = read_version(directory)
+        if version.get("writing"):
+            # every file was replaced whole, so the interrupted commit is simply finished here
+            version = {"version": version["version"] + 1, "writing": False, "committed_at": time.time()}
+            write_json_atomic(directory / VERSION_NAME, version)
+        return version["version"], [load_entries(p) for p in paths]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the commit version of the memory JSON files.")
+    parser.add_argument("--dir", type=Path, default=Path("."))
+    args = parser.parse_args()
+
+    print(json.dumps(read_version(args.dir), indent=2))
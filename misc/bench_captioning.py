@@ -0,0 +1,66 @@
+# bench_captioning.py
+# Throughput of batch_captioning.caption_backlog against the number of in-flight VLM requests.
+#
+#   python misc/bench_captioning.py                       # local stand-in server
+#   python misc/bench_captioning.py --host http://localhost:11434 --limit 6
+
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batch_captioning import caption_backlog
+from fake_ollama_server import start_fake_server
+
+
+def run_benchmark(image_folder: Path, concurrency_levels, host=None, limit=None,
+                  max_side=None, latency=1.0, parallel=2):
+    server = None
+    if host is None:
+        server, host = start_fake_server(latency=latency, parallel=parallel)
+        print(f"🧪 Using fake VLM server at {host} ({latency:.2f}s/request, {parallel} parallel slots)")
+
+    images = sorted(Path(image_folder).glob("*.jpg"))
+    if limit:
+        images = images[:limit]
+
+    results = []
+    for concurrency in concurrency_levels:
+        with tempfile.TemporaryDirectory() as tmp:
+            work_dir = Path(tmp) / "memory_images"
+            work_dir.mkdir()
+            for img in images:
+                shutil.copy(img, work_dir / img.name)
+            stats = caption_backlog(work_dir, Path(tmp) / "captions.json",
+                                    concurrency=concurrency, max_side=max_side, host=host,
+                                    dedup=False)
+        results.append((concurrency, stats))
+
+    if server:
+        server.shutdown()
+
+    print("\nconcurrency | images | failed | seconds | images/min")
+    for concurrency, stats in results:
+        print(f"{concurrency:>11} | {stats['processed']:>6} | {stats['failed']:>6} | "
+              f"{stats['elapsed']:>7.1f} | {stats['images_per_minute']:>10.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark batch captioning throughput.")
+    parser.add_argument("--images", default="memory_images")
+    parser.add_argument("--concurrency", default="1,2,4", help="comma-separated levels")
+    parser.add_argument("--host", default=None, help="real Ollama URL; omit to use the stand-in")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--max-side", type=int, default=None)
+    parser.add_argument("--latency", type=float, default=1.0, help="stand-in seconds per request")
+    parser.add_argument("--parallel", type=int, default=2, help="stand-in parallel slots")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    run_benchmark(Path(args.images), levels, host=args.host, limit=args.limit,
+                  max_side=args.max_side, latency=args.latency, parallel=args.parallel)
@@ -0,0 +1,102 @@
+# bench_cascade.py
+# Single-model retrieval (e5-base for everything) vs the embedding cascade (bge-small index, e5-base rerank)
+# on a synthetic history: indexing throughput, query latency and how many of e5's top-k the cascade recovers.
+#
+#   python misc/bench_cascade.py --entries 5000 --candidates 20 40 80
+
+import sys
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synth_history import generate_history, OBJECTS, PLACES
+
+QUESTION_TEMPLATES = ["Where did I put my {obj}?", "When did I last see my {obj}?",
+                      "What was on the {place}?", "Did I leave the {obj} on the {place}?"]
+
+
+def make_questions(count: int):
+    questions = []
+    for i in range(count):
+        template = QUESTION_TEMPLATES[i % len(QUESTION_TEMPLATES)]
+        questions.append(template.format(obj=OBJECTS[i % len(OBJECTS)], place=PLACES[i % len(PLACES)]))
+    return questions
+
+
+def ids_of(memories):
+    return [f"{m['timestamp']}|{m['source']}|{m['image_path']}" for m in memories]
+
+
+def run(entries: int, questions, top_k: int, candidate_counts) -> None:
+    from vector_store import initialize_vector_store, query_similar_memories, embed_query
+    from streaming_indexer import stream_memories_to_vector_store
+    from embedding_cascade import embed_passages_small, query_cascade, SMALL_COLLECTION, RERANK_CACHE_COLLECTION
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_cascade_"))
+    client = initialize_vector_store(persist_dir=str(work_dir / "chroma_db"))
+    history = [entry for _, entry in generate_history(entries)]
+
+    print(f"📚 Indexing {len(history)} synthetic memories...")
+    start = time.perf_counter()
+    stream_memories_to_vector_store(client, iter(history), collection_name="memories")
+    base_index_s = time.perf_counter() - start
+    start = time.perf_counter()
+    stream_memories_to_vector_store(client, iter(history), collection_name=SMALL_COLLECTION,
+                                    embed_fn=embed_passages_small)
+    small_index_s = time.perf_counter() - start
+    print(f"  e5-base:   {len(history) / base_index_s:>7.1f} docs/s")
+    print(f"  bge-small: {len(history) / small_index_s:>7.1f} docs/s ({base_index_s / small_index_s:.1f}x faster)")
+
+    # the single-model ranking is the reference the cascade should reproduce
+    reference, base_latency = {}, []
+    # the e5 query embedding is computed once per turn in both modes (mainthread), so it is not timed
+    query_embeddings = {question: embed_query(question) for question in questions}
+    for question in questions:
+        start = time.perf_counter()
+        reference[question] = ids_of(query_similar_memories(client, question, top_k=top_k,
+                                                            query_embedding=query_embeddings[question]))
+        base_latency.append(time.perf_counter() - start)
+    print(f"\n{'mode':<22} | {'recall@' + str(top_k):>9} | {'cold p50 ms':>11} | {'warm p50 ms':>11} | e5 vectors")
+    print(f"{'e5-base only':<22} | {1.0:>9.2f} | {statistics.median(base_latency) * 1000:>11.0f} | "
+          f"{'-':>11} | {len(history)}")
+
+    for candidates in candidate_counts:
+        # a fresh rerank cache per setting, so "cold" includes embedding the candidates
+        try:
+            client.delete_collection(RERANK_CACHE_COLLECTION)
+        except Exception:
+            pass
+        recalls, cold, warm = [], [], []
+        for question in questions:
+            query_embedding = query_embeddings[question]
+            start = time.perf_counter()
+            result = query_cascade(client, question, top_k=top_k, candidates=candidates,
+                                   query_embedding=query_embedding)
+            cold.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            query_cascade(client, question, top_k=top_k, candidates=candidates, query_embedding=query_embedding)
+            warm.append(time.perf_counter() - start)
+            recalls.append(len(set(ids_of(result)) & set(reference[question])) / max(1, len(reference[question])))
+        cached = client.get_or_create_collection(RERANK_CACHE_COLLECTION).count()
+        print(f"{f'cascade ({candidates} cand.)':<22} | {statistics.mean(recalls):>9.2f} | "
+              f"{statistics.median(cold) * 1000:>11.0f} | {statistics.median(warm) * 1000:>11.0f} | {cached}")
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare single-model retrieval with the embedding cascade.")
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[20, 40, 80])
+    args = parser.parse_args()
+
+    run(args.entries, make_questions(args.questions), args.top_k, args.candidates)
@@ -0,0 +1,245 @@
+# bench_pipeline.py
+# End-to-end latency of one "hi man" turn: STT -> sync -> embed -> Chroma query -> LLM -> TTS synthesis.
+# The LLM runs against the local stand-in server, so no microphone, camera or Ollama models are needed;
+# Whisper, the embedding model and the TTS model are the real ones.
+#
+#   python misc/bench_pipeline.py --synthesize-wavs            # once: speak the fixture questions into WAVs
+#   python misc/bench_pipeline.py --repeat 3 --save-baseline misc/bench_baseline.json
+#   python misc/bench_pipeline.py --repeat 3 --baseline misc/bench_baseline.json   # exit 1 on regressions
+#   python misc/bench_pipeline.py --skip-voice --token-latency 0.1                 # text questions, slower LLM
+
+import sys
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fake_ollama_server import start_fake_server
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "pipeline"
+# the fixture WAVs are generated, not committed; pinning the model and seed makes every checkout render the same audio
+FIXTURE_TTS_MODEL = "tts_models/en/ljspeech/glow-tts"
+FIXTURE_SEED = 1234
+STAGES = ["stt", "sync", "embed", "query", "fast_tts", "llm", "tts_synth", "first_audio", "total"]
+# a stage regresses when its p95 is this much slower than the baseline (and at least MIN_REGRESSION_S)
+REGRESSION_TOLERANCE = 0.2
+MIN_REGRESSION_S = 0.05
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))] if values else None
+
+
+def copy_fixture_memories(work_dir: Path) -> None:
+    shutil.copytree(ROOT / "memory_images", work_dir / "memory_images")
+    for name in ("memory_text_user.json", "memory_text_model.json"):
+        shutil.copy(ROOT / name, work_dir / name)
+
+
+def synthesize_wavs(questions) -> None:
+    """
+    Render each fixture question to its WAV with FIXTURE_TTS_MODEL, so STT has speech to transcribe.
+    Glow-TTS samples its durations and latents; the seed is reset before each question so a WAV does not depend
+    on which others were missing.
+    """
+    import random
+    import numpy as np
+    import torch
+    from scipy.io.wavfile import write as write_wav
+    from TTS.api import TTS
+
+    tts_model = None
+    for item in questions:
+        wav_path = FIXTURE_DIR / item["wav"]
+        if wav_path.exists():
+            continue
+        if tts_model is None:
+            tts_model = TTS(model_name=FIXTURE_TTS_MODEL, progress_bar=False, gpu=False)
+        random.seed(FIXTURE_SEED)
+        np.random.seed(FIXTURE_SEED)
+        torch.manual_seed(FIXTURE_SEED)
+        audio = np.array(tts_model.tts(item["question"]), dtype=np.float32)
+        sample_rate = tts_model.synthesizer.output_sample_rate
+        write_wav(wav_path, sample_rate, (audio * 32767).astype(np.int16))
+        print(f"🔊 Wrote {wav_path}")
+
+
+def run_pipeline(questions, repeat: int, skip_voice: bool, layout: str) -> dict:
+    """
+    Run every question `repeat` times and return {stage: [seconds, ...]} plus the one-off initial sync time.
+    """
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    copy_fixture_memories(work_dir)
+    # mainthread opens its Chroma store, hash index and memory files relative to the working directory
+    os.chdir(work_dir)
+
+    # imported here so that OLLAMA_HOST already points at the stand-in; importing mainthread neither opens its
+    # store nor loads the voice, camera and display modules, init_store() below opens the copy in work_dir
+    import mainthread
+    from memory_store import read_snapshot
+    from user_note_processing import validate_user_notes
+    from vector_store import embed_query
+    from fast_answer import build_fast_answer, FAST_ANSWER_MODE
+    from query_reasoning import generate_answer
+
+    if not skip_voice:
+        import whisper
+        from voice_interface import recognize_speech, residency
+
+    # the layout flags of mainthread.py; the visual index needs CLIP weights and is not part of the turn measured
+    mainthread.one_doc_per_image = layout in ("sharded", "per-image")
+    mainthread.shard_by_month = layout == "sharded"
+    mainthread.embedding_cascade = False
+    mainthread.use_visual_index = False
+    mainthread.init_store()
+
+    # mainthread's own indexing and retrieval; errors are raised instead of logged as in sync_memories
+    def sync():
+        _, (user_data, model_data) = read_snapshot(mainthread.user_json_path, mainthread.model_output_json)
+        validate_user_notes(user_data)
+        mainthread._index_snapshot(user_data, model_data)
+
+    def query(question, query_embedding):
+        return mainthread.retrieve_memories(question, top_k=5, query_embedding=query_embedding)
+
+    start = time.perf_counter()
+    sync()
+    initial_sync = time.perf_counter() - start
+    if not skip_voice:
+        # models load on first use; keep that out of the per-turn stages
+        for name in ("whisper", "tts"):
+            with residency.use(name):
+                pass
+
+    timings = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        for item in questions:
+            marks = {}
+            t0 = time.perf_counter()
+
+            def lap(stage, since):
+                now = time.perf_counter()
+                timings[stage].append(now - since)
+                return now
+
+            question = item["question"]
+            t = t0
+            if not skip_voice:
+                question = recognize_speech(whisper.load_audio(str(FIXTURE_DIR / item["wav"]))) or question
+                t = lap("stt", t)
+            sync()
+            t = lap("sync", t)
+            query_embedding = embed_query(question)
+            t = lap("embed", t)
+            memories = query(question, query_embedding)
+            t = lap("query", t)
+
+            if FAST_ANSWER_MODE == "speak" and memories:
+                fast = build_fast_answer(memories)
+                if not skip_voice:
+                    with residency.use("tts") as tts_model:
+                        tts_model.tts(fast.summary)
+                t = lap("fast_tts", t)
+                marks["first_audio"] = t - t0
+
+            answer = generate_answer(query=question, memories=memories)
+            t = lap("llm", t)
+            if not skip_voice:
+                with residency.use("tts") as tts_model:
+                    tts_model.tts(answer.summary)
+                t = lap("tts_synth", t)
+            marks.setdefault("first_audio", t - t0)
+
+            timings["first_audio"].append(marks["first_audio"])
+            timings["total"].append(t - t0)
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return {"initial_sync": initial_sync, "timings": timings}
+
+
+def summarize(timings: dict) -> dict:
+    return {stage: {"p50": statistics.median(v), "p95": percentile(v, 0.95), "n": len(v)}
+            for stage, v in timings.items() if v}
+
+
+def compare(summary: dict, baseline: dict, tolerance: float = REGRESSION_TOLERANCE) -> list:
+    """
+    Print current vs baseline p50/p95 per stage and return the stages whose p95 regressed.
+    """
+    regressions = []
+    print("\nstage       |  p50 ms |  p95 ms | base p95 ms |  change")
+    for stage in STAGES:
+        if stage not in summary:
+            continue
+        cur = summary[stage]
+        base = baseline.get(stage)
+        line = f"{stage:<11} | {cur['p50'] * 1000:>7.0f} | {cur['p95'] * 1000:>7.0f} |"
+        if base:
+            change = (cur["p95"] - base["p95"]) / base["p95"] if base["p95"] > 0 else 0.0
+            regressed = change > tolerance and cur["p95"] - base["p95"] > MIN_REGRESSION_S
+            line += f" {base['p95'] * 1000:>11.0f} | {change:>+6.0%}{'  ❌' if regressed else ''}"
+            if regressed:
+                regressions.append(stage)
+        else:
+            line += f" {'-':>11} |      -"
+        print(line)
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark of a question turn.")
+    parser.add_argument("--questions", type=Path, default=FIXTURE_DIR / "questions.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--layout", choices=["sharded", "per-image", "flat"], default="sharded",
+                        help="index layout, as selected by the flags in mainthread.py")
+    parser.add_argument("--skip-voice", action="store_true", help="skip Whisper and TTS, use the question text")
+    parser.add_argument("--synthesize-wavs", action="store_true", help="create missing fixture WAVs with TTS and exit")
+    parser.add_argument("--latency", type=float, default=0.5, help="stand-in seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.05, help="stand-in seconds per token")
+    parser.add_argument("--baseline", type=Path, default=None, help="compare against this saved summary")
+    parser.add_argument("--save-baseline", type=Path, default=None, help="write this run's summary here")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    with open(args.questions, "r") as f:
+        questions = json.load(f)
+    if args.synthesize_wavs:
+        synthesize_wavs(questions)
+        sys.exit(0)
+    missing = [q["wav"] for q in questions if not (FIXTURE_DIR / q["wav"]).exists()]
+    if missing and not args.skip_voice:
+        parser.error(f"missing fixture WAVs {missing}; run with --synthesize-wavs first or use --skip-voice")
+
+    server, url = start_fake_server(latency=args.latency, token_latency=args.token_latency, parallel=1)
+    os.environ["OLLAMA_HOST"] = url
+    print(f"🧪 Fake LLM at {url} ({args.latency:.2f}s first token, {args.token_latency:.3f}s/token)")
+
+    result = run_pipeline(questions, args.repeat, args.skip_voice, args.layout)
+    server.shutdown()
+    summary = summarize(result["timings"])
+    print(f"\n⏱️ Initial sync (full indexing): {result['initial_sync']:.2f} s")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["stages"]
+    regressions = compare(summary, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "layout": args.layout,
+                       "skip_voice": args.skip_voice, "tts_model": FIXTURE_TTS_MODEL, "seed": FIXTURE_SEED,
+                       "stages": summary}, f, indent=2)
+        print(f"💾 Baseline saved to {args.save_baseline}")
+    if regressions:
+        print(f"❌ p95 regressions: {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,205 @@
+# bench_scaling.py
+# Latency and memory of the history-sized code paths against the number of stored memories.
+# Each size runs in a fresh process so peak RSS is attributable to that size.
+#
+#   python misc/bench_scaling.py --sizes 1000 10000 100000 --hash-embeddings
+#   python misc/bench_scaling.py --sizes 1000 5000 --plot scaling.png         # real e5 embeddings, slow
+#
+# --hash-embeddings replaces the embedding model with a cheap deterministic vector so the
+# non-embedding costs (JSON, sorting, id lookups, Chroma inserts and queries) can be measured at 500k.
+
+import sys
+import hashlib
+import json
+import multiprocessing
+import resource
+import tempfile
+import time
+from pathlib import Path
+from queue import Empty
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synth_history import write_history
+
+# a size whose child process has not reported after this long is recorded as failed
+SIZE_TIMEOUT_S = 6 * 3600
+STAGES = ["combine_memories", "add_memories_to_vector_store", "sync_memories", "query_similar_memories"]
+QUESTIONS = ["Where did I put my keys?", "Where is my passport?", "What was on the kitchen counter?",
+             "Where did I leave the charger?", "Who did I meet today?"]
+
+
+class HashEmbedding:
+    """
+    Stand-in for the embedding model: a 768-d vector derived from the text's hash, no model inference.
+    """
+    dim = 768
+
+    def get_text_embedding(self, text):
+        digest = hashlib.sha256(text.encode()).digest()
+        return [(digest[i % len(digest)] - 128) / 128 for i in range(self.dim)]
+
+    def get_text_embedding_batch(self, texts, **kwargs):
+        return [self.get_text_embedding(t) for t in texts]
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_size(entries: int, hash_embeddings: bool, queue) -> None:
+    """
+    Child process: generate a history of `entries`, time each stage and report peak RSS growth per stage.
+    An exception is reported as {"entries", "error"} with the stages finished so far.
+    """
+    results = {"entries": entries}
+    try:
+        _measure_size(entries, hash_embeddings, results)
+    except Exception as e:
+        results["error"] = f"{type(e).__name__}: {e}"
+    queue.put(results)
+
+
+def _measure_size(entries: int, hash_embeddings: bool, results) -> None:
+    from memory_combiner import combine_memories, aggregate_memories
+    from user_note_processing import load_user_notes
+    from vector_store import initialize_vector_store, add_memories_to_vector_store, query_similar_memories
+    from shard_store import ShardManifest, add_image_memories_sharded
+    from model_residency import residency
+
+    if hash_embeddings:
+        residency.register("embedder", footprint_mb=0, reload_s=0, load=HashEmbedding)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        write_history(entries, tmp)
+        user_json, model_json, combined_json = (tmp / "memory_text_user.json", tmp / "memory_text_model.json",
+                                                tmp / "memory_combined.json")
+        client = initialize_vector_store(persist_dir=str(tmp / "chroma_db"))
+        manifest = ShardManifest(tmp / "chroma_db" / "shards.json")
+
+        def load():
+            user_data = load_user_notes(user_json)
+            with open(model_json, "r") as f:
+                return user_data, json.load(f)
+
+        def timed(stage, fn, *args, repeat=1):
+            rss_before = peak_rss_mb()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fn(*args)
+            results[stage] = {"seconds": (time.perf_counter() - start) / repeat,
+                              "peak_rss_mb": peak_rss_mb(), "rss_growth_mb": peak_rss_mb() - rss_before}
+
+        user_data, model_data = load()
+        timed("combine_memories", combine_memories, user_data, model_data, combined_json)
+        timed("add_memories_to_vector_store", add_memories_to_vector_store, client, combined_json)
+        del user_data, model_data
+
+        # mainthread.sync_memories with one_doc_per_image + shard_by_month; the first call indexes
+        # everything, the timed second call is the per-question cost once the index is current
+        def sync():
+            user_data, model_data = load()
+            combine_memories(user_data, model_data, combined_json)
+            add_image_memories_sharded(client, aggregate_memories(user_data, model_data), manifest,
+                                       sentence_vectors=True)
+        sync()
+        timed("sync_memories", sync)
+
+        questions = iter(QUESTIONS * 10)
+        timed("query_similar_memories", lambda: query_similar_memories(client, next(questions), top_k=5),
+              repeat=len(QUESTIONS))
+
+
+def wait_for_result(process, queue, entries: int, timeout_s: float):
+    """
+    The child's result, or a failed row if it exits without one (e.g. killed for running out of memory)
+    or does not finish within timeout_s.
+    """
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            return queue.get(timeout=1.0)
+        except Empty:
+            if not process.is_alive():
+                try:
+                    return queue.get(timeout=1.0)  # put just before exiting
+                except Empty:
+                    return {"entries": entries, "error": f"process exited with code {process.exitcode}"}
+    process.terminate()
+    return {"entries": entries, "error": f"timed out after {timeout_s:.0f}s"}
+
+
+def run_sizes(sizes, hash_embeddings: bool, timeout_s: float = SIZE_TIMEOUT_S):
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for entries in sizes:
+        print(f"⏱️ {entries} entries...")
+        queue = ctx.Queue()
+        process = ctx.Process(target=measure_size, args=(entries, hash_embeddings, queue))
+        process.start()
+        try:
+            row = wait_for_result(process, queue, entries, timeout_s)
+        finally:
+            process.join()
+        if "error" in row:
+            print(f"❌ {entries} entries failed: {row['error']}")
+        rows.append(row)
+    return rows
+
+
+def print_table(rows) -> None:
+    print(f"\n{'entries':>8} | " + " | ".join(f"{s[:22]:>22}" for s in STAGES))
+    for row in rows:
+        cells = [f"{row[s]['seconds']:>8.3f}s {row[s]['rss_growth_mb']:>+8.0f}MB" if s in row else "failed"
+                 for s in STAGES]
+        line = f"{row['entries']:>8} | " + " | ".join(f"{c:>22}" for c in cells)
+        print(line + (f"  ({row['error']})" if "error" in row else ""))
+
+
+def plot(rows, output: Path) -> None:
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("⚠️ matplotlib not installed, skipping the plot.")
+        return
+
+    fig, (ax_time, ax_mem) = plt.subplots(1, 2, figsize=(12, 4.5))
+    for stage in STAGES:
+        # a failed size only has the stages it finished
+        measured = [row for row in rows if stage in row]
+        sizes = [row["entries"] for row in measured]
+        ax_time.plot(sizes, [row[stage]["seconds"] for row in measured], marker="o", label=stage)
+        ax_mem.plot(sizes, [row[stage]["peak_rss_mb"] for row in measured], marker="o", label=stage)
+    for ax, label in ((ax_time, "seconds"), (ax_mem, "peak RSS after stage (MB)")):
+        ax.set_xscale("log")
+        ax.set_yscale("log")
+        ax.set_xlabel("memories in history")
+        ax.set_ylabel(label)
+        ax.grid(True, which="both", alpha=0.3)
+    ax_time.legend(fontsize=8)
+    fig.tight_layout()
+    fig.savefig(output, dpi=120)
+    print(f"📈 Saved {output}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scaling benchmark over synthetic history sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--hash-embeddings", action="store_true", help="replace e5 with a hash vector")
+    parser.add_argument("--timeout", type=float, default=SIZE_TIMEOUT_S, help="seconds allowed per size")
+    parser.add_argument("--json", type=Path, default=None, help="also write the raw results here")
+    parser.add_argument("--plot", type=Path, default=Path("bench_scaling.png"))
+    args = parser.parse_args()
+
+    rows = run_sizes(args.sizes, args.hash_embeddings, args.timeout)
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+    plot(rows, args.plot)
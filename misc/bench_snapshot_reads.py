@@ -0,0 +1,135 @@
+# bench_snapshot_reads.py
+# Snapshot-read and retrieval latency while idle and while other processes commit a backfill that the
+# index owner (this process, like mainthread.index_loop) indexes as it lands.
+#
+#   python misc/bench_snapshot_reads.py --entries 20000 --writers 2 --hash-embeddings
+#   python misc/bench_snapshot_reads.py --entries 2000                        # real e5 embeddings, slow
+
+import sys
+import multiprocessing
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from memory_store import append_entries, read_snapshot, read_version, writer_lock, claim_index_owner, INDEX_LOCK_NAME
+from synth_history import write_history, generate_history
+from bench_scaling import HashEmbedding, QUESTIONS
+
+
+def backfill(model_json: Path, seed: int, batch: int, interval: float, stop) -> None:
+    """
+    Append synthetic captions in commits of `batch` every `interval` seconds, like bulk_import does, until stop is set.
+    """
+    entries = (entry for source, entry in generate_history(10 ** 7, seed=seed) if source == "model")
+    while not stop.wait(interval):
+        append_entries(model_json, [next(entries) for _ in range(batch)], unique_key="image_path")
+
+
+def index_commits(client, manifest, store_lock: threading.Lock, user_json: Path, model_json: Path,
+                  stop: threading.Event, counts) -> None:
+    """
+    Owner-side indexer: bring the sharded index up to each new commit, under the locks mainthread.sync_memories takes.
+    """
+    from memory_combiner import aggregate_memories
+    from shard_store import add_image_memories_sharded
+
+    indexed = -1
+    while not stop.is_set():
+        version, (user_data, model_data) = read_snapshot(user_json, model_json)
+        if version == indexed:
+            time.sleep(0.05)
+            continue
+        with writer_lock(user_json.parent / "chroma_db", INDEX_LOCK_NAME), store_lock:
+            add_image_memories_sharded(client, aggregate_memories(user_data, model_data), manifest,
+                                       sentence_vectors=True, prune=True)
+        indexed = version
+        counts["index_updates"] += 1
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))]
+
+
+def measure(user_json: Path, model_json: Path, service, reads: int):
+    """
+    p50/p95 of snapshot reads and of retrievals through MemoryService.retrieve, as the local API serves them.
+    """
+    snapshot, query = [], []
+    for i in range(reads):
+        start = time.perf_counter()
+        read_snapshot(user_json, model_json)
+        snapshot.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        service.retrieve(QUESTIONS[i % len(QUESTIONS)], top_k=5)
+        query.append(time.perf_counter() - start)
+    return percentiles(snapshot), percentiles(query)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Read and query latency with and without concurrent writers.")
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--hash-embeddings", action="store_true", help="replace e5 with a hash vector")
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=32, help="captions per writer commit")
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between a writer's commits (0 = flat out)")
+    parser.add_argument("--reads", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        write_history(args.entries, tmp)
+        user_json, model_json = tmp / "memory_text_user.json", tmp / "memory_text_model.json"
+
+        from model_residency import residency
+        from vector_store import initialize_vector_store
+        from shard_store import ShardManifest
+        from image_dedup import ImageHashIndex
+        from local_service import MemoryService
+        if args.hash_embeddings:
+            residency.register("embedder", footprint_mb=0, reload_s=0, load=HashEmbedding)
+        claim_index_owner(tmp / "chroma_db")
+        client = initialize_vector_store(persist_dir=str(tmp / "chroma_db"))
+        manifest = ShardManifest(tmp / "chroma_db" / "shards.json")
+        store_lock = threading.Lock()
+        service = MemoryService(persist_dir=str(tmp / "chroma_db"), client=client, manifest=manifest,
+                                hash_index=ImageHashIndex(tmp / "image_hashes.json"), store_lock=store_lock)
+
+        counts = {"index_updates": 0}
+        stop_indexer = threading.Event()
+        indexer = threading.Thread(target=index_commits,
+                                   args=(client, manifest, store_lock, user_json, model_json, stop_indexer, counts))
+        print(f"📚 Indexing {args.entries} entries...")
+        indexer.start()
+        while counts["index_updates"] == 0 and indexer.is_alive():
+            time.sleep(0.1)
+        if not indexer.is_alive():
+            sys.exit("❌ Indexing failed.")
+        idle = measure(user_json, model_json, service, args.reads)
+
+        stop = multiprocessing.Event()
+        writers = [multiprocessing.Process(target=backfill, args=(model_json, 1000 + i, args.batch, args.interval, stop))
+                   for i in range(args.writers)]
+        for w in writers:
+            w.start()
+        while counts["index_updates"] < 2 and indexer.is_alive():
+            time.sleep(0.05)
+        busy = measure(user_json, model_json, service, args.reads)
+        stop.set()
+        for w in writers:
+            w.join()
+        stop_indexer.set()
+        indexer.join()
+
+        for name, (snapshot, query) in (("idle", idle), (f"{args.writers} writer(s)", busy)):
+            print(f"{name + ':':<16} snapshot p50 {snapshot[0] * 1000:>7.1f} ms  p95 {snapshot[1] * 1000:>7.1f} ms   "
+                  f"query p50 {query[0] * 1000:>7.1f} ms  p95 {query[1] * 1000:>7.1f} ms")
+        print(f"commits during the run: version {read_version(tmp)['version']}, "
+              f"index updates {counts['index_updates']}")
@@ -0,0 +1,165 @@
+# fake_ollama_server.py
+# Local stand-in for the Ollama HTTP API (and its OpenAI-compatible /v1 route), used by the benchmarks in misc/.
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def reply_for_schema(schema: dict, text: str):
+    """
+    Smallest value that satisfies a JSON schema (as passed in Ollama's `format`), filling strings with text.
+    """
+    kind = schema.get("type")
+    if kind == "object" or "properties" in schema:
+        return {k: reply_for_schema(v, text) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [reply_for_schema(schema.get("items", {}), text)]
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 1.0
+    if kind == "boolean":
+        return True
+    return text
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    # set by start_fake_server()
+    latency = 1.0         # seconds before the first token (prompt evaluation)
+    token_latency = 0.0   # seconds per generated token
+    slots = threading.Semaphore(1)
+    reply = "A laptop and a phone on a wooden desk."
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply_text(self, request) -> str:
+        schema = request.get("format")
+        if isinstance(schema, dict):
+            return json.dumps(reply_for_schema(schema, self.reply))
+        if schema == "json" or request.get("response_format", {}).get("type") == "json_object":
+            return json.dumps({"summary": self.reply, "image_refs": []})
+        return self.reply
+
+    @staticmethod
+    def _tokens(text: str):
+        # one "token" per word, keeping the spaces so the pieces join back to text
+        words = text.split(" ")
+        return [w + " " for w in words[:-1]] + words[-1:]
+
+    def _generate(self, request, emit) -> dict:
+        """
+        Produce the reply token by token, calling emit(token) for each; returns Ollama's final counters.
+        """
+        prompt = request.get("prompt") or "".join(str(m.get("content", "")) for m in request.get("messages", []))
+        tokens = self._tokens(self._reply_text(request))
+        # emulate OLLAMA_NUM_PARALLEL: only `parallel` requests are served at once
+        with self.slots:
+            time.sleep(self.latency)
+            for token in tokens:
+                time.sleep(self.token_latency)
+                emit(token)
+        return {
+            "done": True,
+            "prompt_eval_count": max(1, len(prompt) // 4),
+            "prompt_eval_duration": int(self.latency * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": max(1, int(self.token_latency * len(tokens) * 1e9)),
+        }
+
+    def _stream(self, make_line):
+        """
+        Send the streaming response headers and return an emit(token) that writes one NDJSON line per token.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        def emit(token):
+            self.wfile.write((json.dumps(make_line(token, False)) + "\n").encode())
+            self.wfile.flush()
+        return emit
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "")
+
+        if self.path in ("/api/generate", "/api/chat"):
+            is_chat = self.path == "/api/chat"
+
+            def make_line(token, done):
+                if is_chat:
+                    return {"model": model, "message": {"role": "assistant", "content": token}, "done": done}
+                return {"model": model, "response": token, "done": done}
+
+            if request.get("stream", True):
+                emit = self._stream(make_line)
+                counters = self._generate(request, emit)
+                self.wfile.write((json.dumps({**make_line("", True), **counters}) + "\n").encode())
+            else:
+                pieces = []
+                counters = self._generate(request, pieces.append)
+                self._send_json({**make_line("".join(pieces), True), **counters})
+        elif self.path == "/v1/chat/completions":
+            pieces = []
+            counters = self._generate(request, pieces.append)
+            self._send_json({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(pieces)}}],
+                "usage": {"prompt_tokens": counters["prompt_eval_count"], "completion_tokens": counters["eval_count"],
+                          "total_tokens": counters["prompt_eval_count"] + counters["eval_count"]},
+            })
+        else:
+            self._send_json({"error": f"unsupported path {self.path}"}, status=404)
+
+
+def start_fake_server(port: int = 0, latency: float = 1.0, parallel: int = 1, token_latency: float = 0.0,
+                      reply: str = None):
+    """
+    Start the stand-in server in a background thread and return (server, base_url).
+    """
+    attrs = {
+        "latency": latency,
+        "token_latency": token_latency,
+        "slots": threading.Semaphore(parallel),
+    }
+    if reply is not None:
+        attrs["reply"] = reply
+    handler = type("Handler", (FakeOllamaHandler,), attrs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks.")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per generated token")
+    parser.add_argument("--parallel", type=int, default=1, help="requests served at once")
+    args = parser.parse_args()
+
+    server, url = start_fake_server(args.port, args.latency, args.parallel, args.token_latency)
+    print(f"🧪 Fake Ollama listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,89 @@
+# load_test_service.py
+# Throughput and latency of local_service.py /query with several concurrent clients.
+#
+#   python local_service.py &
+#   python misc/load_test_service.py --clients 1 4 8 --requests 20
+#   python misc/load_test_service.py --answer --clients 2 --requests 3   # includes the LLM answer
+
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+QUESTIONS = [
+    "Where did I leave my phone?",
+    "Where are my keys?",
+    "What did I eat for lunch yesterday?",
+    "Where did I park the car?",
+    "Who did I meet at the cafe?",
+    "Where did I put my glasses?",
+    "What did I buy at the store?",
+    "When did I water the plants?",
+]
+
+
+def post_json(url: str, payload: dict, timeout: float = 120.0) -> dict:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def get_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def run_clients(base_url: str, clients: int, requests_per_client: int, answer: bool) -> dict:
+    before = get_json(f"{base_url}/health")["embedding"]
+
+    def client(worker: int):
+        latencies, errors = [], 0
+        for i in range(requests_per_client):
+            question = QUESTIONS[(worker + i) % len(QUESTIONS)]
+            start = time.perf_counter()
+            try:
+                post_json(f"{base_url}/query", {"question": question, "answer": answer})
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - start
+
+    after = get_json(f"{base_url}/health")["embedding"]
+    latencies = sorted(l for worker_latencies, _ in results for l in worker_latencies)
+    batches = after["batches"] - before["batches"]
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50": statistics.median(latencies) if latencies else None,
+        "p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        "mean_batch": (after["queries"] - before["queries"]) / batches if batches else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test for the local memory service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--answer", action="store_true", help="also generate the LLM answer")
+    args = parser.parse_args()
+
+    rows = [run_clients(args.url, clients, args.requests, args.answer) for clients in args.clients]
+
+    print("\nclients | requests | errors | req/s | p50 ms | p95 ms | queries/embed batch")
+    for r in rows:
+        p50 = f"{r['p50'] * 1000:.0f}" if r["p50"] is not None else "n/a"
+        p95 = f"{r['p95'] * 1000:.0f}" if r["p95"] is not None else "n/a"
+        print(f"{r['clients']:>7} | {r['requests']:>8} | {r['errors']:>6} | {r['throughput']:>5.1f} | "
+              f"{p50:>6} | {p95:>6} | {r['mean_batch']:>19.1f}")
@@ -0,0 +1,154 @@
+# synth_history.py
+# Synthetic memory histories for scaling tests: user notes and caption-style descriptions in the same
+# JSON formats as memory_text_user.json / memory_text_model.json, with realistic capture times.
+#
+#   python misc/synth_history.py 100000 --out synthetic_100k      # 100k entries (notes + captions)
+
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+# Config
+# share of photos that also get a spoken user note
+NOTE_PROBABILITY = 0.6
+# days the history spans, ending today; photos per day follow from the entry count
+HISTORY_DAYS = 365
+# share of days with any photos
+ACTIVE_DAY_PROBABILITY = 0.85
+# a photo starts a burst of follow-up shots a few minutes apart with this probability
+BURST_PROBABILITY = 0.25
+
+OBJECTS = [
+    "keys", "phone", "wallet", "glasses", "sunglasses", "passport", "laptop", "charger", "headphones", "umbrella",
+    "water bottle", "coffee mug", "notebook", "pen", "medicine box", "remote control", "backpack", "jacket",
+    "watch", "earbuds case", "library book", "train ticket", "receipt", "credit card", "hat", "scarf",
+    "car key fob", "bike lock", "lunch box", "tablet", "camera", "power bank", "house plant", "grocery bag",
+]
+PLACES = [
+    "kitchen counter", "desk", "nightstand", "sofa", "dining table", "bookshelf", "entryway shelf", "coat hook",
+    "bathroom sink", "car seat", "office drawer", "windowsill", "backpack pocket", "bedside drawer", "fridge top",
+    "garage workbench", "tv stand", "hallway bench", "balcony table", "laundry basket",
+]
+COLORS = ["black", "white", "blue", "red", "green", "gray", "brown", "silver", "yellow", "navy"]
+LIGHTS = ["soft morning", "bright afternoon", "warm evening", "dim lamp", "cool fluorescent", "natural window"]
+PEOPLE = ["my sister", "a colleague", "my neighbor", "an old friend", "my doctor", "the kids", "my partner"]
+ACTIVITIES = ["cooking dinner", "working late", "reading", "packing for a trip", "cleaning up", "watching a movie",
+              "paying bills", "repotting plants", "getting ready for work", "unpacking groceries"]
+
+NOTE_TEMPLATES = [
+    "I put my {obj} on the {place}.",
+    "My {obj} is next to the {obj2} on the {place}.",
+    "Left the {color} {obj} on the {place} while {activity}.",
+    "Remember: the {obj} is in the {place}, not in the car.",
+    "Met {person} today, we talked about the {obj}.",
+    "Took my medicine and put the {obj} back on the {place}.",
+    "The spare {obj} is behind the {obj2} on the {place}.",
+    "This is where I keep the {obj} now.",
+]
+CAPTION_TEMPLATES = [
+    "The image shows a {color} {obj} resting on a {place}, bathed in {light} light. Next to it is a {obj2}, "
+    "and a {color2} {obj3} sits slightly out of focus in the background.",
+    "A close-up of a {place} with a {color} {obj} in the center. To the left, a {obj2} lies partially covered "
+    "by a {color2} cloth. The scene suggests someone was {activity}.",
+    "This photo captures a cluttered {place} in {light} light. A {obj} and a {obj2} are placed side by side, "
+    "while a {color2} {obj3} leans against the wall behind them.",
+    "A {color} {obj} is visible on the {place}, next to a {color2} {obj2}. The surroundings look tidy, "
+    "with a {obj3} near the edge of the frame.",
+]
+
+
+def fill(template: str, rng: random.Random) -> str:
+    obj, obj2, obj3 = rng.sample(OBJECTS, 3)
+    color, color2 = rng.sample(COLORS, 2)
+    return template.format(obj=obj, obj2=obj2, obj3=obj3, color=color, color2=color2,
+                           place=rng.choice(PLACES), light=rng.choice(LIGHTS),
+                           person=rng.choice(PEOPLE), activity=rng.choice(ACTIVITIES))
+
+
+def capture_times(rng: random.Random, start: datetime, photos_per_day: float) -> Iterator[datetime]:
+    """
+    Endless capture times: active days with an exponentially distributed photo count, mostly 7:00-23:00, some in bursts.
+    """
+    day = start
+    while True:
+        if rng.random() < ACTIVE_DAY_PROBABILITY:
+            count = round(rng.expovariate(1 / photos_per_day))
+            times = []
+            while len(times) < count:
+                # waking hours, busier in the evening
+                t = day + timedelta(hours=min(23.9, max(7.0, rng.gauss(15, 4))), seconds=rng.randrange(3600))
+                times.append(t)
+                while rng.random() < BURST_PROBABILITY and len(times) < count:
+                    t = t + timedelta(seconds=rng.randrange(20, 600))
+                    times.append(t)
+            yield from sorted(times)
+        day += timedelta(days=1)
+
+
+def generate_history(entries: int, seed: int = 0, days: int = HISTORY_DAYS) -> Iterator[Tuple[str, Dict]]:
+    """
+    Yield (source, entry) pairs until `entries` entries are produced: one caption per photo and a note for some,
+    spread over roughly the last `days` days.
+    """
+    rng = random.Random(seed)
+    start = datetime.combine(datetime.now().date() - timedelta(days=days), datetime.min.time())
+    photos_per_day = entries / ((1 + NOTE_PROBABILITY) * days * ACTIVE_DAY_PROBABILITY)
+    produced = 0
+    used_names = set()
+    for t in capture_times(rng, start, photos_per_day):
+        name = f"img_{t.strftime('%Y%m%d_%H%M%S')}"
+        if name in used_names:
+            continue
+        used_names.add(name)
+        image_path = f"memory_images/{name}.jpg"
+        timestamp = t.strftime("%Y-%m-%d %H:%M:%S")
+
+        yield "model", {"timestamp": timestamp, "description": fill(rng.choice(CAPTION_TEMPLATES), rng),
+                        "image_path": image_path, "source": "model"}
+        produced += 1
+        if produced >= entries:
+            return
+        if rng.random() < NOTE_PROBABILITY:
+            yield "user", {"timestamp": timestamp, "description": fill(rng.choice(NOTE_TEMPLATES), rng),
+                           "image_path": image_path, "source": "user"}
+            produced += 1
+            if produced >= entries:
+                return
+
+
+def write_history(entries: int, out_dir: Path, seed: int = 0, days: int = HISTORY_DAYS) -> Dict:
+    """
+    Write memory_text_user.json and memory_text_model.json under out_dir, streaming so 500k entries fit in RAM.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = {"user": out_dir / "memory_text_user.json", "model": out_dir / "memory_text_model.json"}
+    files = {source: open(path, "w") for source, path in paths.items()}
+    counts = {"user": 0, "model": 0}
+    try:
+        for f in files.values():
+            f.write("[\n")
+        for source, entry in generate_history(entries, seed, days):
+            files[source].write((",\n" if counts[source] else "") + json.dumps(entry, ensure_ascii=False))
+            counts[source] += 1
+        for f in files.values():
+            f.write("\n]\n")
+    finally:
+        for f in files.values():
+            f.close()
+    print(f"✅ Wrote {counts['user']} notes + {counts['model']} captions to {out_dir}")
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic memory history.")
+    parser.add_argument("entries", type=int, help="total notes + captions, e.g. 1000 to 500000")
+    parser.add_argument("--out", type=Path, default=Path("synthetic_history"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=HISTORY_DAYS, help="days of use the history covers")
+    args = parser.parse_args()
+
+    write_history(args.entries, args.out, args.seed, args.days)
@@ -0,0 +1,244 @@
+# model_residency.py
+
+import gc
+import threading
+import time
+from contextlib import contextmanager
+from queue import Queue
+from typing import Any, Callable, Dict, List, Optional
+
+from hardware_profile import setting, describe_device
+from tracing import span, current_rss_mb
+
+# Config
+# RAM the resident models may use together; None = MODEL_BUDGET_SHARE of physical RAM
+MODEL_BUDGET_MB = setting("model_budget_mb")
+MODEL_BUDGET_SHARE = 0.6
+# passed on every Ollama request: the server never unloads a model on its own timer,
+# only this manager does (keep_alive=0), so its accounting matches what is loaded
+OLLAMA_KEEP_ALIVE = -1
+# models to have resident in each interaction state, loaded in the background on entering it
+STATE_PREFETCH = {
+    "menu": ["tts", "whisper"],
+    "takephoto": ["tts", "whisper", "llava-phi3:3.8b"],
+    "himan": ["tts", "whisper", "embedder", "llama3.2:3b", "image_encoder"],
+}
+
+
+class ResidentModel:
+    """
+    One registered model: how to load and unload it, its RAM footprint and how long a reload takes.
+    Higher priority models are evicted last; among equal priorities the least recently used goes first.
+    """
+
+    def __init__(self, name: str, footprint_mb: float, reload_s: float, load: Callable[[], Any],
+                 unload: Optional[Callable[[Any], None]] = None, priority: int = 1):
+        self.name = name
+        self.footprint_mb = footprint_mb
+        self.reload_s = reload_s
+        self.load = load
+        self.unload = unload
+        self.priority = priority
+        self.model = None
+        self.loaded = False
+        self.pins = 0
+        self.last_used = 0.0
+        # serializes load / unload of this model
+        self.lock = threading.Lock()
+
+
+class ResidencyManager:
+    """
+    Keeps the loaded models under a RAM budget. use(name) loads a model on demand (evicting idle ones
+    by priority, then LRU) and pins it while in use; prefetch_for(state) loads what a state needs ahead.
+    """
+
+    def __init__(self, budget_mb: Optional[float] = None):
+        if budget_mb is None:
+            total_ram_mb = describe_device()["total_ram_mb"] or 8192
+            budget_mb = MODEL_BUDGET_SHARE * total_ram_mb
+        self.budget_mb = budget_mb
+        self.models: Dict[str, ResidentModel] = {}
+        self.lock = threading.Lock()
+        self._prefetch_queue = Queue()
+        self._prefetch_thread = None
+
+    def register(self, name: str, footprint_mb: float, reload_s: float, load: Callable[[], Any],
+                 unload: Optional[Callable[[Any], None]] = None, priority: int = 1) -> None:
+        """
+        Add a model, or replace the loader of an unloaded one (e.g. a stand-in for benchmarks).
+        """
+        with self.lock:
+            existing = self.models.get(name)
+            if existing is not None and existing.loaded:
+                return
+            self.models[name] = ResidentModel(name, footprint_mb, reload_s, load, unload, priority)
+
+    def resident_mb(self) -> float:
+        with self.lock:
+            return sum(m.footprint_mb for m in self.models.values() if m.loaded)
+
+    def _evict_for(self, entry: ResidentModel) -> None:
+        """
+        Unload idle models until entry fits, lowest priority first, then least recently used.
+        """
+        with self.lock:
+            candidates = sorted((m for m in self.models.values() if m.loaded and m is not entry),
+                                key=lambda m: (m.priority, m.last_used))
+        for victim in candidates:
+            if self.resident_mb() + entry.footprint_mb <= self.budget_mb:
+                return
+            # a model that is loading or in use elsewhere is skipped, never waited for
+            if victim.pins or not victim.lock.acquire(blocking=False):
+                continue
+            try:
+                if victim.loaded and not victim.pins:
+                    self._unload(victim)
+            finally:
+                victim.lock.release()
+        if self.resident_mb() + entry.footprint_mb > self.budget_mb:
+            print(f"⚠️ {entry.name} ({entry.footprint_mb:.0f} MB) exceeds the {self.budget_mb:.0f} MB model budget "
+                  f"with the models in use; loading anyway.")
+
+    def _load(self, entry: ResidentModel) -> None:
+        print(f"📦 Loading {entry.name} (~{entry.footprint_mb:.0f} MB, ~{entry.reload_s:.0f} s)...")
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        with span("model_load", model=entry.name, footprint_mb=entry.footprint_mb):
+            entry.model = entry.load()
+        elapsed = time.perf_counter() - start
+        # in-process models: the RSS growth is a better footprint than the registered estimate
+        grown = current_rss_mb() - rss_before
+        if grown > 0.5 * entry.footprint_mb:
+            entry.footprint_mb = grown
+        entry.reload_s = elapsed
+        entry.loaded = True
+
+    def _unload(self, entry: ResidentModel) -> None:
+        print(f"🧹 Unloading {entry.name} ({entry.footprint_mb:.0f} MB)")
+        with span("model_unload", model=entry.name, footprint_mb=entry.footprint_mb):
+            if entry.unload is not None:
+                try:
+                    entry.unload(entry.model)
+                except Exception as e:
+                    print(f"⚠️ Failed to unload {entry.name}: {e}")
+            entry.model = None
+            entry.loaded = False
+            gc.collect()
+
+    def acquire(self, name: str) -> Any:
+        """
+        Load the model if needed and pin it; every acquire needs a matching release().
+        """
+        entry = self.models[name]
+        with entry.lock:
+            if not entry.loaded:
+                self._evict_for(entry)
+                self._load(entry)
+            with self.lock:
+                entry.pins += 1
+                entry.last_used = time.monotonic()
+            return entry.model
+
+    def release(self, name: str) -> None:
+        entry = self.models[name]
+        with self.lock:
+            entry.pins -= 1
+            entry.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self, name: str):
+        """
+        `with residency.use("whisper") as model: ...` keeps the model resident for the block.
+        """
+        model = self.acquire(name)
+        try:
+            yield model
+        finally:
+            self.release(name)
+
+    def unload(self, name: str) -> None:
+        entry = self.models[name]
+        with entry.lock:
+            if entry.loaded and not entry.pins:
+                self._unload(entry)
+
+    def prefetch(self, names: List[str]) -> None:
+        """
+        Load models in the background, in order, so the next stage does not wait for them.
+        """
+        if self._prefetch_thread is None:
+            self._prefetch_thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+            self._prefetch_thread.start()
+        for name in names:
+            if name in self.models:
+                self._prefetch_queue.put(name)
+
+    def prefetch_for(self, state: str) -> None:
+        self.prefetch(STATE_PREFETCH.get(state, []))
+
+    def _prefetch_loop(self) -> None:
+        while True:
+            name = self._prefetch_queue.get()
+            entry = self.models[name]
+            if entry.loaded:
+                continue
+            # a prefetch only uses free budget or idle lower-priority models; it never overshoots
+            with self.lock:
+                free_mb = self.budget_mb - sum(m.footprint_mb for m in self.models.values() if m.loaded)
+                evictable_mb = sum(m.footprint_mb for m in self.models.values()
+                                   if m.loaded and not m.pins and m.priority <= entry.priority)
+            if entry.footprint_mb > free_mb + evictable_mb:
+                print(f"⚡ Not prefetching {name}: {entry.footprint_mb:.0f} MB does not fit.")
+                continue
+            try:
+                self.acquire(name)
+                self.release(name)
+            except Exception as e:
+                print(f"⚠️ Prefetch of {name} failed: {e}")
+
+    def status(self) -> List[Dict]:
+        with self.lock:
+            return [{"name": m.name, "loaded": m.loaded, "pinned": m.pins > 0, "footprint_mb": round(m.footprint_mb),
+                     "reload_s": round(m.reload_s, 1), "priority": m.priority} for m in self.models.values()]
+
+
+residency = ResidencyManager(MODEL_BUDGET_MB)
+
+
+def register_ollama_model(model: str, footprint_mb: float, reload_s: float, priority: int = 0,
+                          host: Optional[str] = None) -> None:
+    """
+    Manage an Ollama model: loading sends an empty request that keeps it resident, unloading sends keep_alive=0.
+    """
+    import ollama
+    client = ollama.Client(host=host) if host else ollama.Client()
+
+    def load():
+        client.generate(model=model, keep_alive=OLLAMA_KEEP_ALIVE)
+        return model
+
+    def unload(_):
+        client.generate(model=model, keep_alive=0)
+
+    residency.register(model, footprint_mb, reload_s, load, unload, priority)
+
+
+@contextmanager
+def use_ollama_model(model: str):
+    """
+    Pin an Ollama model for a request; models nobody registered are passed through unmanaged.
+    """
+    if model not in residency.models:
+        yield model
+        return
+    with residency.use(model):
+        yield model
+
+
+if __name__ == "__main__":
+    # what Ollama holds right now, e.g. to check that nothing is loaded behind the manager's back
+    import ollama
+    print(f"📦 Model budget: {residency.budget_mb:.0f} MB")
+    for m in ollama.ps().models:
+        print(f"  {m.model:<24} {m.size / 1024 / 1024:>8.0f} MB  expires {m.expires_at}")
@@ -3,7 +3,8 @@
 from tkinter import Tk, Label, StringVar
 from PIL import Image, ImageTk
 import time
-from pathlib import Path
+
+from retention import resolve_image_path
 
 def popup_images(image_paths, delay=5):
     """
@@ -43,7 +44,8 @@ def popup_images(image_paths, delay=5):
 
     root.bind("<Escape>", close)
 
-    valid_images = [p for p in image_paths if Path(p).exists()]
+    # originals past their retention period may only survive as thumbnails
+    valid_images = [p for p in (resolve_image_path(p) for p in image_paths) if p]
     total = len(valid_images)
 
     for idx, img_path in enumerate(valid_images):
@@ -1,16 +1,162 @@
 # query_reasoning.py
 
-from typing import List, Dict
+from typing import Dict, Generator, List
+import json
+import re
 from openai import OpenAI
 import instructor
+import ollama
 from pydantic import BaseModel, Field
 from datetime import datetime
 from pytz import timezone
 
+from tracing import span, record_ollama
+from model_residency import register_ollama_model, use_ollama_model, OLLAMA_KEEP_ALIVE
+
+# llama3.2:3b Q4 weights + KV cache; reload time on a Pi 5 from SD card
+register_ollama_model("llama3.2:3b", footprint_mb=2800, reload_s=8)
+
 class MemoryReasoning(BaseModel):
     summary: str = Field(..., description="Summary of reasoning based on memory entries")
     image_refs: List[str] = Field(..., description="List of up to 3 real image file paths supporting the reasoning")
 
+class MemoryAnswer(BaseModel):
+    summary: str = Field(..., description="Summary of reasoning based on memory entries")
+    image_refs: List[int] = Field(..., description="Numbers of up to 3 memory records supporting the reasoning")
+
+# "schema": JSON schema passed to Ollama as a grammar, image refs are record numbers (one LLM call)
+# "instructor": instructor JSON mode, re-asks the model when validation fails
+STRUCTURED_MODE = "schema"
+
+# running totals, printed after every answer
+structured_output_stats = {"calls": 0, "repairs": 0, "retries": 0, "dropped_refs": 0, "fallbacks": 0}
+
+def repair_json(text: str) -> Dict:
+    """
+    Best-effort parse of a JSON object that was cut off or wrapped in extra text.
+    """
+    start = text.find("{")
+    end = text.rfind("}")
+    candidate = text[start:end + 1] if start != -1 and end > start else text[start:] if start != -1 else text
+    # close a truncated string / list / object, then drop trailing commas
+    if candidate.count('"') % 2:
+        candidate += '"'
+    candidate += "]" * max(0, candidate.count("[") - candidate.count("]"))
+    candidate += "}" * max(0, candidate.count("{") - candidate.count("}"))
+    candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
+    return json.loads(candidate)
+
+def resolve_image_refs(refs, memories: List[Dict], limit: int = 3) -> List[str]:
+    """
+    Map 1-based record numbers to image paths, dropping out-of-range numbers and duplicates.
+    """
+    paths = []
+    for ref in refs:
+        try:
+            idx = int(ref)
+        except (TypeError, ValueError):
+            structured_output_stats["dropped_refs"] += 1
+            continue
+        if not 1 <= idx <= len(memories):
+            structured_output_stats["dropped_refs"] += 1
+            continue
+        path = memories[idx - 1]["image_path"]
+        if path not in paths:
+            paths.append(path)
+    return paths[:limit]
+
+def format_numbered_records(memories: List[Dict], start: int = 1) -> str:
+    return "\n".join([
+        f"[{i}] {m['timestamp']} ({m['source']}): {m['description']}" for i, m in enumerate(memories, start=start)
+    ])
+
+def build_constrained_prompt(query: str, memories: List[Dict]) -> str:
+    context_str = format_numbered_records(memories)
+
+    timestamp = datetime.now(timezone("America/New_York"))
+    return f"""
+You are a memory assistant.
+
+Based on the following numbered memory records, help the user recall a forgotten moment.
+
+Memory records:
+{context_str}
+
+User question (asked at {timestamp}): "{query}"
+
+Instructions:
+- Use only what's in the records.
+- Summarize the most relevant memory in 2-3 sentences.
+- Recommend up to 3 records whose photos support the answer, by their number.
+
+Respond in JSON:
+- summary: string
+- image_refs: list of record numbers
+"""
+
+def build_followup_prompt(query: str, new_memories: List[Dict], start: int) -> str:
+    """
+    Next user turn of a conversation: only records not sent before, numbered after the earlier ones.
+    """
+    timestamp = datetime.now(timezone("America/New_York"))
+    records = ""
+    if new_memories:
+        records = f"\nAdditional memory records:\n{format_numbered_records(new_memories, start)}\n"
+    return f"""{records}
+Follow-up question (asked at {timestamp}): "{query}"
+
+Answer in the same JSON format, using record numbers from this conversation.
+"""
+
+def chat_structured(messages: List[Dict], memories: List[Dict], model_name: str = "llama3.2:3b"):
+    """
+    One schema-constrained chat call. Returns (MemoryReasoning, raw assistant content).
+    """
+    structured_output_stats["calls"] += 1
+    with use_ollama_model(model_name), span("llm", model=model_name, turns=len(messages) // 2 + 1):
+        response = ollama.chat(
+            model=model_name,
+            messages=messages,
+            format=MemoryAnswer.model_json_schema(),
+            options={"temperature": 0.2},
+            keep_alive=OLLAMA_KEEP_ALIVE,
+        )
+        record_ollama(response, model_name)
+    content = response["message"]["content"]
+
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        structured_output_stats["repairs"] += 1
+        try:
+            data = repair_json(content)
+        except json.JSONDecodeError:
+            structured_output_stats["fallbacks"] += 1
+            data = {"summary": content.strip(), "image_refs": []}
+    if not isinstance(data, dict):
+        # valid JSON, but a list, string or number instead of the answer object
+        structured_output_stats["fallbacks"] += 1
+        data = {"summary": content.strip(), "image_refs": []}
+
+    summary = str(data.get("summary") or "").strip()
+    if not summary:
+        structured_output_stats["fallbacks"] += 1
+        summary = "I could not find a clear answer in your memories."
+    refs = data.get("image_refs") or []
+    answer = MemoryReasoning(summary=summary, image_refs=resolve_image_refs(refs if isinstance(refs, list) else [refs], memories))
+
+    print("🧾 Structured output: " + ", ".join(f"{k}={v}" for k, v in structured_output_stats.items()))
+    return answer, content
+
+def generate_answer_constrained(query: str, memories: List[Dict], model_name: str = "llama3.2:3b") -> MemoryReasoning:
+    """
+    Single-call structured answer: Ollama constrains decoding to the MemoryAnswer JSON schema, and image
+    references are record numbers, so they always resolve to a retrieved image without a second LLM call.
+    """
+    messages = [{"role": "user", "content": build_constrained_prompt(query, memories)}]
+    answer, _ = chat_structured(messages, memories, model_name)
+    return answer
+
 def generate_answer(query: str, memories: List[Dict], model_name: str = "llama3.2:3b") -> MemoryReasoning:
     """
     Generate a reasoning summary based on retrieved memories and a user query.
@@ -23,6 +169,8 @@ def generate_answer(query: str, memories: List[Dict], model_name: str = "llama3.
     Returns:
         MemoryReasoning: A structured reasoning result.
     """
+    if STRUCTURED_MODE == "schema":
+        return generate_answer_constrained(query, memories, model_name)
 
     context_str = "\n".join([
         f"- {m['timestamp']} ({m['source']}): {m['description']} [Image: {m['image_path']}]" for m in memories
@@ -49,17 +197,78 @@ Respond in JSON:
 - image_refs: list of image paths
 """
 
+    # count the validation re-asks instructor makes behind the scenes
+    openai_client = OpenAI(base_url="http://localhost:11434/v1", api_key="ollama")
+    raw_create = openai_client.chat.completions.create
+    attempts = []
+
+    def counted_create(*args, **kwargs):
+        attempts.append(1)
+        return raw_create(*args, **kwargs)
+
+    openai_client.chat.completions.create = counted_create
+
     # Ollama + instructor function-calling
     client = instructor.patch(
-        OpenAI(base_url="http://localhost:11434/v1", api_key="ollama"),
+        openai_client,
         mode=instructor.Mode.JSON,
     )
 
-    response = client.chat.completions.create(
-        model=model_name,
-        messages=[{"role": "user", "content": prompt}],
-        response_model=MemoryReasoning,
-        temperature=0.2,
-    )
+    with use_ollama_model(model_name), span("llm", model=model_name, mode="instructor") as llm_span:
+        response = client.chat.completions.create(
+            model=model_name,
+            messages=[{"role": "user", "content": prompt}],
+            response_model=MemoryReasoning,
+            temperature=0.2,
+            # the OpenAI-compatible endpoint takes Ollama's keep_alive as an extra body field
+            extra_body={"keep_alive": OLLAMA_KEEP_ALIVE},
+        )
+        llm_span.set(attempts=len(attempts))
+    structured_output_stats["calls"] += 1
+    structured_output_stats["retries"] += max(0, len(attempts) - 1)
+    print("🧾 Structured output: " + ", ".join(f"{k}={v}" for k, v in structured_output_stats.items()))
 
     return response
+
+def build_streaming_prompt(query: str, memories: List[Dict]) -> str:
+    timestamp = datetime.now(timezone("America/New_York"))
+    return f"""
+You are a memory assistant.
+
+Based on the following numbered memory records, help the user recall a forgotten moment.
+
+Memory records:
+{format_numbered_records(memories)}
+
+User question (asked at {timestamp}): "{query}"
+
+Instructions:
+- Use only what's in the records.
+- Answer in 2-3 plain sentences, no JSON.
+- Cite up to 3 supporting records by number in square brackets, e.g. [2].
+"""
+
+def stream_answer(query: str, memories: List[Dict], model_name: str = "llama3.2:3b") -> Generator[str, None, MemoryReasoning]:
+    """
+    Yield the answer text as the LLM generates it. The generator's return value is the MemoryReasoning
+    built from the full text, with image_refs taken from the [n] citations.
+    """
+    chunks = []
+    with use_ollama_model(model_name):
+        for part in ollama.chat(
+            model=model_name,
+            messages=[{"role": "user", "content": build_streaming_prompt(query, memories)}],
+            options={"temperature": 0.2},
+            stream=True,
+            keep_alive=OLLAMA_KEEP_ALIVE,
+        ):
+            if part.get("done"):
+                record_ollama(part, model_name)
+            chunk = part["message"]["content"]
+            chunks.append(chunk)
+            yield chunk
+
+    text = "".join(chunks).strip()
+    refs = re.findall(r"\[(\d+)\]", text)
+    summary = re.sub(r"\s*\[\d+\]", "", text)
+    return MemoryReasoning(summary=summary, image_refs=resolve_image_refs(refs, memories))
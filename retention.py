@@ -0,0 +1,237 @@
+# retention.py
+
+from pathlib import Path
+import os
+import sqlite3
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+import chromadb
+from PIL import Image
+
+from image_processing import parse_image_timestamp
+from image_dedup import shared_hash_index
+from memory_store import claim_index_owner
+
+# Config
+# Tier 1: originals stay at full resolution for FULL_RES_DAYS.
+FULL_RES_DAYS = 30
+# Tier 2: then they are replaced in place by a downscaled archive copy...
+ARCHIVE_MAX_SIDE = 1152
+ARCHIVE_QUALITY = 80
+# ...which is deleted after ARCHIVE_DAYS (None keeps it forever).
+ARCHIVE_DAYS = None
+# Tier 3: a thumbnail plus the text/embedding are always kept.
+THUMB_DIR = Path("memory_thumbs")
+THUMB_MAX_SIDE = 320
+
+
+def thumbnail_path(img_path: Path, thumb_dir: Path = THUMB_DIR) -> Path:
+    return Path(thumb_dir) / Path(img_path).name
+
+
+def resolve_image_path(img_path: str, thumb_dir: Path = THUMB_DIR) -> Optional[str]:
+    """
+    The best copy still on disk for an image: the original/archive, else its thumbnail, else None.
+    """
+    if Path(img_path).exists():
+        return str(img_path)
+    thumb = thumbnail_path(img_path, thumb_dir)
+    return str(thumb) if thumb.exists() else None
+
+
+def image_age_days(img_path: Path, now: datetime) -> float:
+    dt = parse_image_timestamp(img_path)
+    if dt is None:
+        taken = datetime.fromtimestamp(Path(img_path).stat().st_mtime)
+    else:
+        taken = datetime.strptime(dt, {16: "%Y-%m-%d %H:%M", 19: "%Y-%m-%d %H:%M:%S"}.get(len(dt), "%Y-%m-%d %H"))
+    return (now - taken) / timedelta(days=1)
+
+
+def _save_downscaled(src: Path, dst: Path, max_side: int, quality: int) -> None:
+    stat = src.stat()
+    with Image.open(src) as image:
+        image.draft("RGB", (max_side, max_side))
+        image = image.convert("RGB")
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        tmp_path = dst.with_name(dst.name + ".tmp")  # not *.jpg, so folder globs never see it
+        image.save(tmp_path, format="JPEG", quality=quality, optimize=True)
+    # image_age_days falls back to the mtime for names without a timestamp
+    os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(tmp_path, dst)
+
+
+def apply_image_retention(image_folder: Path, thumb_dir: Path = THUMB_DIR, now: Optional[datetime] = None,
+                          dry_run: bool = False) -> Dict:
+    """
+    Move every image in image_folder to the tier its age calls for.
+
+    Returns:
+        Dict: counts per action and bytes before/after for images and thumbnails.
+    """
+    now = now or datetime.now()
+    thumb_dir = Path(thumb_dir)
+    thumb_dir.mkdir(parents=True, exist_ok=True)
+    report = {"thumbnailed": 0, "archived": 0, "deleted": 0, "image_bytes_before": 0, "image_bytes_after": 0,
+              "thumb_bytes_added": 0}
+    # archived copies have new bytes; their hash records must follow so duplicates still match
+    hash_index = shared_hash_index()
+
+    for img_path in sorted(Path(image_folder).glob("*.jpg")):
+        size_before = img_path.stat().st_size
+        report["image_bytes_before"] += size_before
+        try:
+            thumb = thumbnail_path(img_path, thumb_dir)
+            if not thumb.exists():
+                if not dry_run:
+                    _save_downscaled(img_path, thumb, THUMB_MAX_SIDE, 75)
+                    report["thumb_bytes_added"] += thumb.stat().st_size
+                report["thumbnailed"] += 1
+
+            age = image_age_days(img_path, now)
+            if ARCHIVE_DAYS is not None and age > FULL_RES_DAYS + ARCHIVE_DAYS:
+                print(f"🗑️ {img_path.name}: {age:.0f} days old, keeping thumbnail only")
+                if not dry_run:
+                    img_path.unlink()
+                report["deleted"] += 1
+                continue
+
+            if age > FULL_RES_DAYS:
+                with Image.open(img_path) as image:
+                    already_archived = max(image.size) <= ARCHIVE_MAX_SIDE
+                if not already_archived:
+                    print(f"📦 {img_path.name}: {age:.0f} days old, downscaling to {ARCHIVE_MAX_SIDE}px")
+                    if not dry_run:
+                        _save_downscaled(img_path, img_path, ARCHIVE_MAX_SIDE, ARCHIVE_QUALITY)
+                        hash_index.rehash(img_path)
+                    report["archived"] += 1
+        except Exception as e:
+            print(f"❌ Retention failed for {img_path.name}: {e}")
+
+        if img_path.exists():
+            report["image_bytes_after"] += img_path.stat().st_size
+
+    if report["archived"] and not dry_run:
+        hash_index.save()
+    return report
+
+
+def directory_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def measure_query_latency(collection, n_queries: int = 20, top_k: int = 5) -> Optional[float]:
+    """
+    Median seconds per collection.query, using stored embeddings as queries (no embedding model needed).
+    """
+    sample = collection.get(limit=n_queries, include=["embeddings"])
+    embeddings = sample["embeddings"]
+    if embeddings is None or len(embeddings) == 0:
+        return None
+    timings = []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[list(embedding)], n_results=min(top_k, collection.count()))
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def compact_collection(client: chromadb.Client, name: str, batch_size: int = 500) -> Dict:
+    """
+    Rebuild a collection from its live records, dropping index tombstones left by deletes and updates.
+    """
+    tmp_name = f"{name}__compact"
+    names = [getattr(c, "name", c) for c in client.list_collections()]
+    if tmp_name in names:
+        if name not in names:
+            # a previous run stopped between delete and rename; the rebuilt copy is the only one left
+            client.get_collection(name=tmp_name).modify(name=name)
+        else:
+            client.delete_collection(name=tmp_name)
+
+    old = client.get_collection(name=name)
+    latency_before = measure_query_latency(old)
+    count = old.count()
+    new = client.create_collection(name=tmp_name, metadata=old.metadata)
+
+    for offset in range(0, count, batch_size):
+        batch = old.get(limit=batch_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        new.add(
+            ids=batch["ids"],
+            embeddings=[list(e) for e in batch["embeddings"]],
+            documents=batch["documents"],
+            metadatas=batch["metadatas"]
+        )
+
+    client.delete_collection(name=name)
+    new.modify(name=name)
+    latency_after = measure_query_latency(client.get_collection(name=name))
+    print(f"✅ Compacted '{name}' ({count} records).")
+    return {"name": name, "count": count, "latency_before": latency_before, "latency_after": latency_after}
+
+
+def compact_vector_store(persist_dir: str, collection_names: Optional[List[str]] = None) -> Dict:
+    """
+    Offline compaction of the Chroma store: rebuild collections and VACUUM its SQLite file.
+    Refuses to run while the assistant (or another index owner) is using the same persist_dir.
+    """
+    if not claim_index_owner(Path(persist_dir), blocking=False):
+        raise RuntimeError(f"❌ Another process owns {persist_dir}; stop mainthread.py before compacting.")
+    bytes_before = directory_bytes(Path(persist_dir))
+    client = chromadb.PersistentClient(path=persist_dir)
+    if collection_names is None:
+        collection_names = [n for n in (getattr(c, "name", c) for c in client.list_collections())
+                            if not n.endswith("__compact")]
+
+    collections = [compact_collection(client, name) for name in collection_names]
+
+    sqlite_path = Path(persist_dir) / "chroma.sqlite3"
+    if sqlite_path.exists():
+        conn = sqlite3.connect(sqlite_path)
+        conn.execute("VACUUM")
+        conn.close()
+
+    return {"collections": collections, "bytes_before": bytes_before,
+            "bytes_after": directory_bytes(Path(persist_dir))}
+
+
+def _mb(n: int) -> str:
+    return f"{n / 1024 / 1024:.1f} MB"
+
+
+def print_report(image_report: Dict, store_report: Optional[Dict]) -> None:
+    print("\n📊 Retention report")
+    print(f"  images: {image_report['archived']} archived, {image_report['deleted']} reduced to thumbnails, "
+          f"{image_report['thumbnailed']} new thumbnails")
+    reclaimed = image_report["image_bytes_before"] - image_report["image_bytes_after"] - image_report["thumb_bytes_added"]
+    print(f"  image bytes: {_mb(image_report['image_bytes_before'])} -> {_mb(image_report['image_bytes_after'])} "
+          f"(+{_mb(image_report['thumb_bytes_added'])} thumbnails), reclaimed {_mb(reclaimed)}")
+    if store_report:
+        print(f"  vector store: {_mb(store_report['bytes_before'])} -> {_mb(store_report['bytes_after'])}, "
+              f"reclaimed {_mb(store_report['bytes_before'] - store_report['bytes_after'])}")
+        for c in store_report["collections"]:
+            if c["latency_before"] is None:
+                continue
+            print(f"  {c['name']}: {c['count']} records, query p50 "
+                  f"{c['latency_before'] * 1000:.1f} ms -> {c['latency_after'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Apply image retention tiers and compact the vector store.")
+    parser.add_argument("--images", default="memory_images")
+    parser.add_argument("--thumbs", default=str(THUMB_DIR))
+    parser.add_argument("--chroma", default="chroma_db")
+    parser.add_argument("--compact", action="store_true", help="also rebuild the Chroma collections (offline)")
+    parser.add_argument("--collections", nargs="*", default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    image_report = apply_image_retention(Path(args.images), Path(args.thumbs), dry_run=args.dry_run)
+    store_report = None
+    if args.compact and not args.dry_run:
+        store_report = compact_vector_store(args.chroma, args.collections)
+    print_report(image_report, store_report)
@@ -0,0 +1,235 @@
+# shard_store.py
+
+from pathlib import Path
+import calendar
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict, Callable, Optional, Tuple
+import chromadb
+
+from memory_combiner import ImageMemory, parse_timestamp
+from memory_store import write_json_atomic
+from vector_store import query_image_memories, embed_query, image_content_hash
+from streaming_indexer import stream_image_memories_to_vector_store
+
+# Config
+SHARD_MANIFEST_PATH = Path("chroma_db/shards.json")
+# a hit at least this similar counts as a confident match
+CONFIDENT_SIMILARITY = 0.65
+# stop fanning out to older shards once this many confident matches are found
+CONFIDENT_HITS = 2
+
+
+def shard_month(timestamp: str) -> str:
+    return parse_timestamp(timestamp).strftime("%Y-%m")
+
+
+def shard_name(base_name: str, month: str) -> str:
+    return f"{base_name}_{month.replace('-', '_')}"
+
+
+class ShardManifest:
+    """
+    JSON record of the monthly shards of each base collection: entry count, time range and last query time.
+
+    Copy-on-write: the indexer builds an updated copy of a shard and swaps the `shards` mapping under a
+    short writer lock, and queries read whichever mapping is current without locking, so retrieval never
+    waits for an index update. Query times are kept apart in `last_queried` and persisted by save().
+    """
+
+    def __init__(self, manifest_path: Path = SHARD_MANIFEST_PATH):
+        self.manifest_path = Path(manifest_path)
+        self.shards: Dict[str, Dict] = {}
+        self.last_queried: Dict[str, str] = {}
+        # writers only
+        self.lock = threading.Lock()
+        if self.manifest_path.exists():
+            with open(self.manifest_path, "r") as f:
+                self.shards = json.load(f).get("shards", {})
+
+    def save(self) -> None:
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            shards = {name: {**shard, "last_queried": self.last_queried.get(name, shard.get("last_queried"))}
+                      for name, shard in self.shards.items()}
+            write_json_atomic(self.manifest_path, {"shards": shards})
+
+    def _replace(self, name: str, shard: Dict) -> None:
+        # called with self.lock held; readers keep the old mapping until this one assignment
+        shards = dict(self.shards)
+        shards[name] = shard
+        self.shards = shards
+
+    def record(self, base_name: str, month: str, records: List[ImageMemory], sentence_vectors: bool = False) -> None:
+        name = shard_name(base_name, month)
+        with self.lock:
+            shard = dict(self.shards.get(name) or {"base": base_name, "month": month, "count": 0,
+                                                   "first": None, "last": None, "last_queried": None,
+                                                   "images": {}})
+            shard["images"] = dict(shard["images"])
+            for r in records:
+                shard["images"][r.image_path] = image_content_hash(r, sentence_vectors)
+            shard["count"] = len(shard["images"])
+            timestamps = [r.timestamp for r in records] + [t for t in (shard["first"], shard["last"]) if t]
+            shard["first"] = min(timestamps, key=parse_timestamp)
+            shard["last"] = max(timestamps, key=parse_timestamp)
+            self._replace(name, shard)
+
+    def is_current(self, base_name: str, month: str, records: List[ImageMemory], sentence_vectors: bool = False) -> bool:
+        """
+        True if every record is already in the shard with the same content, so the shard need not be opened.
+        """
+        images = self.shards.get(shard_name(base_name, month), {}).get("images", {})
+        return all(images.get(r.image_path) == image_content_hash(r, sentence_vectors) for r in records)
+
+    def misplaced(self, base_name: str, shard_of: Dict[str, str], prune: bool = False) -> Dict[str, List[str]]:
+        """
+        Images indexed in a shard of base_name other than shard_of[image_path] (their timestamp moved to
+        another month), by shard. With prune, images missing from shard_of are included as well.
+        """
+        stale: Dict[str, List[str]] = {}
+        for name, shard in self.shards.items():
+            if shard["base"] != base_name:
+                continue
+            for image_path in shard["images"]:
+                target = shard_of.get(image_path)
+                if target != name and (target is not None or prune):
+                    stale.setdefault(name, []).append(image_path)
+        return stale
+
+    def forget(self, name: str, image_paths: List[str]) -> None:
+        with self.lock:
+            gone = set(image_paths)
+            shard = dict(self.shards[name])
+            shard["images"] = {path: h for path, h in shard["images"].items() if path not in gone}
+            shard["count"] = len(shard["images"])
+            self._replace(name, shard)
+
+    def touch(self, name: str) -> None:
+        """
+        Note a query in memory only; it is persisted with the next save() by the indexer.
+        """
+        self.last_queried[name] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    def select(self, base_name: str, since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[str]:
+        """
+        Shards of base_name overlapping [since, until], newest first.
+        """
+        selected = []
+        for name, shard in self.shards.items():
+            if shard["base"] != base_name:
+                continue
+            if since and parse_timestamp(shard["last"]) < since:
+                continue
+            if until and parse_timestamp(shard["first"]) > until:
+                continue
+            selected.append((shard["month"], name))
+        return [name for _, name in sorted(selected, reverse=True)]
+
+
+def add_image_memories_sharded(client: chromadb.Client, records: List[ImageMemory], manifest: ShardManifest,
+                               base_name: str = "memories_by_image", sentence_vectors: bool = False,
+                               prune: bool = False) -> None:
+    """
+    Route each ImageMemory to the monthly shard of its timestamp and update the manifest.
+    Each shard is indexed with the streaming indexer, in batches sized to its memory and latency budgets.
+
+    An image whose timestamp moved to another month is removed from its old shard. With prune (records
+    is the whole memory snapshot), images no longer among the records are removed from every shard too.
+    """
+    by_month: Dict[str, List[ImageMemory]] = {}
+    for record in records:
+        by_month.setdefault(shard_month(record.timestamp), []).append(record)
+
+    shard_of = {r.image_path: shard_name(base_name, month) for month, month_records in by_month.items()
+                for r in month_records}
+    for name, image_paths in manifest.misplaced(base_name, shard_of, prune).items():
+        client.get_or_create_collection(name=name).delete(where={"image_path": {"$in": image_paths}})
+        manifest.forget(name, image_paths)
+        print(f"🧹 Removed {len(image_paths)} images from shard '{name}'.")
+
+    for month, month_records in sorted(by_month.items()):
+        if manifest.is_current(base_name, month, month_records, sentence_vectors):
+            continue
+        stream_image_memories_to_vector_store(client, month_records, collection_name=shard_name(base_name, month),
+                                              sentence_vectors=sentence_vectors)
+        manifest.record(base_name, month, month_records, sentence_vectors)
+    manifest.save()
+
+
+MONTHS = {name.lower(): idx for idx, name in enumerate(calendar.month_name) if name}
+
+def time_window_from_query(query_text: str, now: Optional[datetime] = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Rough (since, until) window for questions like "yesterday", "last week" or "in April"; (None, None) otherwise.
+    """
+    now = now or datetime.now()
+    text = query_text.lower()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if "today" in text or "this morning" in text or "tonight" in text:
+        return today, None
+    if "yesterday" in text:
+        return today - timedelta(days=1), today
+    if "this week" in text or "last few days" in text:
+        return today - timedelta(days=7), None
+    if "last week" in text:
+        # the previous calendar week, Monday to Monday
+        this_monday = today - timedelta(days=today.weekday())
+        return this_monday - timedelta(days=7), this_monday
+    if "this month" in text:
+        return today.replace(day=1), None
+    if "last month" in text:
+        first = today.replace(day=1)
+        return (first - timedelta(days=1)).replace(day=1), first
+    for name, month in MONTHS.items():
+        # require a preposition so the verb "may" is not read as a month
+        if re.search(rf"\b(in|on|during|since|from|early|late|mid|last) {name}\b", text):
+            year = now.year if month <= now.month else now.year - 1
+            start = datetime(year, month, 1)
+            end = datetime(year + (month == 12), month % 12 + 1, 1)
+            return start, end
+    return None, None
+
+
+def query_sharded(client: chromadb.Client, query_text: str, manifest: ShardManifest,
+                  base_name: str = "memories_by_image", top_k: int = 5,
+                  since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  confident_similarity: float = CONFIDENT_SIMILARITY,
+                  confident_hits: int = CONFIDENT_HITS,
+                  query_fn: Callable = query_image_memories,
+                  query_embedding: Optional[List[float]] = None, **query_kwargs) -> List[Dict]:
+    """
+    Query the monthly shards newest first, stopping once enough confident matches are found.
+
+    The time window defaults to the one implied by the question (see time_window_from_query).
+    The query is embedded once (or a precomputed query_embedding is used) and reused for every shard.
+    """
+    if since is None and until is None:
+        since, until = time_window_from_query(query_text)
+    shards = manifest.select(base_name, since, until)
+    if not shards and (since or until):
+        # nothing in the window, fall back to the whole history
+        shards = manifest.select(base_name)
+
+    if query_embedding is None:
+        query_embedding = embed_query(query_text)
+    matched_memories = []
+    for scanned, name in enumerate(shards, start=1):
+        matched_memories += query_fn(client, query_text, top_k=top_k, collection_name=name,
+                                     query_embedding=query_embedding, **query_kwargs)
+        manifest.touch(name)
+        if sum(m["similarity"] >= confident_similarity for m in matched_memories) >= confident_hits:
+            print(f"⚡ Early stop after {scanned}/{len(shards)} shards.")
+            break
+
+    # the same photo group can appear in several shards; keep its best hit
+    canonical_of = query_kwargs.get("canonical_of") or (lambda path: path)
+    best = {}
+    for memory in matched_memories:
+        key = (canonical_of(memory["image_path"]), memory["source"])
+        if key not in best or memory["similarity"] > best[key]["similarity"]:
+            best[key] = memory
+    return sorted(best.values(), key=lambda m: m["similarity"], reverse=True)[:top_k]
@@ -0,0 +1,216 @@
+# streaming_indexer.py
+
+from pathlib import Path
+import json
+import time
+from typing import Callable, Dict, Iterable, Iterator, List
+import chromadb
+
+from vector_store import make_id, embed_passages, add_image_memories_to_vector_store
+from memory_combiner import ImageMemory
+from hardware_profile import setting
+from tracing import current_rss_mb
+
+# Config
+# RSS growth allowed across a single embed + add round
+MEMORY_BUDGET_MB = 300
+# target seconds per embed + add round, keeps the voice loop responsive
+LATENCY_BUDGET_S = 2.0
+MIN_BATCH = 1
+MAX_BATCH = 256
+START_BATCH = setting("embed_batch_size")
+
+
+def iter_json_array(json_path: Path, chunk_size: int = 1 << 16) -> Iterator[Dict]:
+    """
+    Yield the items of a top-level JSON array one at a time without loading the whole file.
+    Used by the flat-collection sync and the CLI; the per-image sync aggregates a full snapshot instead.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    with open(json_path, "r") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            buffer += chunk
+            while True:
+                buffer = buffer.lstrip()
+                if not started:
+                    if not buffer:
+                        break
+                    if buffer[0] != "[":
+                        raise ValueError(f"❌ Expected a JSON array in {json_path}")
+                    buffer = buffer[1:]
+                    started = True
+                    continue
+                if buffer.startswith(","):
+                    buffer = buffer[1:]
+                    continue
+                if buffer.startswith("]"):
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    break  # item continues in the next chunk
+                yield item
+                buffer = buffer[end:]
+            if not chunk:
+                if buffer.strip():
+                    raise ValueError(f"❌ Truncated JSON array in {json_path}")
+                return
+
+
+class AdaptiveBatchSizer:
+    """
+    AIMD batch size: doubles while a batch stays well inside the latency and memory budgets, halves when it exceeds either.
+
+    Memory is judged by the RSS growth across each batch rather than against a fixed baseline, so a
+    one-off model load (e5 loads lazily inside the first batch) only shrinks that one step.
+    """
+
+    def __init__(self, memory_budget_mb: float = MEMORY_BUDGET_MB, latency_budget_s: float = LATENCY_BUDGET_S,
+                 start: int = START_BATCH, minimum: int = MIN_BATCH, maximum: int = MAX_BATCH):
+        self.memory_budget_mb = memory_budget_mb
+        self.latency_budget_s = latency_budget_s
+        self.size = start
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def update(self, batch_len: int, seconds: float, rss_growth: float) -> int:
+        if seconds > self.latency_budget_s or rss_growth > self.memory_budget_mb:
+            self.size = max(self.minimum, self.size // 2)
+        elif batch_len >= self.size and seconds < self.latency_budget_s / 2 and rss_growth < self.memory_budget_mb / 2:
+            self.size = min(self.maximum, self.size * 2)
+        return self.size
+
+
+def stream_memories_to_vector_store(client: chromadb.Client, entries: Iterable[Dict],
+                                    collection_name: str = "memories",
+                                    memory_budget_mb: float = MEMORY_BUDGET_MB,
+                                    latency_budget_s: float = LATENCY_BUDGET_S,
+                                    embed_fn: Callable[[List[str]], List[List[float]]] = embed_passages) -> Dict:
+    """
+    Index memory entries from any iterable (e.g. iter_json_array), committing one adaptively sized batch at a time.
+
+    Only the current batch is held in memory: its ids are checked against the collection, the new
+    entries are embedded and added, and the batch size is adjusted to the memory and latency budgets.
+    embed_fn embeds the "passage: ..." documents (e5 by default, see embedding_cascade.py for the small model).
+
+    Returns:
+        Dict: seen / added counts, docs_per_second, peak_rss_mb and the final batch size.
+    """
+    collection = client.get_or_create_collection(name=collection_name)
+    sizer = AdaptiveBatchSizer(memory_budget_mb, latency_budget_s)
+    stats = {"seen": 0, "added": 0, "docs_per_second": 0.0, "peak_rss_mb": current_rss_mb(), "batch_size": sizer.size}
+    start = time.time()
+
+    def flush(batch: List[Dict]) -> None:
+        t0 = time.time()
+        rss_before = current_rss_mb()
+        ids = [make_id(entry) for entry in batch]
+        existing_ids = set(collection.get(ids=ids)["ids"])
+        documents, metadatas, new_ids = [], [], []
+        for entry, mem_id in zip(batch, ids):
+            if mem_id in existing_ids or mem_id in new_ids:
+                continue
+            documents.append(f"passage: {entry['timestamp']} - {entry['description']}")
+            metadatas.append(entry)
+            new_ids.append(mem_id)
+        if documents:
+            embeddings = embed_fn(documents)
+            collection.add(documents=documents, embeddings=embeddings, metadatas=metadatas, ids=new_ids)
+        rss_after = current_rss_mb()
+        stats["added"] += len(documents)
+        stats["peak_rss_mb"] = max(stats["peak_rss_mb"], rss_after)
+        # batches that were already indexed say nothing about embedding cost
+        if documents:
+            sizer.update(len(documents), time.time() - t0, rss_after - rss_before)
+
+    batch: List[Dict] = []
+    for entry in entries:
+        batch.append(entry)
+        stats["seen"] += 1
+        if len(batch) >= sizer.size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    elapsed = time.time() - start
+    stats["docs_per_second"] = stats["added"] / elapsed if elapsed > 0 else 0.0
+    stats["batch_size"] = sizer.size
+    if stats["added"]:
+        print(f"✅ Streamed {stats['added']} new of {stats['seen']} memories into '{collection_name}' — "
+              f"{stats['docs_per_second']:.1f} docs/s, peak RSS {stats['peak_rss_mb']:.0f} MB, batch size {sizer.size}.")
+    else:
+        print("⚡ No new memories to add. Vector store is already up to date.")
+    return stats
+
+
+def stream_image_memories_to_vector_store(client: chromadb.Client, records: Iterable[ImageMemory],
+                                          collection_name: str = "memories_by_image",
+                                          sentence_vectors: bool = False,
+                                          memory_budget_mb: float = MEMORY_BUDGET_MB,
+                                          latency_budget_s: float = LATENCY_BUDGET_S) -> Dict:
+    """
+    The one_doc_per_image counterpart of stream_memories_to_vector_store: records go through
+    add_image_memories_to_vector_store in adaptively sized batches of images, so a large backlog of
+    changed photos (and their sentence vectors) is never embedded in a single call.
+
+    Returns:
+        Dict: seen images / added vectors, docs_per_second, peak_rss_mb and the final batch size.
+    """
+    sizer = AdaptiveBatchSizer(memory_budget_mb, latency_budget_s)
+    stats = {"seen": 0, "added": 0, "docs_per_second": 0.0, "peak_rss_mb": current_rss_mb(), "batch_size": sizer.size}
+    start = time.time()
+
+    def flush(batch: List[ImageMemory]) -> None:
+        t0 = time.time()
+        rss_before = current_rss_mb()
+        added = add_image_memories_to_vector_store(client, batch, collection_name=collection_name,
+                                                   sentence_vectors=sentence_vectors, verbose=False)
+        rss_after = current_rss_mb()
+        stats["added"] += added
+        stats["peak_rss_mb"] = max(stats["peak_rss_mb"], rss_after)
+        if added:
+            sizer.update(len(batch), time.time() - t0, rss_after - rss_before)
+
+    batch: List[ImageMemory] = []
+    for record in records:
+        batch.append(record)
+        stats["seen"] += 1
+        if len(batch) >= sizer.size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    elapsed = time.time() - start
+    stats["docs_per_second"] = stats["added"] / elapsed if elapsed > 0 else 0.0
+    stats["batch_size"] = sizer.size
+    if stats["added"]:
+        print(f"✅ Streamed {stats['added']} vectors for {stats['seen']} images into '{collection_name}' — "
+              f"{stats['docs_per_second']:.1f} docs/s, peak RSS {stats['peak_rss_mb']:.0f} MB, batch size {sizer.size}.")
+    else:
+        print("⚡ No changed images to index. Vector store is already up to date.")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    from vector_store import initialize_vector_store
+    from memory_store import claim_index_owner
+
+    parser = argparse.ArgumentParser(description="Stream a memory JSON file into ChromaDB with bounded memory.")
+    parser.add_argument("memory_json", nargs="?", default="memory_combined.json")
+    parser.add_argument("--chroma", default="chroma_db")
+    parser.add_argument("--collection", default="memories")
+    parser.add_argument("--memory-budget-mb", type=float, default=MEMORY_BUDGET_MB)
+    parser.add_argument("--latency-budget-s", type=float, default=LATENCY_BUDGET_S)
+    args = parser.parse_args()
+
+    if not claim_index_owner(Path(args.chroma), blocking=False):
+        parser.error(f"another process owns {args.chroma}; stop mainthread.py or local_service.py first")
+    client = initialize_vector_store(persist_dir=args.chroma)
+    stream_memories_to_vector_store(client, iter_json_array(Path(args.memory_json)), collection_name=args.collection,
+                                    memory_budget_mb=args.memory_budget_mb, latency_budget_s=args.latency_budget_s)
@@ -0,0 +1,74 @@
+# test_audio_ring_buffer.py
+
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sounddevice")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audio_ring_buffer import AudioRingBuffer, BLOCK_SIZE
+
+SAMPLE_RATE = 16000
+SECONDS = 0.5  # 8000 samples, 10 blocks
+
+
+def ramp(start, length):
+    # sample value == absolute position, exact in float32 for these sizes
+    return np.arange(start, start + length, dtype=np.float32)
+
+
+def fill(ring, total, block=BLOCK_SIZE):
+    for start in range(0, total, block):
+        ring.write(ramp(start, min(block, total - start)))
+
+
+def test_read_across_the_wrap_point():
+    ring = AudioRingBuffer(SECONDS, SAMPLE_RATE)
+    fill(ring, ring.capacity + 3 * BLOCK_SIZE)
+    start, end = ring.capacity - 100, ring.capacity + 100
+    assert np.array_equal(ring.read(start, end), ramp(start, end - start))
+
+
+def test_oversized_block_keeps_the_newest_samples():
+    ring = AudioRingBuffer(SECONDS, SAMPLE_RATE)
+    ring.write(ramp(0, ring.capacity + 500))
+    assert ring.position() == ring.capacity + 500
+    end = ring.position()
+    start = end - (ring.capacity - BLOCK_SIZE)
+    assert np.array_equal(ring.read(start, end), ramp(start, end - start))
+
+
+def test_read_ahead_of_the_writer_raises():
+    ring = AudioRingBuffer(SECONDS, SAMPLE_RATE)
+    fill(ring, 2 * BLOCK_SIZE)
+    with pytest.raises(ValueError, match="not been captured"):
+        ring.read(0, 3 * BLOCK_SIZE)
+
+
+def test_lapped_range_is_rejected():
+    ring = AudioRingBuffer(SECONDS, SAMPLE_RATE)
+    fill(ring, 3 * ring.capacity)
+    with pytest.raises(ValueError, match="overwritten"):
+        ring.read(ring.capacity, ring.capacity + 10)
+
+
+def test_oldest_block_is_rejected_while_a_write_may_be_in_progress():
+    ring = AudioRingBuffer(SECONDS, SAMPLE_RATE)
+    fill(ring, 2 * ring.capacity)
+    written = ring.position()
+    oldest_safe = written - (ring.capacity - BLOCK_SIZE)
+    # the next, not yet published, block would overwrite the samples just before oldest_safe
+    with pytest.raises(ValueError, match="overwritten"):
+        ring.read(oldest_safe - 1, oldest_safe + 10)
+    assert np.array_equal(ring.read(oldest_safe, written), ramp(oldest_safe, written - oldest_safe))
+
+
+def test_wait_until_times_out_without_a_writer():
+    ring = AudioRingBuffer(SECONDS, SAMPLE_RATE)
+    fill(ring, BLOCK_SIZE)
+    assert ring.wait_until(BLOCK_SIZE, timeout=0.0)
+    assert not ring.wait_until(2 * BLOCK_SIZE, timeout=0.05)
@@ -0,0 +1,76 @@
+# test_kws_decision.py
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from kws_decision import KeywordDecisionEngine, single_frame_engine
+
+FRAME_S = 0.25
+
+
+def feed(engine, frames, start=0.0):
+    """
+    Detections as (frame index, label) for a list of score dicts, one every FRAME_S seconds.
+    """
+    detections = []
+    for i, scores in enumerate(frames):
+        label = engine.update(scores, start + i * FRAME_S)
+        if label:
+            detections.append((i, label))
+    return detections
+
+
+def frame(himan=0.0, takephoto=0.0, noise=None):
+    noise = 1.0 - himan - takephoto if noise is None else noise
+    return {"himan": himan, "takephoto": takephoto, "noise": noise}
+
+
+def engine(**kwargs):
+    options = {"thresholds": {"himan": 0.7, "takephoto": 0.7}, "window": 3, "early_accept": 0.9,
+               "early_rise": 0.3, "refractory_s": 1.0}
+    return KeywordDecisionEngine(("himan", "takephoto"), **{**options, **kwargs})
+
+
+def test_single_spike_is_smoothed_away():
+    frames = [frame(), frame(himan=0.8), frame(), frame(), frame()]
+    assert feed(engine(), frames) == []
+    # the one-frame rule fires on it
+    assert feed(single_frame_engine(("himan", "takephoto"), threshold=0.7), frames) == [(1, "himan")]
+
+
+def test_sustained_score_is_accepted_once_the_window_fills():
+    frames = [frame(himan=0.75)] * 3
+    assert feed(engine(early_accept=None), frames) == [(2, "himan")]
+
+
+def test_early_accept_on_a_confident_rising_frame():
+    frames = [frame(himan=0.1), frame(himan=0.95)]
+    assert feed(engine(), frames) == [(1, "himan")]
+
+
+def test_confident_but_flat_frames_wait_for_the_window():
+    frames = [frame(himan=0.92), frame(himan=0.93), frame(himan=0.94)]
+    # no rise of EARLY_RISE between frames, so only the smoothed rule applies
+    assert feed(engine(), frames) == [(2, "himan")]
+
+
+def test_refractory_period_suppresses_repeats():
+    frames = [frame(himan=0.8)] * 12
+    # nothing is accepted for 1 s (4 frames) after each detection
+    assert feed(engine(early_accept=None), frames) == [(2, "himan"), (6, "himan"), (10, "himan")]
+    assert feed(engine(early_accept=None, refractory_s=2.0), frames) == [(2, "himan"), (10, "himan")]
+
+
+def test_smoothed_label_must_also_win_the_latest_frame():
+    frames = [frame(himan=0.9, takephoto=0.05)] * 2 + [frame(himan=0.35, takephoto=0.6)]
+    # himan averages 0.72 but takephoto wins the last frame
+    assert feed(engine(early_accept=None), frames) == []
+
+
+def test_reset_keeps_the_refractory_period():
+    e = engine(early_accept=None)
+    assert feed(e, [frame(himan=0.8)] * 3) == [(2, "himan")]
+    e.reset()
+    assert feed(e, [frame(himan=0.8)] * 3, start=3 * FRAME_S) == []
@@ -0,0 +1,103 @@
+# test_memory_store.py
+# Concurrent writers against a lock-free snapshot reader.
+
+import json
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from memory_store import append_entries, read_snapshot, read_version, write_json_atomic, writer_lock, \
+    claim_index_owner, commit, VERSION_NAME
+
+COMMITS_PER_WRITER = 40
+
+
+def _writer(directory: str, writer: int) -> None:
+    directory = Path(directory)
+    for i in range(COMMITS_PER_WRITER):
+        # both files change in one commit, so a snapshot must always see them agree
+        with writer_lock(directory):
+            user = json.loads((directory / "user.json").read_text())
+            model = json.loads((directory / "model.json").read_text())
+            entry = {"writer": writer, "i": i}
+            commit({directory / "user.json": user + [entry], directory / "model.json": model + [entry]})
+        append_entries(directory / "notes.json", [{"writer": writer, "i": i}])
+
+
+def _hold_owner(directory: str, ready, release) -> None:
+    claim_index_owner(Path(directory))
+    ready.set()
+    release.wait(10)
+
+
+def test_snapshot_reader_never_sees_a_torn_commit(tmp_path):
+    for name in ("user.json", "model.json", "notes.json"):
+        write_json_atomic(tmp_path / name, [])
+
+    writers = [multiprocessing.Process(target=_writer, args=(str(tmp_path), w)) for w in range(2)]
+    for w in writers:
+        w.start()
+
+    versions = []
+    while any(w.is_alive() for w in writers):
+        version, (user, model) = read_snapshot(tmp_path / "user.json", tmp_path / "model.json")
+        assert user == model, f"files of version {version} disagree"
+        versions.append(version)
+    for w in writers:
+        w.join()
+        assert w.exitcode == 0
+
+    assert versions == sorted(versions)
+    notes = json.loads((tmp_path / "notes.json").read_text())
+    # two commits per iteration (the pair and the note), none lost
+    assert len(notes) == 2 * COMMITS_PER_WRITER
+    final = read_version(tmp_path)
+    assert (final["version"], final["writing"]) == (4 * COMMITS_PER_WRITER, False)
+    version, (user, model) = read_snapshot(tmp_path / "user.json", tmp_path / "model.json")
+    assert len(user) == len(model) == 2 * COMMITS_PER_WRITER
+
+
+def test_write_json_atomic_leaves_no_temp_file(tmp_path):
+    write_json_atomic(tmp_path / "a.json", {"x": 1})
+    write_json_atomic(tmp_path / "a.json", {"x": 2})
+    assert json.loads((tmp_path / "a.json").read_text()) == {"x": 2}
+    assert [p.name for p in tmp_path.iterdir()] == ["a.json"]
+
+
+def test_read_snapshot_finishes_a_commit_whose_writer_died(tmp_path, monkeypatch):
+    import memory_store
+
+    write_json_atomic(tmp_path / "user.json", [{"n": 1}])
+    write_json_atomic(tmp_path / VERSION_NAME, {"version": 3, "writing": True, "pid": 0})
+    monkeypatch.setattr(memory_store, "SNAPSHOT_RETRIES", 3)
+
+    version, (user,) = read_snapshot(tmp_path / "user.json")
+    assert (version, user) == (4, [{"n": 1}])
+    assert read_version(tmp_path)["writing"] is False
+
+
+def test_writer_lock_times_out_while_held(tmp_path):
+    with writer_lock(tmp_path) as held:
+        assert held
+        start = time.monotonic()
+        with writer_lock(tmp_path, timeout=0.05) as second:
+            assert second is False
+        assert time.monotonic() - start < 1.0
+    with writer_lock(tmp_path, blocking=False) as again:
+        assert again
+
+
+def test_claim_index_owner_is_exclusive_across_processes(tmp_path):
+    ready, release = multiprocessing.Event(), multiprocessing.Event()
+    owner = multiprocessing.Process(target=_hold_owner, args=(str(tmp_path), ready, release))
+    owner.start()
+    try:
+        assert ready.wait(10)
+        assert claim_index_owner(tmp_path, blocking=False) is False
+    finally:
+        release.set()
+        owner.join()
+    assert claim_index_owner(tmp_path, blocking=False) is True
@@ -0,0 +1,226 @@
+# tracing.py
+
+from pathlib import Path
+import json
+import logging
+import logging.handlers
+import os
+import resource
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+# Config
+# MEMORY_TRACE=1 turns tracing on; when off, span() returns a shared no-op object
+TRACE_ENABLED = os.environ.get("MEMORY_TRACE", "0") == "1"
+TRACE_PATH = Path(os.environ.get("MEMORY_TRACE_PATH", "traces/trace.jsonl"))
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUPS = 5
+
+_logger = None
+_local = threading.local()
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        # ru_maxrss is KB on Linux, the peak rather than current value
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _get_logger() -> logging.Logger:
+    global _logger
+    if _logger is None:
+        TRACE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(TRACE_PATH, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger = logging.getLogger("memory_trace")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+
+def _write(record: Dict) -> None:
+    _get_logger().info(json.dumps(record, default=str))
+
+
+def _stack() -> List[str]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+class Span:
+    """
+    Timed stage: wall time, process CPU time and RSS at start and end, plus any attributes set on it.
+    Spans opened inside another on the same thread record the enclosing path, e.g. "turn/llm".
+    """
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _stack()
+        stack.append(self.name)
+        self.path = "/".join(stack)
+        self.ts = time.time()
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.rss_start = current_rss_mb()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu_start
+        rss = current_rss_mb()
+        _stack().pop()
+        record = {
+            "ts": self.ts,
+            "span": self.name,
+            "path": self.path,
+            "duration_s": round(duration, 4),
+            "cpu_s": round(cpu, 4),
+            "cpu_pct": round(100 * cpu / duration, 1) if duration > 0 else 0.0,
+            "rss_mb": round(rss, 1),
+            "rss_delta_mb": round(rss - self.rss_start, 1),
+            **self.attrs,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        _write(record)
+        return False
+
+
+class _NoopSpan:
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """
+    Context manager timing one stage: `with span("transcribe", model="base.en") as s: ...; s.set(chars=42)`.
+    """
+    if not TRACE_ENABLED:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def record(name: str, duration_s: float, **attrs) -> None:
+    """
+    Log a stage timed elsewhere, e.g. the prompt-eval and generation times Ollama reports.
+    """
+    if not TRACE_ENABLED:
+        return
+    stack = _stack()
+    _write({"ts": time.time() - duration_s, "span": name, "path": "/".join(stack + [name]),
+            "duration_s": round(duration_s, 4), **attrs})
+
+
+def record_ollama(response, model: str) -> None:
+    """
+    Split an Ollama response's reported timings into model_load, llm_prompt_eval and llm_generate records.
+    """
+    if not TRACE_ENABLED:
+        return
+    if (response.get("load_duration") or 0) > 0.1e9:
+        record("model_load", response["load_duration"] / 1e9, model=model)
+    if response.get("prompt_eval_duration"):
+        record("llm_prompt_eval", response["prompt_eval_duration"] / 1e9, model=model,
+               tokens=response.get("prompt_eval_count"))
+    if response.get("eval_duration"):
+        record("llm_generate", response["eval_duration"] / 1e9, model=model, tokens=response.get("eval_count"))
+
+
+def read_trace(path: Path = TRACE_PATH, since: Optional[float] = None) -> Iterator[Dict]:
+    """
+    Records from the log and its rotated backups, oldest file first.
+    """
+    files = [Path(f"{path}.{i}") for i in range(TRACE_BACKUPS, 0, -1)] + [path]
+    for file in files:
+        if not file.exists():
+            continue
+        with open(file, "r") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # line cut by a crash
+                if since is None or item["ts"] >= since:
+                    yield item
+
+
+def summarize(records: Iterator[Dict]) -> List[Dict]:
+    """
+    Per span path: count, total / p50 / p95 / max seconds, mean CPU % and peak RSS, slowest total first.
+    """
+    by_path: Dict[str, List[Dict]] = {}
+    for item in records:
+        by_path.setdefault(item["path"], []).append(item)
+
+    rows = []
+    for path, items in by_path.items():
+        durations = sorted(i["duration_s"] for i in items)
+        cpu = [i["cpu_pct"] for i in items if "cpu_pct" in i]
+        rss = [i["rss_mb"] for i in items if "rss_mb" in i]
+        rows.append({
+            "path": path,
+            "count": len(items),
+            "total_s": sum(durations),
+            "p50_s": statistics.median(durations),
+            "p95_s": durations[int(0.95 * (len(durations) - 1))],
+            "max_s": durations[-1],
+            "cpu_pct": statistics.mean(cpu) if cpu else None,
+            "peak_rss_mb": max(rss) if rss else None,
+        })
+    return sorted(rows, key=lambda r: r["total_s"], reverse=True)
+
+
+def print_summary(rows: List[Dict], limit: int = 30) -> None:
+    print(f"{'span path':<40} {'count':>6} {'total s':>9} {'p50 s':>7} {'p95 s':>7} {'max s':>7} {'cpu %':>6} {'rss MB':>7}")
+    for r in rows[:limit]:
+        cpu = f"{r['cpu_pct']:.0f}" if r["cpu_pct"] is not None else "-"
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        print(f"{r['path']:<40} {r['count']:>6} {r['total_s']:>9.1f} {r['p50_s']:>7.2f} {r['p95_s']:>7.2f} "
+              f"{r['max_s']:>7.2f} {cpu:>6} {rss:>7}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize the stage trace log (run the assistant with MEMORY_TRACE=1).")
+    parser.add_argument("--path", type=Path, default=TRACE_PATH)
+    parser.add_argument("--hours", type=float, default=24, help="only spans from the last N hours (0 = all)")
+    parser.add_argument("--limit", type=int, default=30)
+    args = parser.parse_args()
+
+    since = (datetime.now() - timedelta(hours=args.hours)).timestamp() if args.hours else None
+    records = list(read_trace(args.path, since))
+    if not records:
+        print(f"⚡ No trace records in {args.path}")
+    else:
+        hours = (max(r["ts"] for r in records) - min(r["ts"] for r in records)) / 3600
+        print(f"🧭 {len(records)} spans over {hours:.1f} h from {args.path}\n")
+        print_summary(summarize(records), args.limit)
+        loads = [r for r in records if r["span"] == "model_load"]
+        if loads:
+            print(f"\n📦 {len(loads)} model loads, {sum(r['duration_s'] for r in loads):.1f} s total")
@@ -24,12 +24,20 @@ def load_user_notes(user_json_path: Path) -> List[Dict]:
     with open(user_json_path, "r") as f:
         data = json.load(f)
 
+    validate_user_notes(data)
+    print(f"✅ Loaded {len(data)} user-written notes from {user_json_path.name}")
+    return data
+
+def validate_user_notes(data) -> None:
+    """
+    Check that data is a list of memory entries, e.g. the user notes of a memory_store snapshot.
+
+    Raises:
+        ValueError: If data is not a valid list of dictionaries.
+    """
     if not isinstance(data, list):
         raise ValueError(f"❌ Expected a list of user notes, but got {type(data)}.")
 
     for idx, entry in enumerate(data):
         if not all(key in entry for key in ("timestamp", "description", "image_path", "source")):
             raise ValueError(f"❌ Invalid entry format at index {idx}: {entry}")
-
-    print(f"✅ Loaded {len(data)} user-written notes from {user_json_path.name}")
-    return data
@@ -3,22 +3,42 @@
 from pathlib import Path
 import json
 import chromadb
+from chromadb.config import Settings
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from typing import List, Dict
+from typing import List, Dict, Callable, Optional
 import hashlib
+import re
+
+from memory_combiner import ImageMemory
+from tracing import span
+from model_residency import residency
 
 def make_id(entry):
     raw = f"{entry['timestamp']} - {entry['description']}"
     return "memory-" + hashlib.md5(raw.encode()).hexdigest()
 # embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
 
-# RAG
-embed_model = HuggingFaceEmbedding(model_name="intfloat/e5-base-v2") # or small-v2?
+# RAG, loaded on first use and evicted by the residency manager when RAM is needed elsewhere
+residency.register("embedder", footprint_mb=450, reload_s=6, priority=1,
+                   load=lambda: HuggingFaceEmbedding(model_name="intfloat/e5-base-v2")) # or small-v2?
+
+def embed_passages(texts: List[str]) -> List[List[float]]:
+    with residency.use("embedder") as embed_model:
+        return embed_model.get_text_embedding_batch(texts)
 
-def initialize_vector_store(persist_dir: str) -> chromadb.Client:
+def initialize_vector_store(persist_dir: str, memory_limit_bytes: Optional[int] = None) -> chromadb.Client:
     """
     Initialize a ChromaDB client with local persistence (new architecture).
+
+    With memory_limit_bytes, Chroma keeps loaded collection indexes in an LRU cache of that size,
+    so collections that are not queried (e.g. old time shards) are evicted from RAM.
     """
+    if memory_limit_bytes:
+        settings = Settings(
+            chroma_segment_cache_policy="LRU",
+            chroma_memory_limit_bytes=memory_limit_bytes,
+        )
+        return chromadb.PersistentClient(path=persist_dir, settings=settings)
     client = chromadb.PersistentClient(path=persist_dir)
     return client
 
@@ -51,7 +71,7 @@ def add_memories_to_vector_store(client: chromadb.Client, memory_json_path: Path
         ids.append(mem_id)
 
     if documents:
-        embeddings = embed_model.get_text_embedding_batch(documents)
+        embeddings = embed_passages(documents)
         collection.add(
             documents=documents,
             embeddings=embeddings,
@@ -63,24 +83,176 @@ def add_memories_to_vector_store(client: chromadb.Client, memory_json_path: Path
         print(f"⚡ No new memories to add. Vector store is already up to date.")
 
 
-def query_similar_memories(client: chromadb.Client, query_text: str, top_k: int = 5, collection_name: str = "memories") -> List[Dict]:
+# how many extra candidates to fetch per slot when near-duplicates are collapsed
+DEDUP_OVERFETCH = 3
+
+def embed_query(query_text: str) -> List[float]:
+    with residency.use("embedder") as embed_model, span("embed"):
+        return embed_model.get_text_embedding("query: " + query_text)
+
+def query_similar_memories(client: chromadb.Client, query_text: str, top_k: int = 5, collection_name: str = "memories",
+                           canonical_of: Optional[Callable[[str], str]] = None,
+                           query_embedding: Optional[List[float]] = None) -> List[Dict]:
     """
     Query ChromaDB for top-k most similar memories to a given query text.
+
+    If canonical_of is given (e.g. ImageHashIndex.canonical_of), memories whose images are
+    near-duplicates of each other are collapsed to the best-scoring one per source.
+    A precomputed query_embedding (from embed_query) skips embedding the text again.
     """
     collection = client.get_or_create_collection(name=collection_name)
 
-    query_embedding = embed_model.get_text_embedding("query: " + query_text)
+    if query_embedding is None:
+        query_embedding = embed_query(query_text)
 
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=top_k,
-        include=["metadatas", "distances"]
-    )
+    with span("chroma_query", collection=collection_name):
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=top_k * DEDUP_OVERFETCH if canonical_of else top_k,
+            include=["metadatas", "distances"]
+        )
+
+    return select_memories(results["metadatas"][0], results["distances"][0], top_k, canonical_of)
 
+def select_memories(metadatas: List[Dict], distances: List[float], top_k: int,
+                    canonical_of: Optional[Callable[[str], str]] = None) -> List[Dict]:
+    """
+    First top_k of the ranked hits, with near-duplicate images collapsed per source when canonical_of is given.
+    """
     matched_memories = []
-    for metadata, distance in zip(results["metadatas"][0], results["distances"][0]):
+    seen = {}
+    for metadata, distance in zip(metadatas, distances):
         memory = metadata
         memory["similarity"] = 1 - distance  # 1 - distance
+        if canonical_of:
+            key = (canonical_of(memory["image_path"]), memory["source"])
+            if key in seen:
+                seen[key]["duplicates"] = seen[key].get("duplicates", 0) + 1
+                continue
+            seen[key] = memory
+        matched_memories.append(memory)
+        if len(matched_memories) == top_k:
+            break
+
+    return matched_memories
+
+
+# One document per image
+
+def make_image_doc_id(image_path: str) -> str:
+    return "image-" + hashlib.md5(image_path.encode()).hexdigest()
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if len(s.strip()) >= 4]
+
+def image_content_hash(record: ImageMemory, sentence_vectors: bool = False) -> str:
+    return hashlib.md5((record.timestamp + record.description() + str(sentence_vectors)).encode()).hexdigest()
+
+def add_image_memories_to_vector_store(client: chromadb.Client, records: List[ImageMemory],
+                                       collection_name: str = "memories_by_image",
+                                       sentence_vectors: bool = False, verbose: bool = True) -> int:
+    """
+    Store each ImageMemory as one document (note + caption merged), re-embedding it only when its content changed.
+    Returns the number of vectors added.
+
+    With sentence_vectors, every sentence of every part is also stored as a sub-vector pointing
+    at the same image, so a detail buried in a long caption can still match.
+    """
+    collection = client.get_or_create_collection(name=collection_name)
+
+    content_hashes = {r.image_path: image_content_hash(r, sentence_vectors) for r in records}
+    existing = collection.get(ids=[make_image_doc_id(r.image_path) for r in records], include=["metadatas"])
+    up_to_date = set(m["image_path"] for m in existing["metadatas"]
+                     if m.get("content_hash") == content_hashes.get(m["image_path"]))
+    stale = set(m["image_path"] for m in existing["metadatas"]) - up_to_date
+
+    for image_path in stale:
+        collection.delete(where={"image_path": image_path})
+
+    documents, metadatas, ids = [], [], []
+    for record in records:
+        if record.image_path in up_to_date:
+            continue
+        memory = record.to_memory()
+        documents.append(f"passage: {record.timestamp} - {record.description()}")
+        metadatas.append({**memory, "kind": "image", "content_hash": content_hashes[record.image_path]})
+        ids.append(make_image_doc_id(record.image_path))
+        if sentence_vectors:
+            # a photo can have several notes from the same source, so the part index keeps ids unique
+            for part, (source, text) in enumerate(record.parts()):
+                for idx, sentence in enumerate(split_sentences(text)):
+                    documents.append(f"passage: {record.timestamp} - {sentence}")
+                    metadatas.append({"image_path": record.image_path, "timestamp": record.timestamp,
+                                      "source": source, "kind": "sentence"})
+                    ids.append(f"{make_image_doc_id(record.image_path)}-{source}-{part}-{idx}-"
+                               + hashlib.md5(sentence.encode()).hexdigest()[:8])
+
+    if documents:
+        embeddings = embed_passages(documents)
+        collection.add(
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=metadatas,
+            ids=ids
+        )
+        if verbose:
+            print(f"✅ Indexed {len(set(m['image_path'] for m in metadatas))} images "
+                  f"({len(documents)} vectors) in ChromaDB collection '{collection_name}'.")
+    elif verbose:
+        print("⚡ No changed images to index. Vector store is already up to date.")
+    return len(documents)
+
+
+def query_image_memories(client: chromadb.Client, query_text: str, top_k: int = 5,
+                         collection_name: str = "memories_by_image",
+                         canonical_of: Optional[Callable[[str], str]] = None,
+                         query_embedding: Optional[List[float]] = None) -> List[Dict]:
+    """
+    Return at most one memory per photo, scored by the best match among its document and sentence vectors.
+
+    A photo can own several vectors, so the over-fetch doubles until top_k distinct photos are found
+    or the collection is exhausted.
+    """
+    collection = client.get_or_create_collection(name=collection_name)
+    total = collection.count()
+    if total == 0:
+        return []
+
+    if query_embedding is None:
+        query_embedding = embed_query(query_text)
+
+    n_results = min(top_k * DEDUP_OVERFETCH, total)
+    while True:
+        with span("chroma_query", collection=collection_name, n_results=n_results):
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                include=["metadatas", "distances"]
+            )
+
+        # max-sim per image (or per near-duplicate group)
+        best = {}
+        for metadata, distance in zip(results["metadatas"][0], results["distances"][0]):
+            key = canonical_of(metadata["image_path"]) if canonical_of else metadata["image_path"]
+            if key not in best or 1 - distance > best[key][1]:
+                best[key] = (metadata["image_path"], 1 - distance)
+        if len(best) >= top_k or n_results >= total:
+            break
+        n_results = min(n_results * 2, total)
+
+    ranked = sorted(best.values(), key=lambda x: x[1], reverse=True)[:top_k]
+    if not ranked:
+        return []
+
+    records = collection.get(ids=[make_image_doc_id(path) for path, _ in ranked], include=["metadatas"])
+    by_path = {m["image_path"]: m for m in records["metadatas"]}
+
+    matched_memories = []
+    for image_path, similarity in ranked:
+        memory = dict(by_path[image_path])
+        memory.pop("kind", None)
+        memory.pop("content_hash", None)
+        memory["similarity"] = similarity
         matched_memories.append(memory)
 
     return matched_memories
@@ -6,20 +6,25 @@ import whisper
 import pyttsx3
 import time
 from scipy.io.wavfile import write as write_wav
-from wake_word_listener import wait_for_wake_word
+from wake_word_listener import wait_for_wake_word, USE_SHARED_MIC
+from audio_ring_buffer import get_shared_capture, PREROLL_S
+from hardware_profile import setting
+from tracing import span
+from model_residency import residency
 import re
 from TTS.api import TTS
 
 # Configuration
 SAMPLE_RATE = 16000
-RECORD_SECONDS = 5
+RECORD_SECONDS = setting("record_seconds")
 
+# Models are loaded on first use; needed every turn, so they are evicted last
 # or speedy-speech?
-tts_model = TTS(model_name="tts_models/en/ljspeech/glow-tts", progress_bar=False, gpu=False)
+residency.register("tts", footprint_mb=250, reload_s=4, priority=2,
+                   load=lambda: TTS(model_name="tts_models/en/ljspeech/glow-tts", progress_bar=False, gpu=False))
 
-
-# Load Whisper model
-whisper_model = whisper.load_model("base.en")
+residency.register("whisper", footprint_mb=400, reload_s=3, priority=2,
+                   load=lambda: whisper.load_model(setting("whisper_model")))
 
 import re
 
@@ -71,9 +76,13 @@ def speak_text(text: str):
     cleaned_text = " ".join(cleaned_sentences)
 
     try:
-        wav = tts_model.tts(cleaned_text)
-        sd.play(wav, samplerate=tts_model.synthesizer.output_sample_rate)
-        sd.wait()
+        with residency.use("tts") as tts_model:
+            with span("tts_synth", chars=len(cleaned_text)):
+                wav = tts_model.tts(cleaned_text)
+            sample_rate = tts_model.synthesizer.output_sample_rate
+        with span("tts_play", seconds=len(wav) / sample_rate):
+            sd.play(wav, samplerate=sample_rate)
+            sd.wait()
         time.sleep(0.3)
     except Exception as e:
         print(f"[ERROR] Failed TTS playback: {e}")
@@ -81,18 +90,28 @@ def speak_text(text: str):
 def record_audio(duration: int = RECORD_SECONDS) -> np.ndarray:
     """
     Record audio from microphone with basic error handling.
+
+    With the shared microphone the recording starts PREROLL_S before this call and needs no device open.
     """
+    if USE_SHARED_MIC:
+        print("🎤 Recording...")
+        with span("record", seconds=duration, shared_mic=True):
+            audio = get_shared_capture().record(duration, preroll=PREROLL_S)
+        print("🎤 Recording complete.")
+        return audio
+
     print("🔔 Please start speaking after the beep.")
     time.sleep(0.5)
     try:
         print("🎤 Recording...")
-        audio = sd.rec(
-            int(duration * SAMPLE_RATE),
-            samplerate=SAMPLE_RATE,
-            channels=1,
-            dtype='float32'
-        )
-        sd.wait()
+        with span("record", seconds=duration, shared_mic=False):
+            audio = sd.rec(
+                int(duration * SAMPLE_RATE),
+                samplerate=SAMPLE_RATE,
+                channels=1,
+                dtype='float32'
+            )
+            sd.wait()
         print("🎤 Recording complete.")
         return audio
     except Exception as e:
@@ -109,7 +128,9 @@ def recognize_speech(audio: np.ndarray) -> str:
 
     print("🧠 Transcribing...")
     try:
-        result = whisper_model.transcribe(temp_filename)
+        with residency.use("whisper") as whisper_model, \
+                span("transcribe", model=setting("whisper_model"), audio_s=len(audio) / SAMPLE_RATE):
+            result = whisper_model.transcribe(temp_filename)
         text = result['text'].strip()
         print(f"📝 Recognized: {text}")
         return text
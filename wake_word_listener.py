@@ -2,24 +2,93 @@ import os
 import sys
 import signal
 import time
+import json
+import numpy as np
 from edge_impulse_linux.audio import AudioImpulseRunner
+from kws_decision import KeywordDecisionEngine, TARGET_LABELS
+from audio_ring_buffer import get_shared_capture
+from hardware_profile import setting
+from tracing import span
 
 # Parameter
 MENU_MODEL_PATH = "./model_menu.eim"
 YESNO_MODEL_PATH = "/model_yesno"
-THRESHOLD = 0.65
+# fallback for labels without an entry in kws_decision.LABEL_THRESHOLDS
+THRESHOLD = setting("kws_threshold")
+# append every classifier frame to this JSONL file for offline evaluation (see kws_eval.py)
+RECORD_PATH = os.environ.get("KWS_RECORD")
+# classify windows read from the always-on shared microphone (audio_ring_buffer.py)
+# instead of letting the runner open its own device on every call
+USE_SHARED_MIC = True
+CLASSIFY_STRIDE_S = 0.25
 
 runner = None
+# one engine per model so the refractory period carries over between calls
+engines = {}
+# shared-mic mode keeps one initialized runner per model file
+runners = {}
 
 def signal_handler(sig, frame):
     print('Interrupted')
     if runner:
         runner.stop()
+    for cached_runner, _ in runners.values():
+        cached_runner.stop()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
 
+def get_runner(modelfile):
+    if modelfile not in runners:
+        cached_runner = AudioImpulseRunner(modelfile)
+        model_info = cached_runner.init()
+        print('Loaded runner for "' + model_info['project']['owner'] + ' / ' + model_info['project']['name'] + '"')
+        runners[modelfile] = (cached_runner, model_info)
+    return runners[modelfile]
+
+def classify_from_ring(model_runner, model_info, capture):
+    """
+    Yield classifier results for a sliding window over the shared microphone ring, starting now.
+    """
+    ring = capture.ring
+    window = model_info['model_parameters']['input_features_count']
+    stride = int(CLASSIFY_STRIDE_S * capture.sample_rate)
+    pos = max(ring.position(), window)
+    while True:
+        ring.wait_until(pos)
+        if ring.position() - pos > 4 * stride:
+            # classification fell behind real time; jump to the newest audio
+            pos = ring.position()
+        samples = ring.read(pos - window, pos)
+        features = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tolist()
+        yield model_runner.classify(features)
+        pos += stride
+
+def decide(engine, model_select, labels, results_stream):
+    for res in results_stream:
+        print('Result (%d ms.) ' % (res['timing']['dsp'] + res['timing']['classification']), end='')
+        for label in labels:
+            score = res['result']['classification'][label]
+            print('%s: %.2f\t' % (label, score), end='')
+        now = time.monotonic()
+        results = res['result']['classification']
+        if RECORD_PATH:
+            with open(RECORD_PATH, "a") as f:
+                f.write(json.dumps({"t": now, "model": model_select, "scores": results}) + "\n")
+
+        detected = engine.update(results, now)
+        if detected is not None:
+            print('', flush=True)
+            return detected
+        print('', flush=True)
+
 def wait_for_wake_word(model_select="menu", device_id=None):
+    with span("keyword_wait", model=model_select) as wait_span:
+        label = _wait_for_wake_word(model_select, device_id)
+        wait_span.set(label=label)
+        return label
+
+def _wait_for_wake_word(model_select="menu", device_id=None):
     global runner
 
     if model_select == "menu":
@@ -31,34 +100,29 @@ def wait_for_wake_word(model_select="menu", device_id=None):
 
     modelfile = model_file
 
+    engine = engines.get(model_select)
+    if engine is None:
+        engine = engines[model_select] = KeywordDecisionEngine(TARGET_LABELS[model_select], default_threshold=THRESHOLD)
+    engine.reset()
+
+    selected_device_id = 2
+    if device_id is not None:
+        selected_device_id = int(device_id)
+        print("Device ID " + str(selected_device_id) + " has been provided as an argument.")
+
+    if USE_SHARED_MIC:
+        shared_runner, model_info = get_runner(modelfile)
+        return decide(engine, model_select, model_info['model_parameters']['labels'],
+                      classify_from_ring(shared_runner, model_info, get_shared_capture(selected_device_id)))
+
     with AudioImpulseRunner(modelfile) as runner:
         try:
             model_info = runner.init()
             labels = model_info['model_parameters']['labels']
             print('Loaded runner for "' + model_info['project']['owner'] + ' / ' + model_info['project']['name'] + '"')
 
-            selected_device_id = 2
-            if device_id is not None:
-                selected_device_id = int(device_id)
-                print("Device ID " + str(selected_device_id) + " has been provided as an argument.")
-
-            for res, audio in runner.classifier(device_id=selected_device_id):
-                print('Result (%d ms.) ' % (res['timing']['dsp'] + res['timing']['classification']), end='')
-                for label in labels:
-                    score = res['result']['classification'][label]
-                    print('%s: %.2f\t' % (label, score), end='')
-                # maxium class and threshold
-                results = res['result']['classification']
-                best_label = max(results, key=results.get)
-                best_score = results[best_label]
-
-                if best_score >= THRESHOLD:
-                    if model_select == "menu" and (best_label == "takephoto" or best_label == "himan"):
-                        return best_label
-                    elif model_select == "yesno" and (best_label == "yes" or best_label == "no"):
-                        return best_label
-                print('', flush=True)
-
+            return decide(engine, model_select, labels,
+                          (res for res, audio in runner.classifier(device_id=selected_device_id)))
 
         finally:
             if runner: